@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""无界面批量运行
+
+读取JSONL格式的问题文件,使用与图形界面相同的提供商配置和LlmService
+并发发送,每完成一个就把结果追加写入输出JSONL,并在标准错误输出进度和吞吐量。
+本模块及其依赖不导入任何界面模块,只需要QtCore和QtNetwork。
+
+输入每行一个JSON对象:
+    {"id": "q1", "prompt": "...", "provider": "deepseek", "model": "deepseek-chat",
+     "system_prompt": "...", "temperature": 0, "max_tokens": 1000, "top_p": 1.0}
+只有prompt是必需的,provider和model可由命令行参数统一指定。也可以用
+"group": "模型组ID"代替provider和model,由ModelRouter选择model.toml中模型组的成员。
+
+输出每行一个JSON对象:
+    {"id", "provider", "model", "response", "error", "usage", "metrics", "line"}
+
+用法:
+    python batch_runner.py prompts.jsonl -o results.jsonl [--provider deepseek]
+        [--model deepseek-chat] [--group deepseek-v3] [--parallel 4]
+    python main.py batch prompts.jsonl -o results.jsonl ...
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from PySide6.QtCore import QObject, QCoreApplication, Signal, Slot
+
+from config_manager import ConfigManager
+from llm_service import LlmService
+
+
+# 从输入传给LlmService的上下文字段
+CONTEXT_KEYS = ("system_prompt", "temperature", "max_tokens", "top_p")
+
+
+class BatchJob:
+    """一个待运行的问题"""
+
+    __slots__ = ("line", "id", "provider_id", "model_id", "group_id", "prompt", "context",
+                 "session_id", "chunks", "error", "usage", "metrics")
+
+    def __init__(self, line, item_id, provider_id, model_id, prompt, context, group_id=None):
+        self.line = line
+        self.id = item_id
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.group_id = group_id
+        self.prompt = prompt
+        self.context = context
+        self.session_id = f"batch-{line}"
+        self.chunks = []
+        self.error = None
+        self.usage = None
+        self.metrics = None
+
+    def result(self):
+        """生成输出记录"""
+        return {
+            "id": self.id,
+            "line": self.line,
+            "provider": self.provider_id,
+            "model": self.model_id,
+            "group": self.group_id,
+            "response": "".join(self.chunks),
+            "error": self.error,
+            "usage": self.usage,
+            "metrics": self.metrics,
+        }
+
+
+def load_jobs(path, provider_id=None, model_id=None, group_id=None):
+    """读取问题文件
+
+    Args:
+        path: JSONL文件路径
+        provider_id: 默认提供商ID
+        model_id: 默认模型ID
+        group_id: 默认模型组ID,行内指定了provider和model时不使用
+
+    Returns:
+        (list, list): BatchJob列表, 无法解析的行的错误结果
+    """
+    jobs = []
+    invalid = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                invalid.append({"line": line_number, "error": f"JSON格式错误: {e}"})
+                continue
+
+            if isinstance(item, str):
+                item = {"prompt": item}
+            prompt = item.get("prompt") if isinstance(item, dict) else None
+            if not prompt:
+                invalid.append({"line": line_number, "error": "缺少prompt字段"})
+                continue
+
+            group = item.get("group")
+            if group:
+                provider = model = None
+            else:
+                provider = item.get("provider") or provider_id
+                model = item.get("model") or model_id
+                if not (provider and model) and group_id:
+                    group, provider, model = group_id, None, None
+                elif not provider or not model:
+                    invalid.append({"line": line_number, "id": item.get("id"), "error": "未指定provider或model"})
+                    continue
+
+            context = {key: item[key] for key in CONTEXT_KEYS if key in item}
+            jobs.append(BatchJob(line_number, item.get("id", line_number), provider, model, prompt, context, group))
+
+    return jobs, invalid
+
+
+class BatchRunner(QObject):
+    """按并行度上限运行BatchJob,每完成一个写出一行结果"""
+
+    # 信号
+    job_finished = Signal(object)  # BatchJob
+    all_finished = Signal()
+
+    def __init__(self, service, jobs, output, parallel=4, progress=None, parent=None):
+        """初始化运行器
+
+        Args:
+            service: LlmService
+            jobs: BatchJob列表
+            output: 已打开的输出文件
+            parallel: 同时进行的请求数上限
+            progress: 进度输出的文件,为None时不输出
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self._service = service
+        self._queue = list(reversed(jobs))
+        self._running = {}  # 会话ID -> BatchJob
+        self._output = output
+        self._parallel = max(1, parallel)
+        self._progress = progress
+
+        self.total = len(jobs)
+        self.completed = 0
+        self.failed = 0
+        self.output_chars = 0
+        self.output_tokens = 0
+        self._started = None
+
+        service.response_chunk.connect(self._on_response_chunk)
+        service.response_finished.connect(self._on_response_finished)
+        service.error_occurred.connect(self._on_error_occurred)
+        service.usage_reported.connect(self._on_usage_reported)
+        service.request_metrics_recorded.connect(self._on_request_metrics_recorded)
+        service.request_routed.connect(self._on_request_routed)
+
+    def start(self):
+        """开始运行"""
+        self._started = time.perf_counter()
+        if not self._queue:
+            self.all_finished.emit()
+            return
+        self._fill()
+
+    def elapsed(self):
+        """已运行的秒数"""
+        return time.perf_counter() - self._started if self._started is not None else 0.0
+
+    def _fill(self):
+        """补充进行中的请求直到达到并行度上限"""
+        while self._queue and len(self._running) < self._parallel:
+            job = self._queue.pop()
+            self._running[job.session_id] = job
+            if job.group_id:
+                self._service.register_group_session(job.session_id, job.group_id)
+            else:
+                self._service.register_session(job.session_id, job.provider_id, job.model_id)
+            self._service.send_message(job.session_id, job.prompt, job.context)
+
+            # 配置错误在send_message中同步报告,不会有response_finished
+            if job.error is not None and job.session_id in self._running:
+                self._finish(job)
+
+    def _finish(self, job):
+        """写出结果并释放会话"""
+        del self._running[job.session_id]
+        self._service.release_session(job.session_id)
+
+        self._output.write(json.dumps(job.result(), ensure_ascii=False) + "\n")
+        self._output.flush()
+
+        self.completed += 1
+        if job.error is not None:
+            self.failed += 1
+        self.output_chars += sum(len(chunk) for chunk in job.chunks)
+        self.output_tokens += (job.usage or {}).get("output_tokens", 0)
+        self._report(job)
+
+        self.job_finished.emit(job)
+        if not self._running and not self._queue:
+            self.all_finished.emit()
+
+    def _report(self, job):
+        """输出一行进度"""
+        if self._progress is None:
+            return
+
+        elapsed = max(self.elapsed(), 1e-6)
+        status = "失败: " + job.error if job.error else "完成"
+        print(
+            f"[{self.completed}/{self.total}] {job.id} {status} | "
+            f"{self.completed / elapsed:.2f} 个/秒, {self.output_chars / elapsed:.0f} 字符/秒, "
+            f"{self.output_tokens / elapsed:.0f} token/秒",
+            file=self._progress,
+            flush=True
+        )
+
+    @Slot(str, str)
+    def _on_response_chunk(self, session_id, chunk):
+        job = self._running.get(session_id)
+        if job is not None:
+            job.chunks.append(chunk)
+
+    @Slot(str, str)
+    def _on_error_occurred(self, session_id, message):
+        job = self._running.get(session_id)
+        if job is not None:
+            job.error = message
+
+    @Slot(str, dict)
+    def _on_usage_reported(self, session_id, usage):
+        job = self._running.get(session_id)
+        if job is not None:
+            job.usage = usage
+
+    @Slot(str, dict)
+    def _on_request_metrics_recorded(self, session_id, metrics):
+        job = self._running.get(session_id)
+        if job is not None:
+            job.metrics = metrics
+
+    @Slot(str, str, str)
+    def _on_request_routed(self, session_id, provider_id, model_id):
+        job = self._running.get(session_id)
+        if job is not None:
+            job.provider_id = provider_id
+            job.model_id = model_id
+
+    @Slot(str)
+    def _on_response_finished(self, session_id):
+        job = self._running.get(session_id)
+        if job is None:
+            return
+
+        self._finish(job)
+        self._fill()
+
+
+def main(argv=None):
+    """命令行入口
+
+    Args:
+        argv: 命令行参数,为None时使用sys.argv[1:]
+
+    Returns:
+        int: 退出码,有失败的问题时返回1
+    """
+    parser = argparse.ArgumentParser(description="无界面批量运行JSONL问题文件")
+    parser.add_argument("input", help="输入JSONL文件")
+    parser.add_argument("-o", "--output", required=True, help="输出JSONL文件")
+    parser.add_argument("--provider", help="默认提供商ID")
+    parser.add_argument("--model", help="默认模型ID")
+    parser.add_argument("--group", help="默认模型组ID,未指定provider和model的行使用")
+    parser.add_argument("--parallel", type=int, default=4, help="同时进行的请求数上限")
+    parser.add_argument("--append", action="store_true", help="追加到输出文件而不是覆盖")
+    parser.add_argument("--quiet", action="store_true", help="不输出进度")
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    app.setApplicationName("BerryLLM Studio")
+    app.setOrganizationName("BerryLLM")
+
+    ConfigManager.instance()
+
+    try:
+        jobs, invalid = load_jobs(args.input, args.provider, args.model, args.group)
+    except OSError as e:
+        print(f"读取输入文件失败: {e}", file=sys.stderr)
+        return 2
+
+    with open(args.output, "a" if args.append else "w", encoding="utf-8") as output:
+        for record in invalid:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        # 批量结果直接写入输出文件,不需要流式日志和会话数据库
+        service = LlmService(chat_database=None, journal=False)
+        runner = BatchRunner(service, jobs, output, args.parallel, None if args.quiet else sys.stderr)
+        runner.all_finished.connect(app.quit)
+        runner.start()
+        if runner.completed < runner.total:
+            app.exec()
+
+    elapsed = max(runner.elapsed(), 1e-6)
+    print(
+        f"完成 {runner.completed} 个, 失败 {runner.failed} 个, 无效行 {len(invalid)} 个, "
+        f"耗时 {elapsed:.1f} 秒, {runner.output_chars / elapsed:.0f} 字符/秒, "
+        f"{runner.output_tokens / elapsed:.0f} token/秒",
+        file=sys.stderr
+    )
+    return 1 if runner.failed or invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""会话全文搜索基准测试
+
+在临时数据库中生成若干会话和消息,测量建立索引的写入耗时,以及常见词、
+罕见词、中文短语、单字前缀和英文前缀等查询的耗时。
+
+用法: python benchmarks/bench_chat_search.py [--messages 100000] [--sessions 500] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_database import ChatDatabase
+
+
+WORDS_ZH = ["生成器", "迭代器", "数据库", "索引", "事务", "并发", "网络", "请求", "缓存", "模型",
+            "上下文", "流式", "回复", "会话", "配置", "线程", "协程", "内存", "性能", "测试"]
+WORDS_EN = ["python", "generator", "iterator", "sqlite", "index", "async", "http", "cache",
+            "token", "stream", "thread", "memory", "latency", "benchmark", "config", "session"]
+
+QUERIES = [
+    ("常见中文词", "数据库"),
+    ("中文短语", "生成器和迭代器"),
+    ("单字前缀", "缓"),
+    ("英文前缀", "gener"),
+    ("中英混合", "sqlite 索引"),
+    ("罕见词", "量子纠缠"),
+]
+
+
+def random_message(rng):
+    """生成一条随机的中英混合消息"""
+    parts = []
+    for _ in range(rng.randint(8, 60)):
+        if rng.random() < 0.7:
+            parts.append(rng.choice(WORDS_ZH) + rng.choice(["的", "和", "在", "是", ",", "。"]))
+        else:
+            parts.append(" " + rng.choice(WORDS_EN) + " ")
+    if rng.random() < 0.0005:
+        parts.append("量子纠缠")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话全文搜索基准测试")
+    parser.add_argument("--messages", type=int, default=100000, help="消息总数")
+    parser.add_argument("--sessions", type=int, default=500, help="会话数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的重复次数")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        database = ChatDatabase(os.path.join(directory, "bench.db"))
+
+        start = time.perf_counter()
+        per_session = max(1, args.messages // args.sessions)
+        for index in range(args.sessions):
+            session_id = f"bench-{index}"
+            database.add_session(session_id, f"会话 {index}", "bench", "bench-model")
+            # 每轮一问一答一个事务,与实际写入方式一致
+            for _ in range(per_session // 2):
+                database.append_messages(session_id, [("user", random_message(rng)),
+                                                      ("assistant", random_message(rng))])
+        elapsed = time.perf_counter() - start
+        total = per_session // 2 * 2 * args.sessions
+        print(f"写入 {total} 条消息: {elapsed:.1f}s ({elapsed / total * 1e6:.0f}us/条,含索引)")
+
+        print(f"{'查询':<10}{'结果数':>8}{'p50 ms':>10}{'最大 ms':>10}")
+        for name, query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = database.search_messages(query)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"{name:<10}{len(results):>8}{timings[len(timings) // 2]:>10.2f}{timings[-1]:>10.2f}")
+
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""流式响应块合并基准测试
+
+模拟高速模型按固定速率输出增量内容,分别以逐块刷新和按帧合并两种方式
+写入ChatView,统计界面线程每个token消耗的CPU时间。
+
+用法: python benchmarks/bench_chunk_coalescing.py [--tokens 4000] [--rate 800]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QTimer, QEventLoop, Qt
+from PySide6.QtWidgets import QApplication
+
+from chat_view import ChatView
+from chunk_coalescer import ChunkCoalescer
+
+
+SESSION_ID = "bench"
+TOKEN = "测试a"
+
+
+def run_stream(tokens, rate, interval):
+    """以指定速率输出token并测量界面线程CPU时间
+
+    Args:
+        tokens: token总数
+        rate: 每秒token数
+        interval: 合并帧间隔(毫秒),0表示逐块刷新
+
+    Returns:
+        (float, int): 每个token的CPU时间(微秒), 界面刷新次数
+    """
+    view = ChatView(session_id=SESSION_ID)
+    view.resize(800, 600)
+    view.show()
+
+    coalescer = ChunkCoalescer(interval)
+    updates = [0]
+
+    def on_chunks(session_id, content):
+        updates[0] += 1
+        view.append_streaming_content(content)
+
+    coalescer.chunks_ready.connect(on_chunks)
+
+    loop = QEventLoop()
+    sent = [0]
+    started = time.perf_counter()
+
+    def feed():
+        # 按经过时间补发应到达的token,模拟网络突发
+        due = min(tokens, int((time.perf_counter() - started) * rate) + 1)
+        while sent[0] < due:
+            coalescer.add_chunk(SESSION_ID, TOKEN)
+            sent[0] += 1
+        if sent[0] >= tokens:
+            feeder.stop()
+            coalescer.flush()
+            loop.quit()
+
+    feeder = QTimer()
+    feeder.setTimerType(Qt.PreciseTimer)
+    feeder.setInterval(1)
+    feeder.timeout.connect(feed)
+
+    cpu_start = time.thread_time()
+    feeder.start()
+    loop.exec()
+    QApplication.processEvents()
+    cpu = time.thread_time() - cpu_start
+
+    view.close()
+    view.deleteLater()
+    return cpu / tokens * 1e6, updates[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式响应块合并基准测试")
+    parser.add_argument("--tokens", type=int, default=4000, help="token总数")
+    parser.add_argument("--rate", type=int, default=800, help="每秒token数")
+    parser.add_argument("--interval", type=int, default=ChunkCoalescer.DEFAULT_INTERVAL, help="帧间隔(毫秒)")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    direct_cost, direct_updates = run_stream(args.tokens, args.rate, 0)
+    frame_cost, frame_updates = run_stream(args.tokens, args.rate, args.interval)
+
+    print(f"token数: {args.tokens}, 速率: {args.rate}/s")
+    print(f"逐块刷新:     {direct_cost:.1f} us/token, 刷新 {direct_updates} 次")
+    print(f"按帧合并({args.interval}ms): {frame_cost:.1f} us/token, 刷新 {frame_updates} 次")
+    print(f"界面线程CPU时间降低: {direct_cost / frame_cost:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
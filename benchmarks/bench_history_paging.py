@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""聊天历史分页加载基准测试
+
+在临时数据库中生成一个长会话,比较ChatView只显示最近一页与一次回放全部历史
+的打开耗时和文档大小,并测量滚动到顶部时读取更早一页的耗时。向上翻页超过
+ChatView.MAX_LOADED_PAGES页后文档大小应不再增长。
+
+用法: python benchmarks/bench_history_paging.py [--messages 10000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtWidgets import QApplication
+
+from chat_database import ChatDatabase
+from chat_view import ChatView
+
+
+SESSION_ID = "bench"
+
+
+def fill(database, messages):
+    """写入一个长会话"""
+    database.add_session(SESSION_ID, "bench", "bench", "bench-model")
+    with database.transaction():
+        for index in range(messages // 2):
+            database.append_messages(SESSION_ID, [
+                ("user", f"问题 {index}: 请解释生成器和迭代器的区别\n并给出示例"),
+                ("assistant", f"回答 {index}: " + "生成器是一种特殊的迭代器,使用yield逐个产生值。" * 8),
+            ])
+
+
+def open_paged(app, database):
+    """按页打开会话,返回(耗时ms, 文档字符数, 视图)"""
+    start = time.perf_counter()
+    view = ChatView(None, SESSION_ID, database)
+    view.load_history()
+    view.resize(800, 600)
+    view.show()
+    app.processEvents()
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, view._chat_display.document().characterCount(), view
+
+
+def open_full(app, database):
+    """一次回放全部历史,返回(耗时ms, 文档字符数)"""
+    start = time.perf_counter()
+    view = ChatView(None, SESSION_ID, database)
+    for stored in database.load_messages(SESSION_ID):
+        view._chat_display.append(view._format_stored_message(stored))
+    view.resize(800, 600)
+    view.show()
+    app.processEvents()
+    elapsed = (time.perf_counter() - start) * 1000
+    characters = view._chat_display.document().characterCount()
+    view.close()
+    return elapsed, characters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天历史分页加载基准测试")
+    parser.add_argument("--messages", type=int, default=10000, help="会话中的消息数")
+    parser.add_argument("--pages", type=int, default=20, help="向上滚动读取的页数")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = ChatDatabase(os.path.join(directory, "bench.db"))
+        fill(database, args.messages)
+
+        full_ms, full_chars = open_full(app, database)
+        paged_ms, paged_chars, view = open_paged(app, database)
+        print(f"消息数: {args.messages}, 每页: {ChatView.HISTORY_PAGE_SIZE}")
+        print(f"全部回放: {full_ms:8.1f} ms, 文档 {full_chars} 字符")
+        print(f"最近一页: {paged_ms:8.1f} ms, 文档 {paged_chars} 字符")
+
+        scroll_bar = view._chat_display.verticalScrollBar()
+        timings = []
+        for _ in range(args.pages):
+            start = time.perf_counter()
+            scroll_bar.setValue(scroll_bar.minimum())
+            app.processEvents()
+            timings.append((time.perf_counter() - start) * 1000)
+        characters = view._chat_display.document().characterCount()
+        print(f"向上读取 {args.pages} 页: 每页平均 {sum(timings) / len(timings):.1f} ms, 文档 {characters} 字符")
+
+        scroll_bar.setValue(scroll_bar.maximum())
+        app.processEvents()
+        print(f"回到底部后: 文档 {view._chat_display.document().characterCount()} 字符")
+
+        view.close()
+        database.close()
+
+
+if __name__ == "__main__":
+    main()
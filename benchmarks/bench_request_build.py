@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""请求体构建微基准测试
+
+模拟多轮对话: 每轮追加一问一答后构建下一次请求的请求体,比较每次完整
+json.dumps全部历史与RequestBodyEncoder增量编码的耗时,并校验两者输出一致。
+
+用法: python benchmarks/bench_request_build.py [--turns 50] [--sizes 10,100,500,2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore
+from provider_adapters import get_adapter
+from request_encoder import RequestBodyEncoder
+
+
+SAMPLE_TEXT = "请解释一下Python中的生成器generator和迭代器iterator的区别,并给出示例代码。"
+
+PARAMS = {"temperature": 0.7, "max_tokens": 1000, "top_p": 1.0}
+
+
+def random_text(rng):
+    """生成一段随机长度的消息内容"""
+    return SAMPLE_TEXT * rng.randint(1, 8)
+
+
+def full_build(adapter, history, message):
+    """旧实现: 每次重新转换并编码全部历史"""
+    messages = [entry.to_dict() for entry in history]
+    messages.append({"role": "user", "content": message})
+    return json.dumps(adapter.build_body("bench-model", "你是一个助手", messages, PARAMS)).encode()
+
+
+def bench_size(api_style, size, turns, rng):
+    """在已有size条历史的会话上运行若干轮并返回(旧耗时, 新耗时)"""
+    adapter = get_adapter(api_style)
+    store = ConversationStore()
+    encoder = RequestBodyEncoder()
+    session_id = "bench"
+
+    for index in range(size):
+        store.append(session_id, "user" if index % 2 == 0 else "assistant", random_text(rng))
+
+    full_time = 0.0
+    incremental_time = 0.0
+    for _ in range(turns):
+        message = random_text(rng)
+        history = store.snapshot(session_id)
+
+        start = time.perf_counter()
+        expected = full_build(adapter, history, message)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = encoder.encode(session_id, adapter, "bench-model", "你是一个助手", history, 0, message, PARAMS)
+        incremental_time += time.perf_counter() - start
+
+        if body != expected:
+            raise AssertionError(f"{api_style} 历史{size}条时输出不一致")
+
+        store.append(session_id, "user", message)
+        store.append(session_id, "assistant", random_text(rng))
+
+    return full_time / turns, incremental_time / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="请求体构建微基准测试")
+    parser.add_argument("--turns", type=int, default=50, help="每种历史长度运行的轮数")
+    parser.add_argument("--sizes", default="10,100,500,2000", help="初始历史消息数,逗号分隔")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    for api_style in ("openai", "anthropic"):
+        print(f"[{api_style}]")
+        for size in sizes:
+            full_time, incremental_time = bench_size(api_style, size, args.turns, rng)
+            print(
+                f"  历史 {size:>5} 条: 完整编码 {full_time * 1e6:9.1f} µs, "
+                f"增量编码 {incremental_time * 1e6:8.1f} µs, "
+                f"加速比 {full_time / incremental_time:6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
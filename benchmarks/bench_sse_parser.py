@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""SSE解析器微基准测试
+
+生成约1MB的OpenAI格式流式响应,按随机大小切分后分别交给旧的整缓冲区
+解析方式和SseParser处理,比较耗时并校验解析结果是否完整。
+
+用法: python benchmarks/bench_sse_parser.py [--size 1048576] [--seed 42]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse_parser import SseParser
+
+
+SAMPLE_TEXT = "流式响应Streaming response测试🍓,包含多字节字符。"
+
+
+def build_stream(target_size, rng, repeat_text=1):
+    """构建指定大小的SSE字节流
+
+    Args:
+        target_size: 目标字节数
+        rng: 随机数生成器
+        repeat_text: 每个事件内容的重复倍数,用于模拟大事件
+    """
+    parts = []
+    size = 0
+    while size < target_size:
+        start = rng.randrange(len(SAMPLE_TEXT))
+        content = SAMPLE_TEXT[start:start + rng.randint(1, 6)] * repeat_text
+        payload = {"choices": [{"index": 0, "delta": {"content": content}}]}
+        line = f"data: {json.dumps(payload, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+        parts.append(line)
+        size += len(line)
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def split_stream(data, rng, max_chunk):
+    """按随机大小切分字节流"""
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        step = rng.randint(1, max_chunk)
+        chunks.append(data[pos:pos + step])
+        pos += step
+    return chunks
+
+
+def legacy_parse(chunks):
+    """旧实现: 每次都解码整个缓冲区并重新编码剩余部分"""
+    buffer = b""
+    output = []
+    for chunk in chunks:
+        buffer += chunk
+        buffer_str = buffer.decode("utf-8", errors="ignore")
+        lines = buffer_str.split("\n")
+        processed_lines = 0
+        for line in lines:
+            line = line.strip()
+            if not line or line == "data: [DONE]":
+                processed_lines += 1
+                continue
+            if line.startswith("data: "):
+                try:
+                    data = json.loads(line[6:])
+                    output.append(data["choices"][0]["delta"]["content"])
+                    processed_lines += 1
+                except json.JSONDecodeError:
+                    break
+            else:
+                processed_lines += 1
+        if processed_lines > 0:
+            buffer = "\n".join(lines[processed_lines:]).encode("utf-8")
+    return output
+
+
+def parser_parse(chunks):
+    """新实现: 每个响应一个增量解析器"""
+    parser = SseParser()
+    output = []
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            if event.data == "[DONE]":
+                continue
+            output.append(json.loads(event.data)["choices"][0]["delta"]["content"])
+    for event in parser.finish():
+        if event.data != "[DONE]":
+            output.append(json.loads(event.data)["choices"][0]["delta"]["content"])
+    return output
+
+
+def parser_split_only(chunks):
+    """只切分事件,不解析JSON,用于单独衡量解析器本身的开销"""
+    parser = SseParser()
+    count = 0
+    for chunk in chunks:
+        count += len(parser.feed(chunk))
+    return count + len(parser.finish())
+
+
+def run(func, chunks, repeat):
+    """多次运行并返回最短耗时和结果"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_scenario(name, data, chunks, repeat):
+    """运行一个场景并打印结果"""
+    print(f"[{name}] 流大小: {len(data)} 字节, 数据包: {len(chunks)} 个")
+
+    new_time, new_output = run(parser_parse, chunks, repeat)
+    legacy_time, legacy_output = run(legacy_parse, chunks, repeat)
+    split_time, _ = run(parser_split_only, chunks, repeat)
+
+    expected = "".join(new_output)
+    print(f"  SseParser: {new_time * 1000:.1f} ms ({len(data) / new_time / 1e6:.1f} MB/s)")
+    print(f"  旧实现:    {legacy_time * 1000:.1f} ms ({len(data) / legacy_time / 1e6:.1f} MB/s)")
+    print(f"  加速比:    {legacy_time / new_time:.1f}x")
+    # 两种实现对每个事件都要解析JSON,小事件场景的耗时主要在JSON上
+    print(f"  其中切分:  {split_time * 1000:.1f} ms,其余为JSON解析")
+    # 旧实现使用errors="ignore"解码整个缓冲区,跨包截断的多字节字符和事件会丢失
+    print(f"  解析事件数:  SseParser {len(new_output)}, 旧实现 {len(legacy_output)}")
+    print(f"  旧实现输出完整: {expected == ''.join(legacy_output)} ({len(expected)} 字符)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE解析器微基准测试")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="流大小(字节)")
+    parser.add_argument("--max-chunk", type=int, default=2048, help="最大数据包大小(字节)")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    # 常见场景: 大量小增量事件
+    data = build_stream(args.size, rng)
+    bench_scenario("小事件", data, split_stream(data, rng, args.max_chunk), args.repeat)
+
+    # 单个事件跨越多个数据包,旧实现每个数据包都会重新解码整个事件
+    data = build_stream(args.size, rng, repeat_text=4096)
+    bench_scenario("大事件", data, split_stream(data, rng, args.max_chunk), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
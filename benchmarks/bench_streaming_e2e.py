@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""端到端流式链路基准测试
+
+启动本地模拟提供商服务器,通过LlmService向各API风格并发发送请求,
+输出每种风格的首字节时间、块间隔、总耗时、吞吐量以及错误数。不需要网络
+和API密钥,模拟的提供商只加入内存中的配置,不会写入model.toml。
+
+用法: python benchmarks/bench_streaming_e2e.py [--requests 20] [--concurrency 4]
+      [--ttfb-ms 100] [--tokens-per-s 200] [--tokens 200] [--fragment split]
+      [--error-rate 0.1] [--disconnect-rate 0.05]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from config_manager import ConfigManager
+from llm_service import LlmService
+from mock_provider_server import MockProviderServer
+
+
+STYLES = ("openai", "anthropic", "deepseek")
+
+MODEL_ID = "mock-model"
+
+
+def register_provider(server, style, max_concurrency):
+    """在内存配置中添加指向模拟服务器的提供商
+
+    Returns:
+        str: 提供商ID
+    """
+    provider_id = f"bench-mock-{style}"
+    ConfigManager.instance().get_all_providers()[provider_id] = {
+        "name": f"Mock {style}",
+        "api_style": "anthropic" if style == "anthropic" else "openai",
+        "api_url": server.url(style),
+        "api_key": "mock",
+        "max_concurrency": max_concurrency,
+        "max_retries": 2,
+        "retry_base_delay": 50,
+        "retry_max_delay": 200,
+        "stream_usage": True,
+        "models": [{"id": MODEL_ID, "name": "Mock", "max_tokens": 8192, "supports_stream": True}],
+    }
+    return provider_id
+
+
+def run_style(service, provider_id, requests):
+    """并发发送请求并等待全部完成
+
+    Returns:
+        (float, int): 总耗时(秒), 报告错误的请求数
+    """
+    pending = set()
+    errors = []
+    loop = QEventLoop()
+
+    def on_finished(session_id):
+        pending.discard(session_id)
+        if not pending:
+            loop.quit()
+
+    def on_error(session_id, message):
+        errors.append((session_id, message))
+
+    service.response_finished.connect(on_finished)
+    service.error_occurred.connect(on_error)
+
+    started = time.perf_counter()
+    for index in range(requests):
+        session_id = f"{provider_id}.{MODEL_ID}.{index}"
+        pending.add(session_id)
+        service.send_message(session_id, "请简要介绍一下你自己。", {"temperature": 0.7})
+
+    # 防止请求卡住时无限等待
+    QTimer.singleShot(120000, loop.quit)
+    loop.exec()
+    elapsed = time.perf_counter() - started
+
+    service.response_finished.disconnect(on_finished)
+    service.error_occurred.disconnect(on_error)
+    return elapsed, len(errors)
+
+
+def format_metric(summary, quantiles=("p50", "p90")):
+    """格式化一项指标的分位数"""
+    if not summary:
+        return "-"
+    return " / ".join(f"{summary[q]:.1f}" for q in quantiles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端流式链路基准测试")
+    parser.add_argument("--requests", type=int, default=20, help="每种风格的请求数")
+    parser.add_argument("--concurrency", type=int, default=4, help="每个提供商的并发数")
+    parser.add_argument("--ttfb-ms", type=int, default=100, help="模拟首字节时间(毫秒)")
+    parser.add_argument("--tokens-per-s", type=float, default=200, help="模拟输出速率")
+    parser.add_argument("--tokens", type=int, default=200, help="每个回复的token数")
+    parser.add_argument("--fragment", default="event", choices=("event", "split", "batch"), help="分块方式")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求失败的概率")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="中途断开的概率")
+    args = parser.parse_args()
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+    server = MockProviderServer(
+        ttfb_ms=args.ttfb_ms,
+        tokens_per_s=args.tokens_per_s,
+        tokens=args.tokens,
+        fragment=args.fragment,
+        error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate,
+    ).start()
+
+    service = LlmService()
+    service.set_response_cache_enabled(False)
+    service.set_similarity_cache_enabled(False)
+
+    print(f"请求数: {args.requests}, 并发: {args.concurrency}, 首字节: {args.ttfb_ms}ms, "
+          f"速率: {args.tokens_per_s}/s, token数: {args.tokens}, 分块: {args.fragment}")
+    print(f"{'风格':<10}{'耗时s':>8}{'错误':>6}{'首字节p50/p90':>18}{'块间隔p50/p99':>18}"
+          f"{'总耗时p50/p90':>20}{'字符/秒p50':>12}{'处理ms p99':>12}")
+
+    try:
+        for style in STYLES:
+            provider_id = register_provider(server, style, args.concurrency)
+            elapsed, errors = run_style(service, provider_id, args.requests)
+            metrics = service.request_metrics(provider_id, MODEL_ID).get(f"{provider_id}/{MODEL_ID}", {})
+            print(f"{style:<10}{elapsed:>8.2f}{errors:>6}"
+                  f"{format_metric(metrics.get('ttfb_ms')):>18}"
+                  f"{format_metric(metrics.get('chunk_gap_ms'), ('p50', 'p99')):>18}"
+                  f"{format_metric(metrics.get('duration_ms')):>20}"
+                  f"{format_metric(metrics.get('chars_per_s'), ('p50',)):>12}"
+                  f"{format_metric(metrics.get('process_ms'), ('p99',)):>12}")
+    finally:
+        server.stop()
+
+    print(f"服务器: {server.requests} 个请求, 注入错误 {server.errors} 次, 中途断开 {server.disconnects} 次")
+
+
+if __name__ == "__main__":
+    main()
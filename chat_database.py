@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import sqlite3
+import time
+
+from config_manager import ConfigManager
+from search_index import index_text, query_terms, build_match_query, make_snippet
+
+
+# 第1版表结构
+_SCHEMA_V1 = (
+    """CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        provider_id TEXT NOT NULL,
+        model_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_created ON messages(session_id, created_at)",
+)
+
+
+class StoredMessage:
+    """数据库中的一条消息"""
+
+    __slots__ = ("id", "session_id", "role", "content", "created_at")
+
+    def __init__(self, message_id, session_id, role, content, created_at):
+        self.id = message_id
+        self.session_id = session_id
+        self.role = role
+        self.content = content
+        self.created_at = created_at
+
+    def __repr__(self):
+        return f"StoredMessage({self.id}, {self.role!r}, {self.content[:20]!r})"
+
+
+class ChatDatabase:
+    """会话和消息的SQLite存储
+
+    使用WAL模式,读取不阻塞写入。启动时只读取会话元数据,消息按会话和ID
+    的索引分页读取。一轮对话的消息在提交时用一个事务写入。
+    所有读写都在界面线程中进行。
+
+    消息同时写入FTS5全文索引,中日韩文字按二字组切分后索引(见search_index)。
+    SQLite没有编译FTS5时搜索退化为逐条匹配。
+    """
+
+    _instance = None
+
+    # 数据库结构版本,保存在PRAGMA user_version中
+    SCHEMA_VERSION = 1
+
+    @classmethod
+    def instance(cls):
+        """获取应用程序共用的数据库,位于Data/Database/chat.db"""
+        if cls._instance is None:
+            directory = ConfigManager.instance().get_data_dir("Database")
+            cls._instance = ChatDatabase(os.path.join(directory, "chat.db"))
+        return cls._instance
+
+    def __init__(self, path):
+        """打开数据库,不存在时创建
+
+        Args:
+            path: 数据库文件路径,":memory:"为内存数据库
+        """
+        self._path = path
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+        self._fts = self._ensure_search_index()
+
+    def _migrate(self):
+        """按user_version创建或升级表结构"""
+        version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+
+        with self.transaction():
+            if version < 1:
+                for statement in _SCHEMA_V1:
+                    self._connection.execute(statement)
+            self._connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _ensure_search_index(self):
+        """创建全文索引,并为已有消息建立索引
+
+        Returns:
+            bool: FTS5可用时返回True
+        """
+        exists = self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return True
+
+        try:
+            with self.transaction():
+                self._connection.execute("CREATE VIRTUAL TABLE messages_fts USING fts5(text)")
+                rows = self._connection.execute("SELECT id, content FROM messages")
+                self._connection.executemany(
+                    "INSERT INTO messages_fts (rowid, text) VALUES (?, ?)",
+                    ((row[0], index_text(row[1])) for row in rows)
+                )
+        except sqlite3.OperationalError as e:
+            print(f"全文索引不可用,搜索将逐条匹配: {e}")
+            return False
+        return True
+
+    def transaction(self):
+        """开始一个事务,用作上下文管理器,异常时回滚
+
+        Returns:
+            _Transaction: 上下文管理器
+        """
+        return _Transaction(self._connection)
+
+    # 会话
+
+    def list_sessions(self):
+        """读取所有会话的元数据,不读取消息
+
+        Returns:
+            dict: 会话ID -> {"name", "provider_id", "model_id", "created_at", "updated_at"},按创建时间排列
+        """
+        rows = self._connection.execute(
+            "SELECT id, name, provider_id, model_id, created_at, updated_at FROM sessions ORDER BY created_at, rowid"
+        )
+        return {
+            row[0]: {
+                "name": row[1],
+                "provider_id": row[2],
+                "model_id": row[3],
+                "created_at": row[4],
+                "updated_at": row[5],
+            }
+            for row in rows
+        }
+
+    def get_session(self, session_id):
+        """读取一个会话的元数据
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            dict: 会话元数据,不存在时返回None
+        """
+        row = self._connection.execute(
+            "SELECT name, provider_id, model_id, created_at, updated_at FROM sessions WHERE id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "name": row[0],
+            "provider_id": row[1],
+            "model_id": row[2],
+            "created_at": row[3],
+            "updated_at": row[4],
+        }
+
+    def add_session(self, session_id, name, provider_id, model_id, created_at=None):
+        """添加会话
+
+        Args:
+            session_id: 会话ID
+            name: 会话名称
+            provider_id: 提供商ID
+            model_id: 模型ID
+            created_at: 创建时间(秒),为None时使用当前时间
+        """
+        created_at = time.time() if created_at is None else created_at
+        self._connection.execute(
+            "INSERT INTO sessions (id, name, provider_id, model_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, name, provider_id, model_id, created_at, created_at)
+        )
+
+    def rename_session(self, session_id, name):
+        """重命名会话
+
+        Args:
+            session_id: 会话ID
+            name: 新名称
+        """
+        self._connection.execute(
+            "UPDATE sessions SET name = ?, updated_at = ? WHERE id = ?",
+            (name, time.time(), session_id)
+        )
+
+    def delete_session(self, session_id):
+        """删除会话及其全部消息
+
+        Args:
+            session_id: 会话ID
+        """
+        with self.transaction():
+            self.clear_messages(session_id)
+            self._connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    # 消息
+
+    def append_messages(self, session_id, messages):
+        """在一个事务中追加消息
+
+        Args:
+            session_id: 会话ID,必须已存在
+            messages: (角色, 内容)或(角色, 内容, 时间)序列
+
+        Returns:
+            list: 新消息的ID
+        """
+        now = time.time()
+        ids = []
+        with self.transaction():
+            for message in messages:
+                created_at = message[2] if len(message) > 2 else now
+                cursor = self._connection.execute(
+                    "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    (session_id, message[0], message[1], created_at)
+                )
+                ids.append(cursor.lastrowid)
+                if self._fts:
+                    self._connection.execute(
+                        "INSERT INTO messages_fts (rowid, text) VALUES (?, ?)",
+                        (cursor.lastrowid, index_text(message[1]))
+                    )
+            if ids:
+                self._connection.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+        return ids
+
+    def load_messages(self, session_id, limit=None, before_id=None, after_id=None):
+        """按时间顺序读取会话的消息
+
+        Args:
+            session_id: 会话ID
+            limit: 最多读取的条数,取最新的部分;为None时读取全部
+            before_id: 只读取ID小于该值的消息,用于向前翻页
+            after_id: 只读取ID大于该值的消息,此时limit取最早的部分,用于向后翻页
+
+        Returns:
+            list: StoredMessage列表,从旧到新
+        """
+        query = "SELECT id, role, content, created_at FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        if after_id is not None:
+            query += " AND id > ? ORDER BY id"
+            params.append(after_id)
+        else:
+            query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = self._connection.execute(query, params).fetchall()
+        if after_id is None:
+            rows.reverse()
+        return [StoredMessage(row[0], session_id, row[1], row[2], row[3]) for row in rows]
+
+    def message_count(self, session_id):
+        """获取会话的消息数
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            int: 消息数
+        """
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def clear_messages(self, session_id):
+        """删除会话的全部消息,保留会话
+
+        Args:
+            session_id: 会话ID
+        """
+        with self.transaction():
+            if self._fts:
+                self._connection.execute(
+                    "DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages WHERE session_id = ?)",
+                    (session_id,)
+                )
+            self._connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    # 搜索
+
+    def search_messages(self, query, limit=50):
+        """在所有会话的消息中搜索
+
+        在所有检索词都出现的消息中按BM25相关度取最相关的limit条。
+
+        Args:
+            query: 搜索输入,多个词以空格分隔
+            limit: 最多返回的结果数
+
+        Returns:
+            list: 每项为{"message_id", "session_id", "session_name", "role", "snippet", "created_at"},
+                snippet为用<b>标出检索词的HTML片段
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        if self._fts:
+            # 先在全文索引中按相关度取前limit条,再读取消息和会话,连接只针对返回的结果
+            rows = self._connection.execute(
+                """SELECT m.id, m.session_id, s.name, m.role, m.content, m.created_at
+                   FROM (SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ?
+                         ORDER BY rank LIMIT ?) AS hits
+                   JOIN messages AS m ON m.id = hits.rowid
+                   JOIN sessions AS s ON s.id = m.session_id
+                   ORDER BY hits.rank""",
+                (build_match_query(terms), limit)
+            ).fetchall()
+        else:
+            conditions = " AND ".join("m.content LIKE ? ESCAPE '\\'" for _ in terms)
+            patterns = ["%" + re.sub(r"([%_\\])", r"\\\1", term) + "%" for term in terms]
+            rows = self._connection.execute(
+                f"""SELECT m.id, m.session_id, s.name, m.role, m.content, m.created_at
+                    FROM messages AS m JOIN sessions AS s ON s.id = m.session_id
+                    WHERE {conditions} ORDER BY m.id DESC LIMIT ?""",
+                (*patterns, limit)
+            ).fetchall()
+
+        return [
+            {
+                "message_id": row[0],
+                "session_id": row[1],
+                "session_name": row[2],
+                "role": row[3],
+                "snippet": make_snippet(row[4], terms),
+                "created_at": row[5],
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        """关闭数据库"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            if ChatDatabase._instance is self:
+                ChatDatabase._instance = None
+
+
+class _Transaction:
+    """BEGIN/COMMIT事务,可以嵌套,只有最外层生效"""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._outer = False
+
+    def __enter__(self):
+        self._outer = not self._connection.in_transaction
+        if self._outer:
+            self._connection.execute("BEGIN")
+        return self._connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._outer:
+            return False
+        if exc_type is None:
+            self._connection.execute("COMMIT")
+        else:
+            self._connection.execute("ROLLBACK")
+        return False
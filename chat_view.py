@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from PySide6.QtWidgets import (QWidget, QTextEdit, QLineEdit, QPushButton,
+import html
+from PySide6.QtWidgets import (QWidget, QTextEdit, QLineEdit, QPushButton, QLabel,
                               QVBoxLayout, QHBoxLayout, QMenu, QScrollBar, QMessageBox)
-from PySide6.QtCore import Qt, Signal, Slot, QDateTime
-from PySide6.QtGui import QAction, QTextCursor
+from PySide6.QtCore import Qt, Signal, Slot, QDateTime, QTimer
+from PySide6.QtGui import QAction, QTextCursor, QKeySequence, QShortcut, QTextCharFormat, QColor
+
+from chat_database import ChatDatabase
 
 
 class ChatView(QWidget):
@@ -13,21 +16,78 @@ class ChatView(QWidget):
     # 信号
     user_message_sent = Signal(str, str)  # 会话ID, 用户消息
     
-    def __init__(self, parent=None, session_id=None):
-        """初始化聊天视图"""
+    # 历史消息每页的条数,打开会话时显示最近一页,滚动到顶部时读取更早的一页
+    HISTORY_PAGE_SIZE = 50
+    
+    # 文档中最多保留的历史页数,超出后移除离可见区域最远的一页
+    MAX_LOADED_PAGES = 6
+    
+    def __init__(self, parent=None, session_id=None, database=None):
+        """初始化聊天视图
+        
+        Args:
+            parent: 父部件,即主窗口
+            session_id: 会话ID
+            database: 会话数据库,为None时使用ChatDatabase.instance()
+        """
         super().__init__(parent)
         self._is_streaming = False
         self._session_id = session_id
+        self._database = database or ChatDatabase.instance()
+        
+        # 分页显示的历史: 打开会话时显示的一页及之后的消息为底部,滚动时读取的各页在其上方。
+        # 向上翻过MAX_LOADED_PAGES页后底部被移除,文档只包含各页,滚动到底部时再读取较新的页
+        self._latest_oldest_id = None  # 底部最早的消息ID
+        self._has_older_messages = False
+        self._pages = []  # [最早消息ID, 最新消息ID, 文档中的字符数],按文档顺序
+        self._detached = False  # 底部已移除,文档不包含最新的消息
+        self._adjusting_pages = False  # 正在增删页面,忽略由此引起的滚动
+        # 已发送但回复尚未结束的用户消息(内容, 时间),本轮结束时才写入数据库
+        self._pending_user_message = None
+        
+        # 加入QStackedWidget后父部件会改变,在构造时取得LLM服务
+        self._llm_service = getattr(parent, "_llm_service", None)
+        
         self._setup_ui()
         self._connect_signals()
     
     def set_session_id(self, session_id):
         """设置会话ID"""
         self._session_id = session_id
+        self._schedule_token_estimate()
+    
+    def load_history(self):
+        """从数据库读取会话最近一页的消息并显示,更早的消息在滚动到顶部时读取
+        
+        Returns:
+            int: 显示的消息数
+        """
+        if not self._session_id:
+            return 0
+        
+        messages = self._database.load_messages(self._session_id, self.HISTORY_PAGE_SIZE)
+        self._latest_oldest_id = messages[0].id if messages else None
+        self._has_older_messages = len(messages) == self.HISTORY_PAGE_SIZE
+        self._pages = []
+        self._detached = False
+        
+        for stored in messages:
+            self._chat_display.append(self._format_stored_message(stored))
+        
+        self._chat_display.verticalScrollBar().setValue(
+            self._chat_display.verticalScrollBar().maximum()
+        )
+        # 第一页不足一屏时没有滚动条,无法滚动到顶部读取更早的消息
+        QTimer.singleShot(0, self._fill_viewport)
+        self._schedule_token_estimate()
+        return len(messages)
     
     def append_user_message(self, message):
-        """添加用户消息到聊天窗口"""
-        self._chat_display.append(self._format_user_message(message))
+        """添加用户消息到聊天窗口,回复结束前重新读取最近一页时会再次追加"""
+        self._show_latest()
+        self._chat_display.setExtraSelections([])
+        self._pending_user_message = (message, QDateTime.currentDateTime())
+        self._chat_display.append(self._format_user_message(*self._pending_user_message))
         self._chat_display.verticalScrollBar().setValue(
             self._chat_display.verticalScrollBar().maximum()
         )
@@ -35,15 +95,27 @@ class ChatView(QWidget):
     def append_assistant_message(self, message):
         """添加助手消息到聊天窗口"""
         self._is_streaming = False
+        self._show_latest()
         self._chat_display.append(self._format_assistant_message(message))
         self._chat_display.verticalScrollBar().setValue(
             self._chat_display.verticalScrollBar().maximum()
         )
     
+    def append_recovered_notice(self):
+        """在恢复的历史之后提示最后一轮回复曾在上次运行时中断"""
+        self._show_latest()
+        self._chat_display.append(
+            f"<p style='color:gray;'><i>{self.tr('回复在上次运行时中断,已恢复收到的部分')}</i></p>"
+        )
+        self._chat_display.verticalScrollBar().setValue(
+            self._chat_display.verticalScrollBar().maximum()
+        )
+    
     def append_streaming_content(self, content):
         """添加流式内容到聊天窗口"""
         if not self._is_streaming:
             # 开始新的流式响应
+            self._show_latest()
             self._is_streaming = True
             self._chat_display.append(self._format_assistant_message(""))
         
@@ -61,6 +133,64 @@ class ChatView(QWidget):
         """清空聊天内容"""
         self._chat_display.clear()
         self._is_streaming = False
+        self._pending_user_message = None
+        self._has_older_messages = False
+        self._pages = []
+        self._detached = False
+        self._schedule_token_estimate()
+    
+    def show_message(self, message_id):
+        """滚动到数据库中的一条消息并高亮显示
+        
+        消息不在文档中时从该消息开始读取一页,之后仍按分页规则上下滚动。
+        流式回复进行中时保留底部,只能定位已显示的消息。
+        
+        Args:
+            message_id: 消息ID
+        
+        Returns:
+            bool: 是否显示了消息
+        """
+        if not self._session_id:
+            return False
+        
+        span = self._message_span(message_id)
+        if span is None and not self._is_streaming:
+            self._load_page_at(message_id)
+            span = self._message_span(message_id)
+        if span is None:
+            return False
+        
+        cursor = QTextCursor(self._chat_display.document())
+        cursor.setPosition(span[0])
+        cursor.setPosition(span[1], QTextCursor.KeepAnchor)
+        highlight = QTextCharFormat()
+        highlight.setBackground(QColor(255, 240, 160))
+        selection = QTextEdit.ExtraSelection()
+        selection.cursor = cursor
+        selection.format = highlight
+        self._chat_display.setExtraSelections([selection])
+        
+        self._adjusting_pages = True
+        try:
+            self._chat_display.scrollToAnchor(self._message_anchor(message_id))
+        finally:
+            self._adjusting_pages = False
+        return True
+    
+    def update_token_estimate(self):
+        """更新下一次请求的token估算"""
+        if not self._session_id or self._llm_service is None:
+            self._token_label.clear()
+            return
+        
+        tokens = self._llm_service.estimate_request_tokens(
+            self._session_id, self._input_field.text().strip()
+        )
+        if tokens:
+            self._token_label.setText(self.tr("约 {} tokens").format(tokens))
+        else:
+            self._token_label.clear()
     
     def save_chat(self, file_path):
         """保存聊天记录
@@ -96,15 +226,15 @@ class ChatView(QWidget):
     def _connect_signals(self):
         """连接信号和槽"""
         # 获取LLM服务
-        main_window = self.parent()
-        if main_window and hasattr(main_window, "_llm_service"):
-            llm_service = main_window._llm_service
-            
+        llm_service = self._llm_service
+        if llm_service is not None:
             # 连接LLM服务信号
             llm_service.response_started.connect(self._on_response_started)
-            llm_service.response_chunk.connect(self._on_response_chunk)
+            llm_service.response_frame.connect(self._on_response_chunk)
             llm_service.response_finished.connect(self._on_response_finished)
+            llm_service.response_cancelled.connect(self._on_response_cancelled)
             llm_service.error_occurred.connect(self._on_error_occurred)
+            llm_service.similar_response_found.connect(self._on_similar_response_found)
     
     @Slot()
     def _on_send_button_clicked(self):
@@ -120,13 +250,21 @@ class ChatView(QWidget):
         self.user_message_sent.emit(self._session_id, message)
         
         # 发送消息到LLM服务
-        main_window = self.parent()
-        if main_window and hasattr(main_window, "_llm_service"):
-            main_window._llm_service.send_message(self._session_id, message)
+        if self._llm_service is not None:
+            self._llm_service.send_message(self._session_id, message)
         
         # 清空输入框
         self._input_field.clear()
     
+    @Slot()
+    def _on_stop_button_clicked(self):
+        """停止按钮点击处理"""
+        if self._stop_button.isHidden() or not self._session_id:
+            return
+        
+        if self._llm_service is not None:
+            self._llm_service.cancel_request(self._session_id)
+    
     @Slot()
     def _on_input_return_pressed(self):
         """输入框回车键处理"""
@@ -148,9 +286,8 @@ class ChatView(QWidget):
             self.clear_chat()
             
             # 清除LLM服务中的对话历史
-            main_window = self.parent()
-            if main_window and hasattr(main_window, "_llm_service") and self._session_id:
-                main_window._llm_service.clear_conversation_history(self._session_id)
+            if self._llm_service is not None and self._session_id:
+                self._llm_service.clear_conversation_history(self._session_id)
     
     @Slot(str)
     def _on_response_started(self, session_id):
@@ -158,8 +295,9 @@ class ChatView(QWidget):
         if session_id != self._session_id:
             return
         
-        # 禁用发送按钮
+        # 禁用发送按钮,显示停止按钮
         self._send_button.setEnabled(False)
+        self._stop_button.setVisible(True)
     
     @Slot(str, str)
     def _on_response_chunk(self, session_id, content):
@@ -178,9 +316,42 @@ class ChatView(QWidget):
         
         # 启用发送按钮
         self._send_button.setEnabled(True)
+        self._stop_button.setVisible(False)
         
-        # 重置流式状态
+        # 重置流式状态,用户消息已随本轮写入数据库
         self._is_streaming = False
+        self._pending_user_message = None
+        
+        # 历史已变化,重新估算token
+        self._schedule_token_estimate()
+    
+    @Slot(str)
+    def _on_response_cancelled(self, session_id):
+        """响应被取消处理"""
+        if session_id != self._session_id:
+            return
+        
+        self._show_latest()
+        self._chat_display.append(
+            f"<p style='color:gray;'><i>{self.tr('已停止生成')}</i></p>"
+        )
+        self._chat_display.verticalScrollBar().setValue(
+            self._chat_display.verticalScrollBar().maximum()
+        )
+        
+        self._on_response_finished(session_id)
+    
+    @Slot(str, str, float)
+    def _on_similar_response_found(self, session_id, content, similarity):
+        """显示近似问题的缓存回答,真实回复随后到达"""
+        if session_id != self._session_id:
+            return
+        
+        self._show_latest()
+        self._chat_display.append(self._format_similar_message(content, similarity))
+        self._chat_display.verticalScrollBar().setValue(
+            self._chat_display.verticalScrollBar().maximum()
+        )
     
     @Slot(str, str)
     def _on_error_occurred(self, session_id, error_message):
@@ -190,9 +361,11 @@ class ChatView(QWidget):
         
         # 显示错误消息
         self.append_assistant_message(f"错误: {error_message}")
+        self._pending_user_message = None
         
         # 启用发送按钮
         self._send_button.setEnabled(True)
+        self._stop_button.setVisible(False)
     
     def _setup_ui(self):
         """设置用户界面"""
@@ -204,6 +377,8 @@ class ChatView(QWidget):
         self._chat_display.setReadOnly(True)
         self._chat_display.setContextMenuPolicy(Qt.CustomContextMenu)
         self._chat_display.customContextMenuRequested.connect(self._show_context_menu)
+        self._chat_display.verticalScrollBar().valueChanged.connect(self._on_scroll_changed)
+        self._chat_display.verticalScrollBar().rangeChanged.connect(self._on_scroll_range_changed)
         
         # 创建输入区域
         input_widget = QWidget(self)
@@ -213,15 +388,41 @@ class ChatView(QWidget):
         self._input_field = QLineEdit(input_widget)
         self._input_field.setPlaceholderText(self.tr("输入消息..."))
         self._input_field.returnPressed.connect(self._on_input_return_pressed)
+        self._input_field.textChanged.connect(self._schedule_token_estimate)
+        self._input_field.textChanged.connect(self._on_input_text_changed)
+        # 输入框是否为空,只在从空变为非空时预热连接
+        self._input_empty = True
+        
+        # 下一次请求的token估算,输入停顿后再计算
+        self._token_label = QLabel(input_widget)
+        self._token_label.setObjectName("token_estimate_label")
+        self._token_label.setToolTip(self.tr("下一次请求将发送的估算token数"))
+        
+        self._token_timer = QTimer(self)
+        self._token_timer.setSingleShot(True)
+        self._token_timer.setInterval(200)
+        self._token_timer.timeout.connect(self.update_token_estimate)
         
         self._send_button = QPushButton(self.tr("发送"), input_widget)
         self._send_button.clicked.connect(self._on_send_button_clicked)
         
+        # 生成过程中显示停止按钮,Esc同样可以停止
+        self._stop_button = QPushButton(self.tr("停止"), input_widget)
+        self._stop_button.setToolTip(self.tr("停止生成 (Esc)"))
+        self._stop_button.setVisible(False)
+        self._stop_button.clicked.connect(self._on_stop_button_clicked)
+        
+        stop_shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        stop_shortcut.setContext(Qt.WidgetWithChildrenShortcut)
+        stop_shortcut.activated.connect(self._on_stop_button_clicked)
+        
         self._clear_button = QPushButton(self.tr("清除"), input_widget)
         self._clear_button.clicked.connect(self._on_clear_button_clicked)
         
         input_layout.addWidget(self._input_field)
+        input_layout.addWidget(self._token_label)
         input_layout.addWidget(self._send_button)
+        input_layout.addWidget(self._stop_button)
         input_layout.addWidget(self._clear_button)
         
         # 添加到主布局
@@ -231,6 +432,244 @@ class ChatView(QWidget):
         # 设置初始大小
         self.setMinimumSize(400, 300)
     
+    @Slot(int)
+    def _on_scroll_changed(self, value):
+        """滚动到顶部时读取更早的一页,滚动到底部时读取较新的一页或移除上方的页面"""
+        if self._adjusting_pages:
+            return
+        
+        scroll_bar = self._chat_display.verticalScrollBar()
+        if value == scroll_bar.minimum() and self._has_older_messages and scroll_bar.maximum() > 0:
+            self._load_older_page()
+            # 流式回复进行中时保留底部
+            if self._loaded_page_count() > self.MAX_LOADED_PAGES and not self._is_streaming:
+                self._remove_bottom_page()
+        elif value == scroll_bar.maximum():
+            if self._detached:
+                self._load_newer_page()
+                if self._loaded_page_count() > self.MAX_LOADED_PAGES:
+                    self._remove_top_page()
+            elif self._pages:
+                self._trim_older_pages()
+    
+    @Slot(int, int)
+    def _on_scroll_range_changed(self, minimum, maximum):
+        """内容变为不足一屏时继续读取更早的消息"""
+        if maximum == 0 and self._has_older_messages:
+            QTimer.singleShot(0, self._fill_viewport)
+    
+    @Slot()
+    def _fill_viewport(self):
+        """读取更早的页直到出现滚动条或没有更早的消息"""
+        scroll_bar = self._chat_display.verticalScrollBar()
+        while scroll_bar.maximum() == 0 and self._has_older_messages and not self._detached:
+            self._load_older_page()
+    
+    def _loaded_page_count(self):
+        """文档中的页数,底部算作一页"""
+        return len(self._pages) + (0 if self._detached else 1)
+    
+    def _oldest_loaded_id(self):
+        """文档中最早的消息ID"""
+        return self._pages[0][0] if self._pages else self._latest_oldest_id
+    
+    def _load_older_page(self):
+        """在顶部插入更早的一页消息,保持当前可见内容的位置不变"""
+        messages = self._database.load_messages(
+            self._session_id, self.HISTORY_PAGE_SIZE, before_id=self._oldest_loaded_id()
+        )
+        self._has_older_messages = len(messages) == self.HISTORY_PAGE_SIZE
+        if not messages:
+            return
+        
+        scroll_bar = self._chat_display.verticalScrollBar()
+        distance = scroll_bar.maximum() - scroll_bar.value()
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.movePosition(QTextCursor.Start)
+            cursor.insertHtml("".join(self._format_stored_message(stored) for stored in messages))
+            cursor.insertBlock()
+            
+            self._pages.insert(0, [messages[0].id, messages[-1].id, cursor.position()])
+            scroll_bar.setValue(scroll_bar.maximum() - distance)
+        finally:
+            self._adjusting_pages = False
+    
+    def _load_newer_page(self):
+        """底部已移除时在末尾追加较新的一页消息,读到最新的消息后恢复底部"""
+        messages = self._database.load_messages(
+            self._session_id, self.HISTORY_PAGE_SIZE, after_id=self._pages[-1][1]
+        )
+        
+        if len(messages) < self.HISTORY_PAGE_SIZE:
+            # 最新的消息作为底部,之后的新消息直接追加在其后
+            self._detached = False
+            if messages:
+                self._latest_oldest_id = messages[0].id
+            else:
+                self._latest_oldest_id = self._pages.pop()[0]
+        if not messages:
+            if not self._detached:
+                self._append_pending_user_message()
+            return
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.movePosition(QTextCursor.End)
+            start = cursor.position()
+            cursor.insertHtml("".join(self._format_stored_message(stored) for stored in messages))
+            if self._detached:
+                cursor.insertBlock()
+                self._pages.append([messages[0].id, messages[-1].id, cursor.position() - start])
+            else:
+                self._append_pending_user_message()
+        finally:
+            self._adjusting_pages = False
+    
+    def _remove_top_page(self):
+        """移除顶部的一页,保持当前可见内容的位置不变"""
+        scroll_bar = self._chat_display.verticalScrollBar()
+        distance = scroll_bar.maximum() - scroll_bar.value()
+        length = self._pages.pop(0)[2]
+        self._has_older_messages = True
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.setPosition(0)
+            cursor.setPosition(length, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+            scroll_bar.setValue(scroll_bar.maximum() - distance)
+        finally:
+            self._adjusting_pages = False
+    
+    def _remove_bottom_page(self):
+        """移除底部的一页,第一次移除的是打开会话时的一页及之后的消息"""
+        if self._detached:
+            self._pages.pop()
+        self._detached = True
+        start = sum(page[2] for page in self._pages)
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.setPosition(start)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        finally:
+            self._adjusting_pages = False
+    
+    def _trim_older_pages(self):
+        """移除滚动到顶部后插入的页面,文档只保留底部"""
+        length = sum(page[2] for page in self._pages)
+        self._has_older_messages = True
+        self._pages = []
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.setPosition(0)
+            cursor.setPosition(length, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        finally:
+            self._adjusting_pages = False
+    
+    def _load_page_at(self, message_id):
+        """从指定消息开始读取一页替换文档内容,消息在最近一页中时显示最近一页
+        
+        Args:
+            message_id: 消息ID
+        """
+        messages = self._database.load_messages(
+            self._session_id, self.HISTORY_PAGE_SIZE, after_id=message_id - 1
+        )
+        if not messages or messages[0].id != message_id:
+            # 消息不属于当前会话
+            return
+        
+        self._chat_display.clear()
+        if len(messages) < self.HISTORY_PAGE_SIZE:
+            self.load_history()
+            self._append_pending_user_message()
+            return
+        
+        self._adjusting_pages = True
+        try:
+            cursor = QTextCursor(self._chat_display.document())
+            cursor.insertHtml("".join(self._format_stored_message(stored) for stored in messages))
+            cursor.insertBlock()
+            self._pages = [[messages[0].id, messages[-1].id, cursor.position()]]
+            self._detached = True
+            self._has_older_messages = True
+        finally:
+            self._adjusting_pages = False
+    
+    def _message_span(self, message_id):
+        """查找历史消息在文档中的位置
+        
+        Args:
+            message_id: 消息ID
+        
+        Returns:
+            tuple: (起始位置, 结束位置),消息不在文档中时返回None
+        """
+        anchor = self._message_anchor(message_id)
+        block = self._chat_display.document().begin()
+        while block.isValid():
+            iterator = block.begin()
+            while not iterator.atEnd():
+                fragment = iterator.fragment()
+                iterator += 1
+                if anchor not in fragment.charFormat().anchorNames():
+                    continue
+                
+                # 消息不跨段落,插入时合并到同一段落的下一条消息从下一个锚点开始
+                end = block.position() + block.length() - 1
+                while not iterator.atEnd():
+                    following = iterator.fragment()
+                    if following.charFormat().anchorNames():
+                        end = following.position()
+                        break
+                    iterator += 1
+                return fragment.position(), end
+            block = block.next()
+        return None
+    
+    @staticmethod
+    def _message_anchor(message_id):
+        """历史消息在文档中的锚点名称"""
+        return f"msg-{message_id}"
+    
+    def _show_latest(self):
+        """底部已移除时重新显示最近一页,新的消息总是追加在最新的消息之后"""
+        if not self._detached:
+            return
+        
+        self._chat_display.clear()
+        self.load_history()
+        self._append_pending_user_message()
+    
+    def _append_pending_user_message(self):
+        """重新读取最近的消息后追加尚未写入数据库的用户消息"""
+        if self._pending_user_message is not None:
+            self._chat_display.append(self._format_user_message(*self._pending_user_message))
+    
+    @Slot()
+    def _schedule_token_estimate(self):
+        """延迟更新token估算"""
+        self._token_timer.start()
+    
+    @Slot(str)
+    def _on_input_text_changed(self, text):
+        """开始输入时预热到提供商的连接,之后的每次按键不再重复预热"""
+        was_empty = self._input_empty
+        self._input_empty = not text
+        if was_empty and text and self._session_id and self._llm_service is not None:
+            self._llm_service.preconnect(self._session_id)
+    
     def _show_context_menu(self, pos):
         """显示上下文菜单"""
         menu = self._chat_display.createStandardContextMenu()
@@ -240,16 +679,46 @@ class ChatView(QWidget):
         menu.addAction(clear_action)
         menu.exec(self._chat_display.mapToGlobal(pos))
     
-    def _format_user_message(self, message):
-        """格式化用户消息"""
-        now = QDateTime.currentDateTime()
+    def _format_user_message(self, message, time=None, anchor=""):
+        """格式化用户消息
+        
+        Args:
+            message: 消息内容(HTML)
+            time: 消息时间的QDateTime,为None时使用当前时间
+            anchor: 消息的锚点名称,可选
+        """
+        now = time or QDateTime.currentDateTime()
         timestamp = now.toString("HH:mm:ss")
+        name = f"<a name='{anchor}'></a>" if anchor else ""
+        
+        return f"<p style='margin-top:10px;'>{name}<b>{self.tr('用户')} [{timestamp}]:</b><br>{message}</p>"
+    
+    def _format_stored_message(self, stored):
+        """格式化数据库中的历史消息"""
+        content = html.escape(stored.content).replace("\n", "<br>")
+        timestamp = QDateTime.fromSecsSinceEpoch(int(stored.created_at))
+        anchor = self._message_anchor(stored.id)
+        if stored.role == "user":
+            return self._format_user_message(content, timestamp, anchor)
+        return self._format_assistant_message(content, timestamp, anchor)
+    
+    def _format_similar_message(self, message, similarity):
+        """格式化近似问题的缓存回答"""
+        title = self.tr("相似问题的历史回答 (相似度 {:.0%})").format(similarity)
+        body = html.escape(message).replace("\n", "<br>")
         
-        return f"<p style='margin-top:10px;'><b>{self.tr('用户')} [{timestamp}]:</b><br>{message}</p>"
+        return f"<p style='margin-top:10px; color:gray;'><b>{title}:</b><br>{body}</p>"
     
-    def _format_assistant_message(self, message):
-        """格式化助手消息"""
-        now = QDateTime.currentDateTime()
+    def _format_assistant_message(self, message, time=None, anchor=""):
+        """格式化助手消息
+        
+        Args:
+            message: 消息内容(HTML)
+            time: 消息时间的QDateTime,为None时使用当前时间
+            anchor: 消息的锚点名称,可选
+        """
+        now = time or QDateTime.currentDateTime()
         timestamp = now.toString("HH:mm:ss")
+        name = f"<a name='{anchor}'></a>" if anchor else ""
         
-        return f"<p style='margin-top:10px;'><b>{self.tr('AI助手')} [{timestamp}]:</b><br>{message}</p>" 
\ No newline at end of file
+        return f"<p style='margin-top:10px;'>{name}<b>{self.tr('AI助手')} [{timestamp}]:</b><br>{message}</p>" 
\ No newline at end of file
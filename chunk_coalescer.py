@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from PySide6.QtCore import QObject, Signal, Slot, QTimer, Qt
+
+
+class ChunkCoalescer(QObject):
+    """流式响应块合并器,按显示帧间隔批量输出每个会话的增量内容"""
+
+    # 信号
+    chunks_ready = Signal(str, str)  # 会话ID, 合并后的响应块
+
+    DEFAULT_INTERVAL = 16  # 毫秒,约60帧每秒
+
+    def __init__(self, interval=DEFAULT_INTERVAL, parent=None):
+        """初始化合并器
+
+        Args:
+            interval: 帧间隔(毫秒),0表示不合并
+            parent: 父对象
+        """
+        super().__init__(parent)
+
+        # 待输出的增量内容
+        self._pending = {}  # 会话ID -> [响应块]
+
+        # 帧定时器,只在有待输出内容时运行
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._on_frame)
+
+        self.set_interval(interval)
+
+    def interval(self):
+        """获取帧间隔(毫秒)"""
+        return self._interval
+
+    def set_interval(self, interval):
+        """设置帧间隔
+
+        Args:
+            interval: 帧间隔(毫秒),0表示不合并
+        """
+        self._interval = max(0, int(interval))
+        self._timer.setInterval(self._interval)
+
+    @Slot(str, str)
+    def add_chunk(self, session_id, content):
+        """添加一个响应块
+
+        Args:
+            session_id: 会话ID
+            content: 响应块
+        """
+        if not content:
+            return
+
+        if self._interval == 0:
+            self.chunks_ready.emit(session_id, content)
+            return
+
+        pending = self._pending.get(session_id)
+        if pending is None:
+            self._pending[session_id] = [content]
+        else:
+            pending.append(content)
+
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self, session_id=None):
+        """立即输出待处理内容
+
+        Args:
+            session_id: 会话ID,为None时输出所有会话
+        """
+        if session_id is None:
+            pending = self._pending
+            self._pending = {}
+            self._timer.stop()
+            for sid, chunks in pending.items():
+                self.chunks_ready.emit(sid, "".join(chunks))
+            return
+
+        chunks = self._pending.pop(session_id, None)
+        if not self._pending:
+            self._timer.stop()
+        if chunks:
+            self.chunks_ready.emit(session_id, "".join(chunks))
+
+    def discard(self, session_id):
+        """丢弃会话的待处理内容
+
+        Args:
+            session_id: 会话ID
+        """
+        self._pending.pop(session_id, None)
+        if not self._pending:
+            self._timer.stop()
+
+    def has_pending(self, session_id=None):
+        """检查是否有待输出内容"""
+        if session_id is None:
+            return bool(self._pending)
+        return session_id in self._pending
+
+    @Slot()
+    def _on_frame(self):
+        """帧定时器触发,输出所有会话的合并内容"""
+        self.flush()
@@ -26,7 +26,8 @@ class ConfigManager:
             raise RuntimeError("ConfigManager是单例类，请使用ConfigManager.instance()获取实例")
         
         # 配置文件路径
-        self._config_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data", "Files")
+        self._data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data")
+        self._config_dir = os.path.join(self._data_dir, "Files")
         self._config_file = os.path.join(self._config_dir, "custom.toml")
         self._default_config_file = os.path.join(self._config_dir, "default.toml")
         self._model_config_file = os.path.join(self._config_dir, "model.toml")
@@ -38,6 +39,9 @@ class ConfigManager:
         self._config = {}
         self._model_config = {}
         
+        # 模型配置每次加载或保存后递增，依赖提供商配置的缓存据此失效
+        self._model_config_version = 0
+        
         # 创建默认配置
         self._create_default_config()
         
@@ -58,17 +62,28 @@ class ConfigManager:
             "display": {
                 "theme": "light",
                 "font_size": 12,
-                "show_toolbar": True
+                "show_toolbar": True,
+                "stream_frame_interval": 16
             },
             "model": {
                 "default_model": "DeepSeek-R1",
-                "default_provider": "硅基流动"
+                "default_provider": "硅基流动",
+                "keep_partial_response": True,
+                "stream_journal": True
             },
             "network": {
                 "enable_search": True,
                 "search_engine": "Google",
                 "proxy_enabled": False,
-                "proxy_url": ""
+                "proxy_url": "",
+                "preconnect": True,
+                "http2": True
+            },
+            "cache": {
+                "response_cache": False,
+                "response_cache_size": 64,
+                "similarity_cache": False,
+                "similarity_threshold": 0.8
             }
         }
         
@@ -126,6 +141,7 @@ class ConfigManager:
         except Exception as e:
             print(f"加载模型配置文件失败: {e}")
             self._model_config = {"providers": {}}
+        self._model_config_version += 1
     
     def _create_default_model_config(self):
         """创建默认模型配置文件"""
@@ -138,8 +154,17 @@ class ConfigManager:
             "providers": {
                 "openai": {
                     "name": "OpenAI",
+                    "api_style": "openai",
                     "api_url": "https://api.openai.com/v1/chat/completions",
                     "api_key": "",
+                    "max_concurrency": 4,
+                    "max_retries": 2,
+                    "retry_base_delay": 500,
+                    "retry_max_delay": 8000,
+                    "hedge_after": 0,
+                    "first_byte_timeout": 0,
+                    "prompt_cache": True,
+                    "stream_usage": True,
                     "models": [
                         {
                             "id": "gpt-3.5-turbo",
@@ -157,8 +182,16 @@ class ConfigManager:
                 },
                 "deepseek": {
                     "name": "深度求索",
+                    "api_style": "openai",
                     "api_url": "https://api.deepseek.com/v1/chat/completions",
                     "api_key": "",
+                    "max_concurrency": 4,
+                    "max_retries": 2,
+                    "retry_base_delay": 500,
+                    "retry_max_delay": 8000,
+                    "hedge_after": 0,
+                    "first_byte_timeout": 0,
+                    "prompt_cache": True,
                     "models": [
                         {
                             "id": "deepseek-chat",
@@ -198,6 +231,7 @@ class ConfigManager:
     
     def save_model_config(self):
         """保存模型配置"""
+        self._model_config_version += 1
         try:
             with open(self._model_config_file, "w", encoding="utf-8") as f:
                 toml.dump(self._model_config, f)
@@ -222,6 +256,19 @@ class ConfigManager:
             print(f"重置配置失败: {e}")
             return False
     
+    def get_data_dir(self, *names):
+        """获取数据目录下的子目录,不存在时创建
+        
+        Args:
+            names: 子目录名
+        
+        Returns:
+            str: 目录路径
+        """
+        path = os.path.join(self._data_dir, *names)
+        os.makedirs(path, exist_ok=True)
+        return path
+    
     def get(self, section, key, default=None):
         """获取配置值
         
@@ -267,6 +314,14 @@ class ConfigManager:
         return self._config
     
     # 模型配置相关方法
+    def get_model_config_version(self):
+        """获取模型配置的版本号
+        
+        Returns:
+            int: 每次加载或保存模型配置后递增
+        """
+        return self._model_config_version
+    
     def get_all_providers(self):
         """获取所有模型提供商
         
@@ -323,6 +378,27 @@ class ConfigManager:
         except:
             return False
     
+    def get_model_groups(self):
+        """获取所有模型组
+        
+        模型组把多个提供商的等价模型归为一组，由ModelRouter在成员间选择
+        
+        Returns:
+            dict: 模型组ID -> {"name": 名称, "members": ["提供商ID/模型ID", ...]}
+        """
+        return self._model_config.get("model_groups", {})
+    
+    def get_model_group(self, group_id):
+        """获取指定模型组的配置
+        
+        Args:
+            group_id: 模型组ID
+        
+        Returns:
+            dict: 模型组配置，不存在时返回空字典
+        """
+        return self.get_model_groups().get(group_id, {})
+    
     def get_provider_api_key(self, provider_id):
         """获取提供商API密钥
         
@@ -368,6 +444,21 @@ class ConfigManager:
         provider = self.get_provider(provider_id)
         return provider.get("models", [])
     
+    def get_model(self, provider_id, model_id):
+        """获取提供商中指定模型的配置
+        
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+        
+        Returns:
+            dict: 模型配置，不存在时返回None
+        """
+        for model in self.get_provider_models(provider_id):
+            if model.get("id") == model_id:
+                return model
+        return None
+    
     def add_model_to_provider(self, provider_id, model_config):
         """向提供商添加模型
         
@@ -430,7 +521,7 @@ class ConfigManager:
         except:
             return False
     
-    def add_provider(self, provider_id, name, api_url="", api_key="", models=None):
+    def add_provider(self, provider_id, name, api_url="", api_key="", models=None, api_style="openai"):
         """添加新的提供商
         
         Args:
@@ -439,6 +530,7 @@ class ConfigManager:
             api_url: API URL
             api_key: API密钥
             models: 模型列表
+            api_style: API风格，决定请求和流式响应的格式
         
         Returns:
             bool: 是否成功
@@ -448,6 +540,7 @@ class ConfigManager:
         
         provider_config = {
             "name": name,
+            "api_style": api_style,
             "api_url": api_url,
             "api_key": api_key,
             "models": models
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from PySide6.QtCore import QElapsedTimer
+
+
+class RequestTiming:
+    """单个请求的连接计时
+
+    Qt只在新建连接时发出socketStartedConnecting,据此判断连接是否复用;
+    新连接从开始连接到请求写出的时间作为握手时间。
+    """
+
+    __slots__ = ("host", "clock", "reused", "connect_started_ms", "handshake_ms", "ttfb_ms")
+
+    def __init__(self, host):
+        """开始计时
+
+        Args:
+            host: 请求的主机名
+        """
+        self.host = host
+        self.clock = QElapsedTimer()
+        self.clock.start()
+        self.reused = True
+        self.connect_started_ms = None
+        self.handshake_ms = None
+        self.ttfb_ms = None
+
+    def socket_connecting(self):
+        """开始建立新连接"""
+        self.reused = False
+        if self.connect_started_ms is None:
+            self.connect_started_ms = self.clock.elapsed()
+
+    def request_sent(self):
+        """请求已写出"""
+        if self.connect_started_ms is not None and self.handshake_ms is None:
+            self.handshake_ms = self.clock.elapsed() - self.connect_started_ms
+
+    def first_byte(self):
+        """收到响应数据
+
+        Returns:
+            int: 首次调用时返回首字节毫秒数,之后返回None
+        """
+        if self.ttfb_ms is not None:
+            return None
+        self.ttfb_ms = self.clock.elapsed()
+        return self.ttfb_ms
+
+
+class _HostCounters:
+    """一个主机的连接计数"""
+
+    __slots__ = ("requests", "new_connections", "http2_requests")
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.http2_requests = 0
+
+
+class ConnectionStats:
+    """提供商连接统计
+
+    按连接是否复用分别记录首字节时间(TTFB),用于对比冷连接(需要DNS、
+    TCP和TLS握手)与预热或复用连接的延迟;并按主机统计新建与复用的连接、
+    每个连接承载的请求数和握手时间。
+    """
+
+    # 每类最多保留的样本数
+    MAX_SAMPLES = 200
+
+    def __init__(self):
+        """初始化统计"""
+        self._ttfb = {
+            "cold": deque(maxlen=self.MAX_SAMPLES),
+            "warm": deque(maxlen=self.MAX_SAMPLES),
+        }
+
+        self._handshakes = deque(maxlen=self.MAX_SAMPLES)
+        self._hosts = {}  # 主机名 -> _HostCounters
+
+        # 预连接次数
+        self.preconnects = 0
+
+        # 首字节前失败的重试次数,对冲请求数和对冲请求先到的次数
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        # 模型组内转到其他成员的次数
+        self.failovers = 0
+
+    def record_preconnect(self):
+        """记录一次预连接"""
+        self.preconnects += 1
+
+    def record_ttfb(self, ttfb_ms, reused):
+        """记录一次请求的首字节时间
+
+        Args:
+            ttfb_ms: 从发出请求到收到首个响应数据的毫秒数
+            reused: 是否使用了已建立的连接
+        """
+        self._ttfb["warm" if reused else "cold"].append(ttfb_ms)
+
+    def record_request(self, timing, http2):
+        """记录一个已完成请求的连接情况
+
+        Args:
+            timing: 请求的RequestTiming
+            http2: 是否使用了HTTP/2
+        """
+        counters = self._hosts.get(timing.host)
+        if counters is None:
+            counters = self._hosts[timing.host] = _HostCounters()
+
+        counters.requests += 1
+        if not timing.reused:
+            counters.new_connections += 1
+        if http2:
+            counters.http2_requests += 1
+        if timing.handshake_ms is not None:
+            self._handshakes.append(timing.handshake_ms)
+
+    def host_summary(self):
+        """按主机汇总连接复用情况
+
+        Returns:
+            dict: 主机名 -> requests、new_connections、reused、http2_requests、
+                streams_per_connection(每个新建连接平均承载的请求数)
+        """
+        summary = {}
+        for host, counters in self._hosts.items():
+            summary[host] = {
+                "requests": counters.requests,
+                "new_connections": counters.new_connections,
+                "reused": counters.requests - counters.new_connections,
+                "http2_requests": counters.http2_requests,
+                "streams_per_connection": round(counters.requests / max(1, counters.new_connections), 2),
+            }
+        return summary
+
+    def handshake_summary(self):
+        """汇总新建连接的握手时间
+
+        Returns:
+            dict: count、mean、p50、p90
+        """
+        return _summarize(self._handshakes)
+
+    def ttfb_summary(self):
+        """汇总冷连接和热连接的首字节时间
+
+        Returns:
+            dict: {"cold": {...}, "warm": {...}},每项包含count、mean、p50、p90
+        """
+        return {kind: _summarize(samples) for kind, samples in self._ttfb.items()}
+
+    def ttfb_percentile(self, quantile, min_samples=1):
+        """获取近期首字节时间的分位数,不区分冷热连接
+
+        Args:
+            quantile: 分位(0~1)
+            min_samples: 所需的最少样本数
+
+        Returns:
+            int: 毫秒数,样本不足时返回None
+        """
+        ordered = sorted(list(self._ttfb["cold"]) + list(self._ttfb["warm"]))
+        count = len(ordered)
+        if count < max(1, min_samples):
+            return None
+        return ordered[min(count - 1, int(count * quantile))]
+
+    def reset(self):
+        """清空统计"""
+        for samples in self._ttfb.values():
+            samples.clear()
+        self._handshakes.clear()
+        self._hosts.clear()
+        self.preconnects = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+
+def _summarize(samples):
+    """计算样本的数量、均值和分位数
+
+    Args:
+        samples: 毫秒数序列
+
+    Returns:
+        dict: count、mean、p50、p90,没有样本时除count外为None
+    """
+    count = len(samples)
+    if not count:
+        return {"count": 0, "mean": None, "p50": None, "p90": None}
+
+    ordered = sorted(samples)
+    return {
+        "count": count,
+        "mean": round(sum(ordered) / count, 1),
+        "p50": ordered[(count - 1) // 2],
+        "p90": ordered[min(count - 1, int(count * 0.9))],
+    }
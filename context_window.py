@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+
+from token_counter import TokenCounter
+
+
+class ContextWindowPlanner:
+    """上下文窗口规划器,在token预算内选择最近的历史消息
+
+    每个会话缓存历史消息token数的前缀和。历史只会追加,因此每轮只需
+    为新消息补充前缀和,再用二分查找确定起始位置。
+
+    指定slack时起始位置保持不变直到超出预算,超出后一次多裁掉slack比例的
+    预算,使之后若干轮请求的历史前缀相同,提供商的提示缓存得以命中。
+    """
+
+    def __init__(self, count_tokens=None):
+        """初始化规划器
+
+        Args:
+            count_tokens: 计算单条消息token数的函数,参数为ChatMessage
+        """
+        self._count_tokens = count_tokens or TokenCounter().count_message
+
+        # 前缀和缓存
+        self._prefix_sums = {}  # 会话ID -> [0, t1, t1+t2, ...]
+
+        # 上次选择的起始位置
+        self._starts = {}  # 会话ID -> 起始下标
+
+    def plan(self, session_id, history, budget, count_tokens=None, slack=0.0):
+        """选择能放入预算的最近历史消息
+
+        Args:
+            session_id: 会话ID
+            history: 已提交的历史消息序列
+            budget: 历史消息可用的token数
+            count_tokens: 本会话使用的计数函数,为None时使用默认函数
+            slack: 裁剪时额外空出的预算比例(0~1),为0时每轮都取尽量多的历史
+
+        Returns:
+            int: 应发送的第一条历史消息的下标,等于len(history)时不发送历史
+        """
+        count = len(history)
+        if count == 0:
+            return 0
+
+        if budget <= 0:
+            return count
+
+        prefix = self._update_prefix(session_id, history, count_tokens)
+        total = prefix[count]
+
+        if total <= budget:
+            self._starts.pop(session_id, None)
+            return 0
+
+        # 上次的起始位置仍能放入预算时保持不变
+        if slack > 0:
+            previous = self._starts.get(session_id)
+            if previous is not None and previous <= count and total - prefix[previous] <= budget:
+                return previous
+            budget = int(budget * (1 - slack))
+
+        # 最小的start使 total - prefix[start] <= budget
+        start = bisect.bisect_left(prefix, total - budget, 0, count + 1)
+
+        # 历史应从用户消息开始,避免以孤立的助手回复开头
+        while start < count and history[start].role != "user":
+            start += 1
+
+        if slack > 0:
+            self._starts[session_id] = start
+        return start
+
+    def history_tokens(self, session_id, history, start=0, count_tokens=None):
+        """获取从start开始的历史消息token总数
+
+        Args:
+            session_id: 会话ID
+            history: 已提交的历史消息序列
+            start: 起始下标
+            count_tokens: 本会话使用的计数函数,为None时使用默认函数
+
+        Returns:
+            int: token总数
+        """
+        prefix = self._update_prefix(session_id, history, count_tokens)
+        return prefix[len(history)] - prefix[start]
+
+    def invalidate(self, session_id):
+        """清除会话的前缀和缓存
+
+        Args:
+            session_id: 会话ID
+        """
+        self._prefix_sums.pop(session_id, None)
+        self._starts.pop(session_id, None)
+
+    def _update_prefix(self, session_id, history, count_tokens=None):
+        """为新追加的消息补充前缀和
+
+        Returns:
+            list: 前缀和列表
+        """
+        count_tokens = count_tokens or self._count_tokens
+        count = len(history)
+        prefix = self._prefix_sums.get(session_id)
+
+        # 历史被清除或替换时重新计算
+        if prefix is None or len(prefix) > count + 1:
+            prefix = [0]
+            self._prefix_sums[session_id] = prefix
+
+        total = prefix[-1]
+        for index in range(len(prefix) - 1, count):
+            total += count_tokens(history[index])
+            prefix.append(total)
+
+        return prefix
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class ChatMessage:
+    """一条对话消息"""
+
+    __slots__ = ("role", "content", "token_cache", "encoded")
+
+    def __init__(self, role, content):
+        """初始化消息
+
+        Args:
+            role: 角色(system/user/assistant)
+            content: 内容
+        """
+        self.role = role
+        self.content = content
+
+        # token计数缓存: (后端名称, token数)
+        self.token_cache = None
+
+        # 请求体中的JSON编码缓存
+        self.encoded = None
+
+    def to_dict(self):
+        """转换为API消息字典
+
+        Returns:
+            dict: {"role": ..., "content": ...}
+        """
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self):
+        return f"ChatMessage({self.role!r}, {self.content[:20]!r})"
+
+
+class ConversationStore:
+    """会话历史存储,流式回复按轮次累积,完成后作为一条消息提交"""
+
+    def __init__(self):
+        """初始化历史存储"""
+        # 已提交的消息
+        self._messages = {}  # 会话ID -> [ChatMessage]
+
+        # 正在生成的回复
+        self._turns = {}  # 会话ID -> (角色, [增量内容])
+
+        # 快照缓存,追加消息后失效
+        self._snapshots = {}  # 会话ID -> tuple
+
+    def append(self, session_id, role, content):
+        """追加一条完整消息
+
+        Args:
+            session_id: 会话ID
+            role: 角色
+            content: 内容
+
+        Returns:
+            ChatMessage: 新消息
+        """
+        message = ChatMessage(role, content)
+        self._messages.setdefault(session_id, []).append(message)
+        self._snapshots.pop(session_id, None)
+        return message
+
+    def pop_last(self, session_id, role=None):
+        """移除最后一条已提交的消息
+
+        Args:
+            session_id: 会话ID
+            role: 只在最后一条消息是该角色时移除,为None时不检查
+
+        Returns:
+            ChatMessage: 移除的消息,没有时返回None
+        """
+        messages = self._messages.get(session_id)
+        if not messages or (role is not None and messages[-1].role != role):
+            return None
+
+        self._snapshots.pop(session_id, None)
+        return messages.pop()
+
+    def begin_turn(self, session_id, role="assistant"):
+        """开始一轮新的流式回复,丢弃未提交的旧回复
+
+        Args:
+            session_id: 会话ID
+            role: 回复的角色
+        """
+        self._turns[session_id] = (role, [])
+
+    def append_delta(self, session_id, content):
+        """向当前回复追加增量内容,没有进行中的回复时自动开始
+
+        Args:
+            session_id: 会话ID
+            content: 增量内容
+        """
+        turn = self._turns.get(session_id)
+        if turn is None:
+            turn = self._turns[session_id] = ("assistant", [])
+        turn[1].append(content)
+
+    def pending_text(self, session_id):
+        """获取当前回复已累积的内容
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            str: 已累积的内容
+        """
+        turn = self._turns.get(session_id)
+        return "".join(turn[1]) if turn else ""
+
+    def has_turn(self, session_id):
+        """检查会话是否有进行中的回复"""
+        return session_id in self._turns
+
+    def commit_turn(self, session_id):
+        """将当前回复作为一条消息提交
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            ChatMessage: 提交的消息,没有内容时返回None
+        """
+        turn = self._turns.pop(session_id, None)
+        if not turn or not turn[1]:
+            return None
+
+        role, parts = turn
+        return self.append(session_id, role, "".join(parts))
+
+    def discard_turn(self, session_id):
+        """丢弃当前回复
+
+        Args:
+            session_id: 会话ID
+        """
+        self._turns.pop(session_id, None)
+
+    def snapshot(self, session_id):
+        """获取已提交消息的只读快照
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            tuple: ChatMessage元组
+        """
+        snapshot = self._snapshots.get(session_id)
+        if snapshot is None:
+            snapshot = tuple(self._messages.get(session_id, ()))
+            self._snapshots[session_id] = snapshot
+        return snapshot
+
+    def message_count(self, session_id):
+        """获取已提交消息数"""
+        return len(self._messages.get(session_id, ()))
+
+    def clear(self, session_id):
+        """清除会话的全部历史
+
+        Args:
+            session_id: 会话ID
+        """
+        self._messages.pop(session_id, None)
+        self._turns.pop(session_id, None)
+        self._snapshots.pop(session_id, None)
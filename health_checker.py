@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from PySide6.QtCore import QObject, Signal, QUrl, QTimer, QElapsedTimer
+from PySide6.QtNetwork import QNetworkRequest, QNetworkReply
+
+from config_manager import ConfigManager
+from provider_adapters import resolve_adapter
+
+
+class HealthCheckResult:
+    """一个模型的连通性检测结果,耗时均从发出请求开始计算,单位毫秒"""
+
+    __slots__ = ("provider_id", "model_id", "success", "message",
+                 "connect_ms", "ttfb_ms", "total_ms")
+
+    def __init__(self, provider_id, model_id, success, message,
+                 connect_ms=None, ttfb_ms=None, total_ms=None):
+        """初始化检测结果
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+            success: 是否成功
+            message: 结果说明
+            connect_ms: 建立连接并发出请求的耗时,复用连接时接近0
+            ttfb_ms: 收到响应头的耗时
+            total_ms: 收到完整响应的耗时
+        """
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.success = success
+        self.message = message
+        self.connect_ms = connect_ms
+        self.ttfb_ms = ttfb_ms
+        self.total_ms = total_ms
+
+    def summary(self):
+        """生成一行耗时摘要
+
+        Returns:
+            str: 如"连接 120 ms · 首字节 480 ms · 总计 520 ms"
+        """
+        parts = []
+        for label, value in (("连接", self.connect_ms), ("首字节", self.ttfb_ms), ("总计", self.total_ms)):
+            if value is not None:
+                parts.append(f"{label} {value} ms")
+        return " · ".join(parts)
+
+    def __repr__(self):
+        return f"HealthCheckResult({self.provider_id!r}, {self.model_id!r}, {self.success!r})"
+
+
+class _PendingCheck:
+    """进行中的检测"""
+
+    __slots__ = ("provider_id", "model_id", "clock", "connect_ms", "ttfb_ms", "timeout_timer", "timed_out")
+
+    def __init__(self, provider_id, model_id):
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.clock = QElapsedTimer()
+        self.clock.start()
+        self.connect_ms = None
+        self.ttfb_ms = None
+        self.timeout_timer = None
+        self.timed_out = False
+
+
+class ModelHealthChecker(QObject):
+    """模型连通性检测器
+
+    为每个模型发送一个极简的非流式请求,所有检测并发进行,不阻塞事件循环。
+    每个检测完成时发出check_finished,全部完成后发出all_checks_finished。
+    """
+
+    # 信号
+    check_started = Signal(str, str)  # 提供商ID, 模型ID
+    check_finished = Signal(str, str, object)  # 提供商ID, 模型ID, HealthCheckResult
+    all_checks_finished = Signal()
+
+    # 单个检测的超时时间(毫秒)
+    DEFAULT_TIMEOUT = 10000
+
+    # 检测请求的消息
+    TEST_MESSAGE = "Hello, this is a connection test."
+
+    def __init__(self, network_manager, ssl_config, parent=None):
+        """初始化检测器
+
+        Args:
+            network_manager: 共享的QNetworkAccessManager
+            ssl_config: 请求使用的QSslConfiguration
+            parent: 父对象
+        """
+        super().__init__(parent)
+
+        self._network_manager = network_manager
+        self._ssl_config = ssl_config
+        self._config_manager = ConfigManager.instance()
+        self._timeout = self.DEFAULT_TIMEOUT
+
+        # 进行中的检测
+        self._pending = {}  # QNetworkReply -> _PendingCheck
+
+    def set_timeout(self, timeout):
+        """设置单个检测的超时时间
+
+        Args:
+            timeout: 毫秒
+        """
+        self._timeout = max(1000, int(timeout))
+
+    def is_running(self):
+        """检查是否有进行中的检测"""
+        return bool(self._pending)
+
+    def check_model(self, provider_id, model_id):
+        """检测单个模型
+
+        配置错误时立即发出失败结果,否则发出请求并在完成时发出结果。
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+        """
+        self.check_started.emit(provider_id, model_id)
+
+        error = self._start_check(provider_id, model_id)
+        if error:
+            self.check_finished.emit(provider_id, model_id, HealthCheckResult(provider_id, model_id, False, error))
+            if not self._pending:
+                self.all_checks_finished.emit()
+
+    def check_provider(self, provider_id):
+        """并发检测提供商的所有模型
+
+        Args:
+            provider_id: 提供商ID
+
+        Returns:
+            int: 检测的模型数
+        """
+        models = self._config_manager.get_provider_models(provider_id)
+        return self._check_models([(provider_id, model.get("id")) for model in models if model.get("id")])
+
+    def check_all_providers(self):
+        """并发检测所有已配置密钥的提供商的全部模型
+
+        Returns:
+            int: 检测的模型数
+        """
+        targets = []
+        for provider_id, provider in self._config_manager.get_all_providers().items():
+            if not provider.get("api_key"):
+                continue
+            for model in self._config_manager.get_provider_models(provider_id):
+                if model.get("id"):
+                    targets.append((provider_id, model.get("id")))
+        return self._check_models(targets)
+
+    def cancel_all(self):
+        """取消所有进行中的检测,已取消的检测不再发出结果"""
+        pending = self._pending
+        self._pending = {}
+        for reply, check in pending.items():
+            if check.timeout_timer is not None:
+                check.timeout_timer.stop()
+            reply.abort()
+            reply.deleteLater()
+
+    def _check_models(self, targets):
+        """依次发出所有检测请求
+
+        Args:
+            targets: (提供商ID, 模型ID)列表
+
+        Returns:
+            int: 检测的模型数
+        """
+        if not targets:
+            if not self._pending:
+                self.all_checks_finished.emit()
+            return 0
+
+        failures = []
+        for provider_id, model_id in targets:
+            self.check_started.emit(provider_id, model_id)
+            error = self._start_check(provider_id, model_id)
+            if error:
+                failures.append(HealthCheckResult(provider_id, model_id, False, error))
+
+        # 所有请求发出后再报告配置错误,避免提前触发all_checks_finished
+        for result in failures:
+            self.check_finished.emit(result.provider_id, result.model_id, result)
+        if failures and not self._pending:
+            self.all_checks_finished.emit()
+
+        return len(targets)
+
+    def _start_check(self, provider_id, model_id):
+        """发出一个检测请求
+
+        Returns:
+            str: 配置错误信息,请求已发出时返回None
+        """
+        provider = self._config_manager.get_provider(provider_id)
+        if not provider:
+            return f"未找到提供商配置: {provider_id}"
+
+        api_url = provider.get("api_url", "")
+        api_key = provider.get("api_key", "")
+
+        if not api_url:
+            return "API URL未配置"
+
+        url = QUrl(api_url)
+        if not url.isValid() or url.scheme() not in ("http", "https"):
+            return f"API URL格式无效: {api_url}"
+
+        if not api_key:
+            return f"{provider_id} API密钥未配置"
+
+        request = QNetworkRequest(url)
+        request.setSslConfiguration(self._ssl_config)
+        request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
+
+        adapter = resolve_adapter(provider_id, provider)
+        for name, value in adapter.headers(api_key):
+            request.setRawHeader(name, value)
+
+        # 只请求少量token以快速完成
+        body = adapter.build_body(
+            model_id,
+            "",
+            [{"role": "user", "content": self.TEST_MESSAGE}],
+            {"max_tokens": 5},
+            stream=False
+        )
+
+        check = _PendingCheck(provider_id, model_id)
+        reply = self._network_manager.post(request, json.dumps(body).encode())
+        self._pending[reply] = check
+
+        reply.requestSent.connect(lambda: self._on_request_sent(reply))
+        reply.metaDataChanged.connect(lambda: self._on_meta_data_changed(reply))
+        reply.finished.connect(lambda: self._on_finished(reply))
+
+        timer = QTimer(reply)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self._on_timeout(reply))
+        timer.start(self._timeout)
+        check.timeout_timer = timer
+
+        return None
+
+    def _on_request_sent(self, reply):
+        """请求已写出,此前的耗时为DNS、TCP和TLS握手"""
+        check = self._pending.get(reply)
+        if check is not None and check.connect_ms is None:
+            check.connect_ms = check.clock.elapsed()
+
+    def _on_meta_data_changed(self, reply):
+        """收到响应头"""
+        check = self._pending.get(reply)
+        if check is not None and check.ttfb_ms is None:
+            check.ttfb_ms = check.clock.elapsed()
+
+    def _on_timeout(self, reply):
+        """检测超时"""
+        check = self._pending.get(reply)
+        if check is not None:
+            check.timed_out = True
+            reply.abort()
+
+    def _on_finished(self, reply):
+        """检测完成"""
+        check = self._pending.pop(reply, None)
+        if check is None:
+            # 已取消
+            return
+
+        check.timeout_timer.stop()
+        total_ms = check.clock.elapsed()
+
+        if check.timed_out:
+            success, message = False, f"连接超时({self._timeout // 1000}秒)"
+        elif reply.error() == QNetworkReply.NoError:
+            response_data = reply.readAll().data().decode("utf-8", errors="replace")
+            try:
+                json.loads(response_data)
+                success, message = True, f"连接成功: {check.provider_id}/{check.model_id}"
+            except json.JSONDecodeError:
+                success, message = False, f"无法解析响应: {response_data[:100]}..."
+        else:
+            status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+            detail = reply.readAll().data().decode("utf-8", errors="replace")[:200]
+            message = f"连接错误: {reply.errorString()}"
+            if status:
+                message = f"HTTP {status} {message}"
+            if detail:
+                message = f"{message}\n{detail}"
+            success = False
+
+        reply.deleteLater()
+
+        result = HealthCheckResult(
+            check.provider_id,
+            check.model_id,
+            success,
+            message,
+            check.connect_ms,
+            check.ttfb_ms,
+            total_ms
+        )
+        self.check_finished.emit(check.provider_id, check.model_id, result)
+
+        if not self._pending:
+            self.all_checks_finished.emit()
@@ -1,12 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import json
 import re
-from PySide6.QtCore import QObject, Signal, Slot, QSettings, QByteArray, QUrl, QEventLoop, QTimer
+import sqlite3
+import time
+from PySide6.QtCore import QObject, Signal, Slot, QSettings, QUrl, QElapsedTimer, QByteArray, QTimer, QCoreApplication
 from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply, QSsl, QSslConfiguration
 
 from config_manager import ConfigManager
+from sse_parser import SseParser
+from chunk_coalescer import ChunkCoalescer
+from request_scheduler import RequestScheduler, ScheduledRequest
+from conversation_store import ConversationStore
+from context_window import ContextWindowPlanner
+from token_counter import TokenCounter, MESSAGE_OVERHEAD
+from provider_adapters import resolve_adapter
+from request_encoder import RequestBodyEncoder
+from health_checker import ModelHealthChecker
+from connection_stats import ConnectionStats, RequestTiming
+from retry_policy import RetryPolicy
+from response_cache import ResponseCache
+from similarity_cache import SimilarityCache
+from request_metrics import RequestMetrics, RequestRecord
+from model_router import ModelRouter
+from rate_limiter import RateLimitTracker, rate_limit_key, request_cost
+from stream_journal import StreamJournal
+from chat_database import ChatDatabase
+
+
+# 未指定数据库时使用共享的ChatDatabase实例
+_DEFAULT_DATABASE = object()
 
 
 class LlmService(QObject):
@@ -14,14 +39,43 @@ class LlmService(QObject):
     
     # 信号
     response_started = Signal(str)  # 会话ID
-    response_chunk = Signal(str, str)  # 会话ID, 响应块
+    response_chunk = Signal(str, str)  # 会话ID, 响应块(每个增量)
+    response_frame = Signal(str, str)  # 会话ID, 按显示帧合并的响应块
     response_finished = Signal(str)  # 会话ID
+    response_cancelled = Signal(str)  # 会话ID
     error_occurred = Signal(str, str)  # 会话ID, 错误信息
+    usage_reported = Signal(str, dict)  # 会话ID, token用量
     all_requests_finished = Signal()
+    queue_depth_changed = Signal(int, int)  # 排队数, 进行中数
     connection_test_result = Signal(bool, str)
+    model_test_started = Signal(str, str)  # 提供商ID, 模型ID
+    model_test_finished = Signal(str, str, object)  # 提供商ID, 模型ID, HealthCheckResult
+    model_tests_finished = Signal()
+    ttfb_measured = Signal(str, int, bool)  # 会话ID, 首字节毫秒数, 是否复用连接
+    similar_response_found = Signal(str, str, float)  # 会话ID, 近似问题的缓存回答, 相似度
+    request_metrics_recorded = Signal(str, dict)  # 会话ID, 单个请求的延迟和吞吐量
+    request_routed = Signal(str, str, str)  # 会话ID, 提供商ID, 模型ID
+    
+    # 同一主机两次预连接的最小间隔(毫秒),空闲连接在此期间保持可用
+    PRECONNECT_INTERVAL = 60000
+    
+    # 启用提示缓存时,历史超出预算后额外裁掉的预算比例,使之后几轮的前缀保持不变
+    PROMPT_CACHE_SLACK = 0.25
+    
+    # 流式日志写盘间隔(毫秒),崩溃时最多丢失这段时间内的内容
+    JOURNAL_FLUSH_INTERVAL = 200
     
-    def __init__(self, parent=None):
-        """初始化LLM服务"""
+    # 首次使用会话时从数据库读入的最近消息数,更早的消息超出上下文窗口
+    HISTORY_LOAD_LIMIT = 200
+    
+    def __init__(self, parent=None, chat_database=_DEFAULT_DATABASE, journal=True):
+        """初始化LLM服务
+        
+        Args:
+            parent: 父对象
+            chat_database: 保存会话历史的ChatDatabase,默认使用共享实例,为None时不打开数据库
+            journal: 是否按配置启用流式日志,为False时不创建日志文件
+        """
         super().__init__(parent)
         
         # 初始化网络管理器
@@ -29,31 +83,139 @@ class LlmService(QObject):
         self._current_reply = None
         self._current_provider = "openai"  # 默认使用OpenAI
         
-        # 缓存响应数据
-        self._response_buffer = QByteArray()
+        # 每个响应独立的流式解析器
+        self._stream_parsers = {}  # QNetworkReply -> SseParser
+        
+        # 会话使用的提供商适配器,每次发送时解析一次
+        self._session_adapters = {}  # 会话ID -> ProviderAdapter
         
-        # 活跃请求计数
-        self._active_requests = 0
+        # 按提供商缓存的适配器,模型配置重新加载或保存后失效
+        self._provider_adapters = {}  # 提供商ID -> ProviderAdapter
+        self._adapter_config_version = None
+        
+        # 显式登记的会话模型,优先于从会话ID解析
+        self._session_models = {}  # 会话ID -> (提供商ID, 模型ID)
+        self._reply_usage = {}  # QNetworkReply -> token用量
+        
+        # 请求调度器,负责并发限制和排队
+        self._scheduler = RequestScheduler(self)
+        self._scheduler.queue_depth_changed.connect(self.queue_depth_changed)
+        self._reply_requests = {}  # QNetworkReply -> ScheduledRequest
+        
+        # 按API密钥跟踪响应头报告的速率限制,额度不足的请求在队列中等待
+        self._rate_limits = RateLimitTracker()
+        self._scheduler.set_rate_limiter(self._rate_limits)
+        
+        # 当前可见的会话,其请求优先调度
+        self._foreground_session_id = None
         
         # 会话历史
-        self._conversation_histories = {}  # 会话ID -> 对话历史
+        self._history_store = ConversationStore()
+        
+        # 会话数据库,数据库中存在的会话在首次使用时读入历史,每轮结束时写回
+        self._database = ChatDatabase.instance() if chat_database is _DEFAULT_DATABASE else chat_database
+        self._persisted_counts = {}  # 会话ID -> 历史中已写入数据库的消息数
+        
+        # 上下文窗口规划器,按模型的max_tokens裁剪历史
+        self._context_planner = ContextWindowPlanner()
+        
+        # token计数器
+        self._token_counters = {}  # 后端名称 -> TokenCounter
+        
+        # 请求体编码器,缓存已编码的历史消息
+        self._body_encoder = RequestBodyEncoder()
         
         # 当前活跃会话的请求
         self._active_session_replies = {}  # 会话ID -> QNetworkReply
         
+        # 取消请求时是否保留已收到的部分回复
+        self._keep_partial_response = True
+        
+        # 进行中回复的追加写日志,崩溃后恢复部分回复,按间隔批量写盘
+        self._stream_journal = None
+        self._journal_allowed = journal
+        self._recovered_responses = {}  # 会话ID -> [恢复的轮次]
+        self._journal_flush_timer = QTimer(self)
+        self._journal_flush_timer.setSingleShot(True)
+        self._journal_flush_timer.setInterval(self.JOURNAL_FLUSH_INTERVAL)
+        self._journal_flush_timer.timeout.connect(self._flush_stream_journal)
+        
+        # 连接预热和首字节时间统计
+        self._preconnect_enabled = True
+        self._warm_hosts = {}  # (协议, 主机, 端口) -> 最近一次连接的QElapsedTimer
+        self._reply_timings = {}  # QNetworkReply -> RequestTiming
+        self._connection_stats = ConnectionStats()
+        
+        # 按提供商和模型汇总的请求延迟和吞吐量
+        self._request_metrics = RequestMetrics()
+        self._job_records = {}  # ScheduledRequest -> RequestRecord
+        
+        # 模型组路由,按实时的首字节时间和错误率选择成员
+        self._router = ModelRouter()
+        self._session_groups = {}  # 会话ID -> 模型组ID
+        self._routed_messages = {}  # 会话ID -> (消息, 上下文),首字节前失败时转到下一个成员
+        self._route_tried = {}  # 会话ID -> 本次消息已尝试的成员集合
+        self.request_metrics_recorded.connect(
+            lambda _session_id, metrics: self._router.record(
+                metrics["provider_id"], metrics["model_id"], metrics["ttfb_ms"], metrics["error"]
+            )
+        )
+        
+        # 首字节前失败的重试和对冲请求
+        self._retry_policies = {}  # 会话ID -> RetryPolicy
+        self._job_payloads = {}  # ScheduledRequest -> (QNetworkRequest, 请求体)
+        self._hedge_replies = {}  # 会话ID -> 对冲请求的QNetworkReply
+        self._pending_retries = {}  # 会话ID -> (ScheduledRequest, QTimer)
+        
+        # 确定性请求的磁盘响应缓存,默认关闭
+        self._response_cache = None
+        self._cache_keys = {}  # 会话ID -> 进行中请求的缓存键
+        self._pending_replays = {}  # 会话ID -> 待回放的缓存回复
+        
+        # 近似重复问题缓存,默认关闭
+        self._similarity_cache = None
+        self._similarity_prompts = {}  # 会话ID -> (范围, 问题),只记录第一轮
+        self._similarity_save_timer = QTimer(self)
+        self._similarity_save_timer.setSingleShot(True)
+        self._similarity_save_timer.setInterval(2000)
+        self._similarity_save_timer.timeout.connect(self._save_similarity_cache)
+        
+        # 退出前保存尚未写入的索引
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self._save_similarity_cache)
+            app.aboutToQuit.connect(self._close_stream_journal)
+        
         # 初始化SSL配置
         self._ssl_config = QSslConfiguration.defaultConfiguration()
         self._ssl_config.setProtocol(QSsl.TlsV1_2OrLater)
         
+        # 是否协商HTTP/2,同一提供商的所有会话共用一个多路复用连接
+        self._http2_enabled = True
+        
         # 配置管理器
         self._config_manager = ConfigManager.instance()
         
+        # 模型连通性检测,与对话请求共享网络管理器
+        self._health_checker = ModelHealthChecker(self._network_manager, self._ssl_config, self)
+        self._health_checker.check_started.connect(self.model_test_started)
+        self._health_checker.check_finished.connect(self.model_test_finished)
+        self._health_checker.all_checks_finished.connect(self.model_tests_finished)
+        
+        # 按帧合并响应块,减少界面刷新次数
+        self._chunk_coalescer = ChunkCoalescer(parent=self)
+        self.response_chunk.connect(self._chunk_coalescer.add_chunk)
+        self._chunk_coalescer.chunks_ready.connect(self.response_frame)
+        
         # 加载设置
         self._load_settings()
     
     def send_message(self, session_id, message, context=None):
         """发送消息到LLM
         
+        绑定了模型组的会话先由路由器选择成员,并登记为会话的提供商和模型。
+        会话管理器创建的模型组会话在数据库中以ModelRouter.GROUP_PROVIDER为提供商。
+        
         Args:
             session_id: 会话ID
             message: 用户消息
@@ -62,6 +224,31 @@ class LlmService(QObject):
         if context is None:
             context = {}
         
+        group_id = self._session_group(session_id)
+        if group_id is not None:
+            member = self._router.choose(group_id)
+            if member is None:
+                self.error_occurred.emit(session_id, f"模型组没有可用的成员: {group_id}")
+                return
+            
+            self._route_tried[session_id] = set()
+            self._routed_messages[session_id] = (message, context)
+            self._route_session(session_id, member)
+        
+        self._submit_message(session_id, message, context)
+    
+    def _submit_message(self, session_id, message, context):
+        """按会话当前的提供商和模型发送消息
+        
+        Args:
+            session_id: 会话ID
+            message: 用户消息
+            context: 上下文信息
+        """
+        
+        # 构建请求体时需要会话ID读取历史
+        context = dict(context, session_id=session_id)
+        
         # 取消任何活跃的请求
         self.cancel_request(session_id)
         
@@ -98,59 +285,736 @@ class LlmService(QObject):
         
         # 获取模型配置
         model_id = session_info["model_id"]
-        model_config = None
-        
-        for model in provider.get("models", []):
-            if model.get("id") == model_id:
-                model_config = model
-                break
+        model_config = self._config_manager.get_model(provider_id, model_id)
         
         if not model_config:
             self.error_occurred.emit(session_id, f"未找到模型配置: {model_id}")
             return
         
+        # 解析API风格对应的适配器
+        adapter = self._provider_adapter(provider_id, provider)
+        self._session_adapters[session_id] = adapter
+        self._retry_policies[session_id] = RetryPolicy.from_config(provider)
+        
         # 创建请求
-        request = self._create_request(provider_api_url, provider_id, api_key)
+        request = self._create_request(provider_api_url, adapter, api_key)
         
         # 构建请求体
-        request_body = self._build_request_body(provider_id, model_id, message, context)
+        request_body = self._build_request_body(adapter, provider_id, model_id, message, context)
+        
+        # 在存储用户消息前计算缓存键,与请求体使用相同的历史
+        cache_key = self._response_cache_key(provider_id, model_id, message, context)
+        
+        # 速率限制额度按输入token估算加上最大输出token计算
+        rate_cost = request_cost(
+            self.estimate_request_tokens(session_id, message, context),
+            context.get("max_tokens", 1000)
+        )
+        
+        # 近似问题的回答只在会话第一轮借用,之后的问题依赖前面的对话
+        first_turn = not self._get_conversation_history(session_id)
         
         # 存储对话历史
         self._store_conversation_history(session_id, "user", message)
         
-        # 发送请求
-        self._active_requests += 1
+        # 发送开始响应信号
+        self.response_started.emit(session_id)
+        
+        # 缓存命中时回放缓存的回复,不发送请求
+        if cache_key is not None:
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                self._pending_replays[session_id] = cached
+                QTimer.singleShot(0, lambda: self._replay_cached_response(session_id))
+                return
+            self._cache_keys[session_id] = cache_key
+        
+        # 近似重复的问题先给出缓存的回答,真实请求照常发送
+        if self._similarity_cache is not None and first_turn:
+            scope = SimilarityCache.make_scope(provider_id, model_id, context.get("system_prompt", ""))
+            match = self._similarity_cache.lookup(scope, message)
+            if match is not None:
+                self.similar_response_found.emit(session_id, match[0], match[1])
+            self._similarity_prompts[session_id] = (scope, message)
+        
+        # 提交到调度器,超出并发限制时排队
+        if session_id == self._foreground_session_id:
+            priority = RequestScheduler.PRIORITY_FOREGROUND
+        else:
+            priority = RequestScheduler.PRIORITY_BACKGROUND
+        
+        scheduled = ScheduledRequest(
+            session_id,
+            provider_id,
+            model_id,
+            lambda job: self._dispatch_request(job, request, request_body, message),
+            priority,
+            rate_limit_key(provider_api_url, api_key),
+            rate_cost
+        )
+        self._scheduler.submit(scheduled)
+    
+    def _dispatch_request(self, job, request, request_body, message):
+        """调度器分配名额后发送请求
+        
+        Args:
+            job: ScheduledRequest对象
+            request: QNetworkRequest
+            request_body: 请求体
+            message: 本轮的用户消息,记录到流式日志
+        """
+        session_id = job.session_id
+        
+        # 保留请求用于重试和对冲
+        self._job_payloads[job] = (request, request_body)
+        self._job_records[job] = RequestRecord(job.provider_id, job.model_id, job.queue_wait() * 1000)
+        self._history_store.begin_turn(session_id)
+        if self._stream_journal is not None:
+            self._stream_journal.begin(session_id, message, job.provider_id, job.model_id)
+            self._journal_flush_timer.start()
+        
+        reply = self._post_attempt(job, 0)
+        self._active_session_replies[session_id] = reply
+        self._watch_first_byte(reply)
+    
+    def _post_attempt(self, job, attempt):
+        """发送一次请求
+        
+        Args:
+            job: ScheduledRequest对象
+            attempt: 已重试次数
+            
+        Returns:
+            QNetworkReply: 网络响应
+        """
+        request, request_body = self._job_payloads[job]
+        self._mark_host_warm(request.url())
+        
+        timing = RequestTiming(request.url().host())
         reply = self._network_manager.post(request, request_body)
         
         # 存储会话ID
-        reply.setProperty("session_id", session_id)
+        reply.setProperty("session_id", job.session_id)
+        reply.setProperty("attempt", attempt)
         
-        # 保存到活跃会话请求
-        self._active_session_replies[session_id] = reply
+        # 连接计时
+        self._reply_timings[reply] = timing
+        reply.socketStartedConnecting.connect(lambda: timing.socket_connecting())
+        reply.requestSent.connect(lambda: timing.request_sent())
+        
+        self._reply_requests[reply] = job
+        self._stream_parsers[reply] = SseParser()
         
         # 连接信号
         reply.finished.connect(self._on_network_reply_finished)
         reply.readyRead.connect(self._on_network_reply_ready_read)
         reply.errorOccurred.connect(self._on_network_reply_error)
+        reply.metaDataChanged.connect(self._on_network_reply_headers)
         
-        # 发送开始响应信号
-        self.response_started.emit(session_id)
+        return reply
     
-    def cancel_request(self, session_id):
-        """取消当前请求
+    def _watch_first_byte(self, reply):
+        """按重试策略启动对冲和首字节超时计时器
+        
+        Args:
+            reply: 会话的主请求
+        """
+        policy = self._retry_policies.get(reply.property("session_id"))
+        if policy is None:
+            return
+        
+        hedge_delay = policy.hedge_delay(self._connection_stats.ttfb_percentile)
+        if hedge_delay:
+            hedge_timer = QTimer(reply)
+            hedge_timer.setSingleShot(True)
+            hedge_timer.timeout.connect(lambda: self._send_hedge(reply))
+            hedge_timer.start(hedge_delay)
+        
+        if policy.first_byte_timeout:
+            timeout_timer = QTimer(reply)
+            timeout_timer.setSingleShot(True)
+            timeout_timer.timeout.connect(lambda: self._on_first_byte_timeout(reply))
+            timeout_timer.start(policy.first_byte_timeout)
+    
+    def _awaiting_first_byte(self, reply):
+        """检查请求是否仍在等待首个响应字节"""
+        timing = self._reply_timings.get(reply)
+        return timing is not None and timing.ttfb_ms is None
+    
+    def _send_hedge(self, primary):
+        """主请求迟迟没有首字节时发送相同的对冲请求
+        
+        Args:
+            primary: 主请求
+        """
+        session_id = primary.property("session_id")
+        if self._active_session_replies.get(session_id) is not primary or session_id in self._hedge_replies:
+            return
+        
+        job = self._reply_requests.get(primary)
+        if job is None or not self._awaiting_first_byte(primary):
+            return
+        
+        self._hedge_replies[session_id] = self._post_attempt(job, primary.property("attempt"))
+        self._connection_stats.hedges += 1
+    
+    def _on_first_byte_timeout(self, reply):
+        """等待首字节超时,中止请求并按可重试错误处理"""
+        if reply.property("abandoned") or not self._awaiting_first_byte(reply):
+            return
+        
+        reply.setProperty("timed_out", True)
+        reply.abort()
+    
+    def _on_first_byte(self, session_id, reply):
+        """请求收到首个字节,与对冲请求比较后留下先到的一个
         
         Args:
             session_id: 会话ID
+            reply: 收到首字节的请求
         """
-        if session_id in self._active_session_replies:
-            reply = self._active_session_replies[session_id]
-            if reply and reply.isRunning():
-                reply.abort()
-            del self._active_session_replies[session_id]
+        hedge = self._hedge_replies.pop(session_id, None)
+        if hedge is None:
+            return
+        
+        if hedge is reply:
+            # 对冲请求先到,取代主请求
+            primary = self._active_session_replies.get(session_id)
+            self._active_session_replies[session_id] = reply
+            self._connection_stats.hedge_wins += 1
+            if primary is not None:
+                self._abandon_reply(primary)
+        else:
+            self._abandon_reply(hedge)
+    
+    def _recover_before_first_byte(self, session_id, reply, error, status):
+        """首字节前的失败由对冲请求接替或稍后重试
+        
+        Args:
+            session_id: 会话ID
+            reply: 失败的请求
+            error: QNetworkReply.NetworkError
+            status: HTTP状态码
+            
+        Returns:
+            bool: 已处理时返回True,否则应报告错误
+        """
+        hedge = self._hedge_replies.get(session_id)
+        if reply is hedge:
+            # 对冲请求失败,主请求继续
+            del self._hedge_replies[session_id]
+            self._abandon_reply(reply)
+            return True
+        
+        if self._active_session_replies.get(session_id) is not reply:
+            return False
+        
+        if hedge is not None:
+            # 主请求失败,由对冲请求接替
+            del self._hedge_replies[session_id]
+            self._active_session_replies[session_id] = hedge
+            self._abandon_reply(reply)
+            return True
+        
+        policy = self._retry_policies.get(session_id)
+        job = self._reply_requests.get(reply)
+        attempt = reply.property("attempt") or 0
+        if policy is None or job is None or not policy.should_retry(attempt, error, status):
+            return self._fail_over(session_id, reply, job)
+        
+        retry_after = reply.rawHeader("Retry-After").data() if status else None
+        delay = policy.retry_delay(attempt, retry_after)
+        if delay is None:
+            return self._fail_over(session_id, reply, job)
+        
+        # 保留并发名额,等待后重新发送
+        del self._active_session_replies[session_id]
+        self._abandon_reply(reply)
+        
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self._retry_request(session_id, job, attempt + 1))
+        self._pending_retries[session_id] = (job, timer)
+        timer.start(delay)
+        return True
+    
+    def _fail_over(self, session_id, reply, job):
+        """模型组会话的请求在首字节前失败且不再重试时,改用组内下一个成员
+        
+        失败的请求计入原成员的延迟统计,本轮的用户消息按新成员重新发送。
+        
+        Args:
+            session_id: 会话ID
+            reply: 失败的请求
+            job: 请求所属的ScheduledRequest
+            
+        Returns:
+            bool: 已转到其他成员时返回True
+        """
+        group_id = self._session_groups.get(session_id)
+        routed = self._routed_messages.get(session_id)
+        current = self._session_models.get(session_id)
+        if group_id is None or routed is None or current is None or job is None:
+            return False
+        
+        tried = self._route_tried.setdefault(session_id, set())
+        tried.add(current)
+        member = self._router.choose(group_id, exclude=tried)
+        if member is None:
+            return False
+        
+        # 记录失败的请求,路由器据此降低原成员的优先级
+        record = self._job_records.get(job)
+        if record is not None:
+            record.error = True
+            self.request_metrics_recorded.emit(session_id, self._request_metrics.record(record))
+        
+        del self._active_session_replies[session_id]
+        self._abandon_reply(reply)
+        self._release_job(job)
+        
+        # 撤回本轮的用户消息,由新成员重新发送
+        self._chunk_coalescer.discard(session_id)
+        self._history_store.pop_last(session_id, "user")
+        self._discard_turn(session_id)
+        
+        self._connection_stats.failovers += 1
+        self._route_session(session_id, member)
+        self._submit_message(session_id, *routed)
+        return True
+    
+    def _route_session(self, session_id, member):
+        """把会话登记到模型组的一个成员
+        
+        Args:
+            session_id: 会话ID
+            member: (提供商ID, 模型ID)
+        """
+        if self._session_models.get(session_id) != member:
+            # 不同成员的token计数方式可能不同
+            self._context_planner.invalidate(session_id)
+        self.register_session(session_id, *member)
+        self.request_routed.emit(session_id, *member)
+    
+    def _retry_request(self, session_id, job, attempt):
+        """退避结束后重新发送请求"""
+        entry = self._pending_retries.get(session_id)
+        if entry is None or entry[0] is not job:
+            return
+        
+        del self._pending_retries[session_id]
+        entry[1].deleteLater()
+        
+        self._connection_stats.retries += 1
+        reply = self._post_attempt(job, attempt)
+        self._active_session_replies[session_id] = reply
+        self._watch_first_byte(reply)
+    
+    def _abandon_reply(self, reply):
+        """放弃一个请求,忽略其后续信号,并发名额仍由同一任务的其他请求持有
+        
+        Args:
+            reply: 网络响应
+        """
+        reply.setProperty("abandoned", True)
+        self._stream_parsers.pop(reply, None)
+        self._reply_timings.pop(reply, None)
+        self._reply_usage.pop(reply, None)
+        self._reply_requests.pop(reply, None)
+        
+        # 已出错的请求会自行结束,再次中止会重复报告错误
+        if reply.isRunning() and reply.error() == QNetworkReply.NoError:
+            reply.abort()
+    
+    def cancel_request(self, session_id, keep_partial=None):
+        """取消会话的请求
+        
+        立即中止网络响应并释放并发名额,丢弃尚未输出的响应块和流数据。
+        取消之后不会再发出该请求的任何响应块,只发出response_cancelled。
+        
+        Args:
+            session_id: 会话ID
+            keep_partial: 是否把已收到的部分回复作为一条消息保留在历史中,
+                为None时使用设置中的keep_partial_response
+            
+        Returns:
+            bool: 有请求被取消时返回True
+        """
+        if keep_partial is None:
+            keep_partial = self._keep_partial_response
+        
+        # 移除尚未发送的排队请求
+        cancelled = bool(self._scheduler.cancel_session(session_id))
+        self._cache_keys.pop(session_id, None)
+        cancelled = self._pending_replays.pop(session_id, None) is not None or cancelled
+        self._similarity_prompts.pop(session_id, None)
+        
+        # 放弃对冲请求
+        hedge = self._hedge_replies.pop(session_id, None)
+        if hedge is not None:
+            self._abandon_reply(hedge)
+        
+        # 正在等待重试的请求没有网络响应,直接释放名额
+        entry = self._pending_retries.pop(session_id, None)
+        if entry is not None:
+            job, timer = entry
+            timer.stop()
+            timer.deleteLater()
+            self._release_job(job)
+            cancelled = True
+        
+        # 中止进行中的请求,其后续信号全部忽略
+        reply = self._active_session_replies.pop(session_id, None)
+        if reply is not None:
+            job = self._reply_requests.get(reply)
+            self._abandon_reply(reply)
+            if job is not None:
+                self._release_job(job)
+            cancelled = True
+        
+        if not cancelled:
+            return False
+        
+        if keep_partial:
+            # 输出已到达但还在合并中的内容,与保留的部分回复一致
+            self._chunk_coalescer.flush(session_id)
+            self._commit_turn(session_id)
+        else:
+            self._chunk_coalescer.discard(session_id)
+            self._discard_turn(session_id)
+        
+        self.response_cancelled.emit(session_id)
+        
+        if not self._scheduler.has_pending():
+            self.all_requests_finished.emit()
+        return True
+    
+    def _commit_turn(self, session_id):
+        """提交本轮助手回复,结束其流式日志,并把本轮消息写入数据库
+        
+        Returns:
+            ChatMessage: 提交的消息,没有内容时返回None
+        """
+        committed = self._history_store.commit_turn(session_id)
+        self._persist_history(session_id)
+        if self._stream_journal is not None:
+            self._stream_journal.end(session_id)
+        return committed
+    
+    def _discard_turn(self, session_id):
+        """丢弃本轮助手回复及其流式日志,本轮的用户消息写入数据库"""
+        self._history_store.discard_turn(session_id)
+        self._persist_history(session_id)
+        if self._stream_journal is not None:
+            self._stream_journal.end(session_id)
+    
+    def set_chat_database(self, database):
+        """设置保存会话历史的数据库
+        
+        Args:
+            database: ChatDatabase,为None时历史只保存在内存中
+        """
+        self._database = database
+        self._persisted_counts.clear()
+    
+    def _ensure_history_loaded(self, session_id):
+        """首次使用数据库中的会话时读入最近的历史
+        
+        Args:
+            session_id: 会话ID
+        """
+        if session_id in self._persisted_counts:
+            return
+        
+        if self._database is None or self._database.get_session(session_id) is None:
+            # 不在数据库中的会话(批量任务、基准测试等)只保存在内存中
+            self._persisted_counts[session_id] = None
+            return
+        
+        for stored in self._database.load_messages(session_id, self.HISTORY_LOAD_LIMIT):
+            self._history_store.append(session_id, stored.role, stored.content)
+        self._persisted_counts[session_id] = self._history_store.message_count(session_id)
+    
+    def _persist_history(self, session_id):
+        """在一个事务中把尚未保存的消息写入数据库
+        
+        Args:
+            session_id: 会话ID
+        """
+        persisted = self._persisted_counts.get(session_id)
+        if persisted is None:
+            return
+        
+        messages = self._history_store.snapshot(session_id)
+        if len(messages) <= persisted:
+            self._persisted_counts[session_id] = len(messages)
+            return
+        
+        try:
+            self._database.append_messages(
+                session_id, [(message.role, message.content) for message in messages[persisted:]]
+            )
+        except sqlite3.Error as e:
+            # 会话已被删除等情况,历史保留在内存中
+            print(f"保存会话历史失败: {e}")
+            return
+        self._persisted_counts[session_id] = len(messages)
+    
+    def set_stream_journal_enabled(self, enabled):
+        """启用或关闭进行中回复的流式日志
+        
+        Args:
+            enabled: 是否启用
+        """
+        if not enabled:
+            self._close_stream_journal()
+            self._stream_journal = None
+            return
+        
+        if self._stream_journal is None:
+            # 每个实例写自己的日志文件,互不截断
+            self._stream_journal = StreamJournal(self._config_manager.get_data_dir("Journal"))
+    
+    def recover_interrupted_responses(self):
+        """读取上次运行中断的回复,恢复到各会话的历史中
+        
+        恢复的回复可以通过take_recovered_responses()取出显示。只接管所属实例已经
+        退出的日志,同时运行的其他实例进行中的回复不受影响。
+        
+        Returns:
+            int: 恢复的回复数
+        """
+        if self._stream_journal is None:
+            return 0
+        
+        recovered = self._stream_journal.recover()
+        for turn in recovered:
+            session_id = turn["session_id"]
+            self._ensure_history_loaded(session_id)
+            self._history_store.append(session_id, "user", turn["user"])
+            if turn["text"]:
+                self._history_store.append(session_id, "assistant", turn["text"])
+            self._persist_history(session_id)
+            self._recovered_responses.setdefault(session_id, []).append(turn)
+        return len(recovered)
+    
+    def take_recovered_responses(self, session_id):
+        """取出会话中上次运行中断后恢复的回复
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            list: 每项为{"user", "text", "provider_id", "model_id", "started"},只返回一次
+        """
+        return self._recovered_responses.pop(session_id, [])
+    
+    @Slot()
+    def _flush_stream_journal(self):
+        """把累积的响应块写入流式日志,还有进行中的回复时继续计时"""
+        if self._stream_journal is None:
+            return
+        
+        try:
+            self._stream_journal.flush()
+        except OSError as e:
+            print(f"写入流式日志失败: {e}")
+        
+        if self._active_session_replies or self._pending_retries:
+            self._journal_flush_timer.start()
+    
+    @Slot()
+    def _close_stream_journal(self):
+        """写出剩余内容并关闭流式日志"""
+        self._journal_flush_timer.stop()
+        if self._stream_journal is not None:
+            self._stream_journal.close()
+    
+    def _release_job(self, job):
+        """释放被取消任务的并发名额和请求数据,取消的请求不计入延迟统计"""
+        self._job_payloads.pop(job, None)
+        self._job_records.pop(job, None)
+        self._scheduler.release(job)
+    
+    def set_keep_partial_response(self, enabled):
+        """设置取消请求时是否保留已收到的部分回复
+        
+        Args:
+            enabled: 是否保留
+        """
+        self._keep_partial_response = bool(enabled)
+    
+    def set_frame_interval(self, interval):
+        """设置响应块合并的帧间隔
+        
+        Args:
+            interval: 帧间隔(毫秒),0表示每个响应块立即输出
+        """
+        self._chunk_coalescer.set_interval(interval)
     
     def has_active_requests(self):
-        """检查是否有活跃请求"""
-        return self._active_requests > 0
+        """检查是否有活跃请求(包括排队中的请求)"""
+        return self._scheduler.has_pending()
+    
+    def set_foreground_session(self, session_id):
+        """设置当前可见的会话,其排队请求优先于后台会话
+        
+        Args:
+            session_id: 会话ID
+        """
+        previous = self._foreground_session_id
+        self._foreground_session_id = session_id
+        
+        if previous and previous != session_id:
+            self._scheduler.set_session_priority(previous, RequestScheduler.PRIORITY_BACKGROUND)
+        if session_id:
+            self._scheduler.set_session_priority(session_id, RequestScheduler.PRIORITY_FOREGROUND)
+    
+    def preconnect(self, session_id):
+        """预先建立到会话提供商主机的连接
+        
+        在选中会话或开始输入时调用,第一条消息无需再等待DNS、TCP和TLS握手。
+        同一主机在PRECONNECT_INTERVAL内只预连接一次。
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            bool: 是否发起了预连接
+        """
+        if not self._preconnect_enabled:
+            return False
+        
+        session_info = self._get_session_info(session_id)
+        if not session_info:
+            return False
+        
+        provider = self._config_manager.get_provider(session_info["provider_id"])
+        if not provider:
+            return False
+        
+        api_url = provider.get("api_url", "")
+        if not self._validate_url(api_url):
+            return False
+        
+        url = QUrl(api_url)
+        if not self._mark_host_warm(url):
+            return False
+        
+        # 必须使用与请求相同的SSL配置(含ALPN协议列表),连接才能被复用
+        if url.scheme() == "https":
+            self._network_manager.connectToHostEncrypted(url.host(), url.port(443), self._ssl_config)
+        else:
+            self._network_manager.connectToHost(url.host(), url.port(80))
+        
+        self._connection_stats.record_preconnect()
+        return True
+    
+    def set_preconnect_enabled(self, enabled):
+        """设置是否启用连接预热
+        
+        Args:
+            enabled: 是否启用
+        """
+        self._preconnect_enabled = bool(enabled)
+    
+    def set_http2_enabled(self, enabled):
+        """设置是否为提供商请求协商HTTP/2
+        
+        启用时通过ALPN同时提供h2和http/1.1,不支持HTTP/2的服务器自动回退。
+        
+        Args:
+            enabled: 是否启用
+        """
+        self._http2_enabled = bool(enabled)
+        
+        protocols = [QByteArray(QSslConfiguration.NextProtocolHttp1_1.encode())]
+        if self._http2_enabled:
+            protocols.insert(0, QByteArray(QSslConfiguration.ALPNProtocolHTTP2.encode()))
+        self._ssl_config.setAllowedNextProtocols(protocols)
+    
+    def connection_stats(self):
+        """获取连接统计
+        
+        Returns:
+            dict: preconnects为预连接次数,ttfb为冷/热连接的首字节时间汇总,
+                hosts为各主机新建/复用连接数和每连接请求数,handshake为握手时间汇总,
+                retries/hedges/hedge_wins为重试、对冲和对冲先到的次数,
+                failovers为模型组内转到其他成员的次数
+        """
+        return {
+            "preconnects": self._connection_stats.preconnects,
+            "retries": self._connection_stats.retries,
+            "hedges": self._connection_stats.hedges,
+            "hedge_wins": self._connection_stats.hedge_wins,
+            "failovers": self._connection_stats.failovers,
+            "ttfb": self._connection_stats.ttfb_summary(),
+            "hosts": self._connection_stats.host_summary(),
+            "handshake": self._connection_stats.handshake_summary(),
+        }
+    
+    def request_metrics(self, provider_id=None, model_id=None):
+        """获取请求延迟和吞吐量统计
+        
+        Args:
+            provider_id: 只统计该提供商,为None时统计全部
+            model_id: 只统计该模型,为None时统计全部
+            
+        Returns:
+            dict: "提供商ID/模型ID" -> requests、errors及各项指标的
+                count、mean、p50、p90、p99、max
+        """
+        return self._request_metrics.summary(provider_id, model_id)
+    
+    def reset_request_metrics(self):
+        """清空请求延迟和吞吐量统计"""
+        self._request_metrics.reset()
+    
+    def rate_limit_state(self):
+        """获取各API密钥的速率限制额度
+        
+        Returns:
+            dict: 主机名#密钥摘要 -> {"providers", "buckets", "blocked_ms", "paced"},
+                buckets为requests/tokens等额度名 -> {"limit", "remaining", "reserved", "reset_ms"},
+                paced为因额度不足推迟发送的请求数
+        """
+        return self._rate_limits.snapshot()
+    
+    def _mark_host_warm(self, url):
+        """记录主机连接时间
+        
+        Args:
+            url: 请求的QUrl
+            
+        Returns:
+            bool: 距上次连接超过PRECONNECT_INTERVAL时返回True
+        """
+        key = (url.scheme(), url.host(), url.port(443 if url.scheme() == "https" else 80))
+        clock = self._warm_hosts.get(key)
+        if clock is not None and not clock.hasExpired(self.PRECONNECT_INTERVAL):
+            clock.restart()
+            return False
+        
+        clock = QElapsedTimer()
+        clock.start()
+        self._warm_hosts[key] = clock
+        return True
+    
+    def queued_request_count(self, provider_id=None):
+        """获取排队中的请求数
+        
+        Args:
+            provider_id: 提供商ID,为None时统计所有提供商
+        """
+        return self._scheduler.queued_count(provider_id)
+    
+    def in_flight_request_count(self, provider_id=None):
+        """获取进行中的请求数
+        
+        Args:
+            provider_id: 提供商ID,为None时统计所有提供商
+        """
+        return self._scheduler.in_flight_count(provider_id)
     
     def set_provider(self, provider_id):
         """设置当前使用的提供商"""
@@ -212,126 +1076,55 @@ class LlmService(QObject):
         api_key = provider.get("api_key", "")
         
         if not api_key:
-            self.connection_test_result.emit(False, f"{provider_id} API密钥未配置")
-            return
-        
-        # 根据不同提供商设置请求头
-        self._set_provider_headers(request, provider_id, api_key)
-        
-        # 发送HEAD请求测试连接
-        reply = self._network_manager.head(request)
-        reply.setProperty("provider_id", provider_id)
-        reply.finished.connect(lambda: self._on_connection_test_finished(reply, provider_id))
-    
-    def test_model_connection(self, provider_id, model_id):
-        """测试与特定模型的连接
-        
-        Args:
-            provider_id: 提供商ID
-            model_id: 模型ID
-            
-        Returns:
-            (bool, str): 测试结果和消息
-        """
-        # 获取提供商配置
-        provider = self._config_manager.get_provider(provider_id)
-        if not provider:
-            return False, f"未找到提供商配置: {provider_id}"
-        
-        # 获取API URL和密钥
-        api_url = provider.get("api_url", "")
-        api_key = provider.get("api_key", "")
-        
-        if not api_url:
-            return False, "API URL未配置"
-        
-        # 验证URL格式
-        if not self._validate_url(api_url):
-            return False, f"API URL格式无效: {api_url}"
-        
-        # 检查API密钥
-        if not api_key:
-            return False, f"{provider_id} API密钥未配置"
-        
-        # 构建简单的测试请求
-        request = QNetworkRequest(QUrl(api_url))
-        
-        # 设置SSL配置
-        request.setSslConfiguration(self._ssl_config)
-        
-        # 设置请求头
-        request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
-        self._set_provider_headers(request, provider_id, api_key)
-        
-        # 构建极简请求体，只用于测试连接
-        test_message = "Hello, this is a connection test."
-        
-        # 根据不同提供商构建请求体
-        if provider_id == "openai":
-            request_data = {
-                "model": model_id,
-                "messages": [{"role": "user", "content": test_message}],
-                "max_tokens": 5  # 只请求少量token以快速测试
-            }
-        elif provider_id == "anthropic":
-            request_data = {
-                "model": model_id,
-                "messages": [{"role": "user", "content": test_message}],
-                "max_tokens": 5
-            }
-        elif provider_id == "deepseek":
-            request_data = {
-                "model": model_id,
-                "messages": [{"role": "user", "content": test_message}],
-                "max_tokens": 5
-            }
-        else:
-            # 默认使用OpenAI格式
-            request_data = {
-                "model": model_id,
-                "messages": [{"role": "user", "content": test_message}],
-                "max_tokens": 5
-            }
+            self.connection_test_result.emit(False, f"{provider_id} API密钥未配置")
+            return
         
-        # 发送POST请求测试连接
-        loop = QEventLoop()
-        timer = QTimer()
-        timer.setSingleShot(True)
-        timer.timeout.connect(loop.quit)
+        # 根据API风格设置请求头
+        self._set_provider_headers(request, self._provider_adapter(provider_id, provider), api_key)
         
-        reply = self._network_manager.post(request, json.dumps(request_data).encode())
+        # 发送HEAD请求测试连接
+        reply = self._network_manager.head(request)
+        reply.setProperty("provider_id", provider_id)
+        reply.finished.connect(lambda: self._on_connection_test_finished(reply, provider_id))
+    
+    def test_model_connection(self, provider_id, model_id):
+        """异步测试与特定模型的连接
         
-        # 连接信号
-        reply.finished.connect(loop.quit)
+        结果通过model_test_finished信号返回。
         
-        # 设置超时
-        timer.start(10000)  # 10秒超时
-        loop.exec_()
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+        """
+        self._health_checker.check_model(provider_id, model_id)
+    
+    def test_provider_models(self, provider_id):
+        """并发测试提供商的所有模型
         
-        # 检查结果
-        if timer.isActive():
-            # 请求完成，检查响应
-            timer.stop()
+        Args:
+            provider_id: 提供商ID
             
-            if reply.error() == QNetworkReply.NoError:
-                response_data = reply.readAll().data().decode("utf-8")
-                try:
-                    json_data = json.loads(response_data)
-                    reply.deleteLater()
-                    return True, f"连接成功: {provider_id}/{model_id}"
-                except json.JSONDecodeError:
-                    reply.deleteLater()
-                    return False, f"无法解析响应: {response_data[:100]}..."
-            else:
-                error = reply.errorString()
-                reply.deleteLater()
-                return False, f"连接错误: {error}"
-        else:
-            # 请求超时
-            reply.abort()
-            reply.deleteLater()
-            return False, "连接超时，请检查网络或API服务器状态"
+        Returns:
+            int: 测试的模型数
+        """
+        return self._health_checker.check_provider(provider_id)
+    
+    def test_all_models(self):
+        """并发测试所有已配置密钥的提供商的全部模型
+        
+        Returns:
+            int: 测试的模型数
+        """
+        return self._health_checker.check_all_providers()
+    
+    def cancel_model_tests(self):
+        """取消所有进行中的模型测试"""
+        self._health_checker.cancel_all()
     
+    def is_testing_models(self):
+        """检查是否有进行中的模型测试"""
+        return self._health_checker.is_running()
+
     def _validate_url(self, url):
         """验证URL格式"""
         if not url:
@@ -342,9 +1135,78 @@ class LlmService(QObject):
         return re.match(pattern, url) is not None
     
     def clear_conversation_history(self, session_id):
-        """清除会话历史"""
-        if session_id in self._conversation_histories:
-            del self._conversation_histories[session_id]
+        """清除会话历史,包括数据库中保存的消息"""
+        if self._database is not None:
+            self._database.clear_messages(session_id)
+        self._forget_history(session_id)
+    
+    def _forget_history(self, session_id):
+        """释放内存中的会话历史,数据库中的消息保留"""
+        self._persisted_counts.pop(session_id, None)
+        self._history_store.clear(session_id)
+        self._context_planner.invalidate(session_id)
+        self._body_encoder.invalidate(session_id)
+    
+    def register_session(self, session_id, provider_id, model_id):
+        """登记会话使用的提供商和模型
+        
+        会话ID不必是provider_id.model_id.uuid格式,模型ID可以包含点号。
+        
+        Args:
+            session_id: 会话ID
+            provider_id: 提供商ID
+            model_id: 模型ID
+        """
+        self._session_models[session_id] = (provider_id, model_id)
+    
+    def register_group_session(self, session_id, group_id):
+        """把会话绑定到模型组,每条消息由路由器选择组内成员
+        
+        Args:
+            session_id: 会话ID
+            group_id: model.toml中model_groups的ID
+        """
+        self._session_groups[session_id] = group_id
+    
+    def _session_group(self, session_id):
+        """获取会话绑定的模型组ID
+        
+        Args:
+            session_id: 会话ID
+            
+        Returns:
+            str: 模型组ID,会话没有绑定模型组时返回None
+        """
+        group_id = self._session_groups.get(session_id)
+        if group_id is None and self._database is not None:
+            stored = self._database.get_session(session_id)
+            if stored is not None and stored["provider_id"] == ModelRouter.GROUP_PROVIDER:
+                group_id = stored["model_id"]
+                self._session_groups[session_id] = group_id
+        return group_id
+    
+    def model_router(self):
+        """获取模型组路由器
+        
+        Returns:
+            ModelRouter: 路由器
+        """
+        return self._router
+    
+    def release_session(self, session_id):
+        """取消会话的请求并释放内存中的历史和登记信息,数据库中的消息保留
+        
+        Args:
+            session_id: 会话ID
+        """
+        self.cancel_request(session_id)
+        self._forget_history(session_id)
+        self._session_models.pop(session_id, None)
+        self._session_adapters.pop(session_id, None)
+        self._retry_policies.pop(session_id, None)
+        self._session_groups.pop(session_id, None)
+        self._routed_messages.pop(session_id, None)
+        self._route_tried.pop(session_id, None)
     
     def _load_settings(self):
         """加载设置"""
@@ -352,142 +1214,334 @@ class LlmService(QObject):
         default_provider = self._config_manager.get("model", "default_provider", "openai")
         if default_provider:
             self._current_provider = default_provider
+        
+        # 流式输出帧间隔
+        interval = self._config_manager.get("display", "stream_frame_interval", ChunkCoalescer.DEFAULT_INTERVAL)
+        self.set_frame_interval(interval)
+        
+        # 取消请求时保留部分回复
+        self.set_keep_partial_response(self._config_manager.get("model", "keep_partial_response", True))
+        
+        # 流式日志
+        if self._journal_allowed:
+            self.set_stream_journal_enabled(self._config_manager.get("model", "stream_journal", True))
+        
+        # 连接预热
+        self.set_preconnect_enabled(self._config_manager.get("network", "preconnect", True))
+        
+        # HTTP/2
+        self.set_http2_enabled(self._config_manager.get("network", "http2", True))
+        
+        # 响应缓存
+        self.set_response_cache_enabled(
+            self._config_manager.get("cache", "response_cache", False),
+            self._config_manager.get("cache", "response_cache_size", 64)
+        )
+        
+        # 近似重复问题缓存
+        self.set_similarity_cache_enabled(
+            self._config_manager.get("cache", "similarity_cache", False),
+            self._config_manager.get("cache", "similarity_threshold", SimilarityCache.DEFAULT_THRESHOLD)
+        )
+    
+    def _provider_adapter(self, provider_id, provider):
+        """获取提供商的适配器,同一配置版本内每个提供商只解析一次
+        
+        Args:
+            provider_id: 提供商ID
+            provider: 提供商配置
+        
+        Returns:
+            ProviderAdapter: 适配器
+        """
+        version = self._config_manager.get_model_config_version()
+        if version != self._adapter_config_version:
+            self._provider_adapters.clear()
+            self._adapter_config_version = version
+        
+        adapter = self._provider_adapters.get(provider_id)
+        if adapter is None:
+            adapter = self._provider_adapters[provider_id] = resolve_adapter(provider_id, provider)
+        return adapter
     
-    def _create_request(self, url, provider_id, api_key):
+    def _create_request(self, url, adapter, api_key):
         """创建请求"""
         request = QNetworkRequest(QUrl(url))
         
         # 设置SSL配置
         request.setSslConfiguration(self._ssl_config)
         
+        # 允许HTTP/2,服务器不支持时回退到HTTP/1.1
+        request.setAttribute(QNetworkRequest.Http2AllowedAttribute, self._http2_enabled)
+        
         # 设置请求头
         request.setHeader(QNetworkRequest.ContentTypeHeader, "application/json")
         
         # 设置提供商特定的请求头
-        self._set_provider_headers(request, provider_id, api_key)
+        self._set_provider_headers(request, adapter, api_key)
         
         return request
     
-    def _set_provider_headers(self, request, provider_id, api_key):
+    def _set_provider_headers(self, request, adapter, api_key):
         """设置提供商特定的请求头"""
-        if provider_id == "openai":
-            request.setRawHeader(b"Authorization", f"Bearer {api_key}".encode())
-        elif provider_id == "anthropic":
-            request.setRawHeader(b"x-api-key", api_key.encode())
-            request.setRawHeader(b"anthropic-version", b"2023-06-01")
-        elif provider_id == "deepseek":
-            request.setRawHeader(b"Authorization", f"Bearer {api_key}".encode())
-        else:
-            # 默认使用Bearer认证
-            request.setRawHeader(b"Authorization", f"Bearer {api_key}".encode())
+        for name, value in adapter.headers(api_key):
+            request.setRawHeader(name, value)
     
-    def _build_request_body(self, provider_id, model_id, message, context):
-        """构建请求体"""
+    def _build_request_body(self, adapter, provider_id, model_id, message, context):
+        """构建请求体
+        
+        已发送过的历史消息复用缓存的JSON片段,只编码新增部分。
+        """
         # 获取对话历史
         session_id = context.get("session_id", "")
-        history = self._get_conversation_history(session_id)
+        history, start = self._plan_context(session_id, provider_id, model_id, message, context)
+        
+        params = self._sampling_params(context)
+        
+        return self._body_encoder.encode(
+            session_id,
+            adapter,
+            model_id,
+            context.get("system_prompt", ""),
+            history,
+            start,
+            message,
+            params,
+            cache_prompt=self._prompt_cache_enabled(provider_id),
+            stream_usage=self._stream_usage_enabled(provider_id)
+        )
+    
+    def _stream_usage_enabled(self, provider_id):
+        """检查是否要求提供商在流式响应中返回用量,对应model.toml中提供商的stream_usage
         
-        # 根据不同提供商构建请求体
-        if provider_id == "openai":
-            messages = []
-            
-            # 系统提示
-            system_prompt = context.get("system_prompt", "")
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # 对话历史
-            for entry in history:
-                messages.append({"role": entry["role"], "content": entry["content"]})
-            
-            # 当前消息
-            messages.append({"role": "user", "content": message})
-            
-            request_data = {
-                "model": model_id,
-                "messages": messages,
-                "stream": True,
-                "temperature": context.get("temperature", 0.7),
-                "max_tokens": context.get("max_tokens", 1000),
-                "top_p": context.get("top_p", 1.0)
-            }
-            
-        elif provider_id == "anthropic":
-            # 构建消息数组
-            messages = []
-            
-            # 系统提示
-            system_prompt = context.get("system_prompt", "")
-            
-            # 对话历史
-            for entry in history:
-                messages.append({"role": entry["role"], "content": entry["content"]})
-            
-            # 当前消息
-            messages.append({"role": "user", "content": message})
-            
-            request_data = {
-                "model": model_id,
-                "messages": messages,
-                "stream": True,
-                "max_tokens": context.get("max_tokens", 1000),
-                "temperature": context.get("temperature", 0.7),
-                "top_p": context.get("top_p", 1.0)
-            }
-            
-            if system_prompt:
-                request_data["system"] = system_prompt
-            
-        elif provider_id == "deepseek":
-            # 深度求索使用与OpenAI相同的接口格式
-            messages = []
-            
-            # 系统提示
-            system_prompt = context.get("system_prompt", "")
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # 对话历史
-            for entry in history:
-                messages.append({"role": entry["role"], "content": entry["content"]})
-            
-            # 当前消息
-            messages.append({"role": "user", "content": message})
-            
-            request_data = {
-                "model": model_id,
-                "messages": messages,
-                "stream": True,
-                "temperature": context.get("temperature", 0.7),
-                "max_tokens": context.get("max_tokens", 1000),
-                "top_p": context.get("top_p", 1.0)
-            }
-        else:
-            # 默认使用OpenAI格式
-            messages = []
-            
-            # 系统提示
-            system_prompt = context.get("system_prompt", "")
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
+        默认关闭,部分OpenAI兼容服务遇到stream_options字段会返回400。关闭时
+        OpenAI风格的响应不报告用量,请求指标中没有token数和缓存命中。
+        """
+        provider = self._config_manager.get_provider(provider_id) or {}
+        return bool(provider.get("stream_usage", False))
+    
+    def _prompt_cache_enabled(self, provider_id):
+        """检查提供商是否启用提示缓存,对应model.toml中提供商的prompt_cache,默认启用"""
+        provider = self._config_manager.get_provider(provider_id) or {}
+        return bool(provider.get("prompt_cache", True))
+    
+    def estimate_request_tokens(self, session_id, message="", context=None):
+        """估算下一次请求将发送的输入token数
+        
+        Args:
+            session_id: 会话ID
+            message: 待发送的用户消息
+            context: 上下文信息,可选
             
-            # 对话历史
-            for entry in history:
-                messages.append({"role": entry["role"], "content": entry["content"]})
+        Returns:
+            int: 估算的token数,会话无效时返回0
+        """
+        session_info = self._get_session_info(session_id)
+        if not session_info:
+            return 0
+        
+        context = context or {}
+        provider_id = session_info["provider_id"]
+        model_id = session_info["model_id"]
+        counter = self._get_token_counter(provider_id, model_id)
+        
+        history = self._get_context_history(session_id, provider_id, model_id, message, context)
+        history_tokens = sum(counter.count_messages(history))
+        
+        return history_tokens + self._fixed_request_tokens(counter, message, context)
+    
+    def _get_token_counter(self, provider_id, model_id):
+        """获取模型使用的token计数器
+        
+        模型或提供商配置中的tokenizer字段指定计数后端。
+        
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
             
-            # 当前消息
-            messages.append({"role": "user", "content": message})
+        Returns:
+            TokenCounter: 计数器
+        """
+        model_config = self._config_manager.get_model(provider_id, model_id) or {}
+        provider = self._config_manager.get_provider(provider_id)
+        backend = model_config.get("tokenizer") or provider.get("tokenizer") or TokenCounter.DEFAULT_BACKEND
+        
+        counter = self._token_counters.get(backend)
+        if counter is None:
+            counter = self._token_counters[backend] = TokenCounter(backend)
+        return counter
+    
+    def _fixed_request_tokens(self, counter, message, context):
+        """计算系统提示和当前消息的token数"""
+        tokens = counter.count_text(message) + MESSAGE_OVERHEAD
+        system_prompt = context.get("system_prompt", "")
+        if system_prompt:
+            tokens += counter.count_text(system_prompt) + MESSAGE_OVERHEAD
+        return tokens
+    
+    def _sampling_params(self, context):
+        """获取请求的采样参数"""
+        return {
+            "temperature": context.get("temperature", 0.7),
+            "max_tokens": context.get("max_tokens", 1000),
+            "top_p": context.get("top_p", 1.0)
+        }
+    
+    def _response_cache_key(self, provider_id, model_id, message, context):
+        """计算请求的响应缓存键
+        
+        只有temperature为0或上下文中force_cache为True的请求才使用缓存。
+        
+        Returns:
+            str: 缓存键,不使用缓存时返回None
+        """
+        if self._response_cache is None:
+            return None
+        
+        params = self._sampling_params(context)
+        if params["temperature"] != 0 and not context.get("force_cache"):
+            return None
+        
+        session_id = context.get("session_id", "")
+        history, start = self._plan_context(session_id, provider_id, model_id, message, context)
+        messages = list(history[start:])
+        messages.append({"role": "user", "content": message})
+        
+        return ResponseCache.make_key(provider_id, model_id, context.get("system_prompt", ""), messages, params)
+    
+    def _replay_cached_response(self, session_id):
+        """通过正常的响应信号回放缓存的回复
+        
+        Args:
+            session_id: 会话ID
+        """
+        cached = self._pending_replays.pop(session_id, None)
+        if cached is None:
+            return
+        
+        content = cached.get("content", "")
+        if content:
+            self._store_conversation_history(session_id, "assistant", content)
+            self.response_chunk.emit(session_id, content)
+        self._persist_history(session_id)
+        
+        self._chunk_coalescer.flush(session_id)
+        self.response_finished.emit(session_id)
+        
+        if not self._scheduler.has_pending():
+            self.all_requests_finished.emit()
+    
+    def set_response_cache_enabled(self, enabled, max_megabytes=None):
+        """启用或关闭磁盘响应缓存
+        
+        Args:
+            enabled: 是否启用
+            max_megabytes: 缓存大小上限(MB),为None时保持当前值
+        """
+        if not enabled:
+            self._response_cache = None
+            self._cache_keys.clear()
+            return
+        
+        max_bytes = ResponseCache.DEFAULT_MAX_BYTES
+        if max_megabytes is not None:
+            max_bytes = int(max_megabytes) * 1024 * 1024
+        
+        if self._response_cache is None:
+            directory = self._config_manager.get_data_dir("Cache", "responses")
+            self._response_cache = ResponseCache(directory, max_bytes)
+        elif max_megabytes is not None:
+            self._response_cache.set_max_bytes(max_bytes)
+    
+    def response_cache_stats(self):
+        """获取响应缓存统计
+        
+        Returns:
+            dict: enabled、hits、misses、entries、bytes
+        """
+        if self._response_cache is None:
+            return {"enabled": False, "hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+        
+        return dict(self._response_cache.stats(), enabled=True)
+    
+    def clear_response_cache(self):
+        """删除所有缓存的回复"""
+        if self._response_cache is not None:
+            self._response_cache.clear()
+    
+    def set_similarity_cache_enabled(self, enabled, threshold=None):
+        """启用或关闭近似重复问题缓存
+        
+        Args:
+            enabled: 是否启用
+            threshold: 相似度阈值(0~1),为None时保持当前值
+        """
+        if not enabled:
+            self._save_similarity_cache()
+            self._similarity_cache = None
+            self._similarity_prompts.clear()
+            return
+        
+        if self._similarity_cache is None:
+            path = os.path.join(self._config_manager.get_data_dir("Cache"), "similarity.json")
+            self._similarity_cache = SimilarityCache(path)
+        
+        if threshold is not None:
+            self._similarity_cache.threshold = float(threshold)
+    
+    def clear_similarity_cache(self):
+        """删除所有已索引的问题"""
+        if self._similarity_cache is not None:
+            self._similarity_cache.clear()
+            self._save_similarity_cache()
+    
+    @Slot()
+    def _save_similarity_cache(self):
+        """保存近似问题索引"""
+        self._similarity_save_timer.stop()
+        if self._similarity_cache is not None:
+            self._similarity_cache.save()
+    
+    def _get_context_history(self, session_id, provider_id, model_id, message, context):
+        """获取本次请求要发送的历史消息
+        
+        Returns:
+            tuple: 要发送的ChatMessage
+        """
+        history, start = self._plan_context(session_id, provider_id, model_id, message, context)
+        return history[start:]
+    
+    def _plan_context(self, session_id, provider_id, model_id, message, context):
+        """规划本次请求的上下文窗口
+        
+        模型配置中的max_tokens作为上下文窗口大小,扣除请求的max_tokens、
+        系统提示和当前消息后,剩余预算用于最近的历史消息。
+        
+        Args:
+            session_id: 会话ID
+            provider_id: 提供商ID
+            model_id: 模型ID
+            message: 当前用户消息
+            context: 上下文信息
             
-            request_data = {
-                "model": model_id,
-                "messages": messages,
-                "stream": True,
-                "temperature": context.get("temperature", 0.7),
-                "max_tokens": context.get("max_tokens", 1000),
-                "top_p": context.get("top_p", 1.0)
-            }
+        Returns:
+            (tuple, int): 全部已提交消息, 要发送的第一条消息下标
+        """
+        history = self._get_conversation_history(session_id)
+        if not history:
+            return history, 0
+        
+        model_config = self._config_manager.get_model(provider_id, model_id) or {}
+        context_limit = model_config.get("max_tokens", 0)
+        if not context_limit:
+            return history, 0
+        
+        counter = self._get_token_counter(provider_id, model_id)
+        budget = context_limit - context.get("max_tokens", 1000)
+        budget -= self._fixed_request_tokens(counter, message, context)
         
-        return json.dumps(request_data).encode()
+        slack = self.PROMPT_CACHE_SLACK if self._prompt_cache_enabled(provider_id) else 0.0
+        return history, self._context_planner.plan(session_id, history, budget, counter.count_message, slack)
     
     def _get_session_info(self, session_id):
         """获取会话信息
@@ -501,6 +1555,24 @@ class LlmService(QObject):
         if not session_id:
             return None
         
+        registered = self._session_models.get(session_id)
+        if registered is not None:
+            return {
+                "provider_id": registered[0],
+                "model_id": registered[1],
+                "uuid": session_id
+            }
+        
+        # 会话管理器创建的会话
+        if self._database is not None:
+            stored = self._database.get_session(session_id)
+            if stored is not None:
+                return {
+                    "provider_id": stored["provider_id"],
+                    "model_id": stored["model_id"],
+                    "uuid": session_id
+                }
+        
         # 会话ID格式: provider_id.model_id.uuid
         parts = session_id.split(".", 2)
         if len(parts) != 3:
@@ -513,7 +1585,7 @@ class LlmService(QObject):
         }
     
     def _store_conversation_history(self, session_id, role, content):
-        """存储对话历史
+        """存储一条完整的对话消息
         
         Args:
             session_id: 会话ID
@@ -523,15 +1595,8 @@ class LlmService(QObject):
         if not session_id:
             return
         
-        # 确保对话历史存在
-        if session_id not in self._conversation_histories:
-            self._conversation_histories[session_id] = []
-        
-        # 添加到对话历史
-        self._conversation_histories[session_id].append({
-            "role": role,
-            "content": content
-        })
+        self._ensure_history_loaded(session_id)
+        self._history_store.append(session_id, role, content)
     
     def _get_conversation_history(self, session_id):
         """获取对话历史
@@ -540,12 +1605,13 @@ class LlmService(QObject):
             session_id: 会话ID
             
         Returns:
-            list: 对话历史
+            tuple: 已提交的ChatMessage
         """
-        if not session_id or session_id not in self._conversation_histories:
-            return []
+        if not session_id:
+            return ()
         
-        return self._conversation_histories[session_id]
+        self._ensure_history_loaded(session_id)
+        return self._history_store.snapshot(session_id)
     
     @Slot()
     def _on_network_reply_finished(self):
@@ -554,22 +1620,77 @@ class LlmService(QObject):
         if not reply:
             return
         
+        # 被放弃的重试或对冲请求
+        if reply.property("abandoned"):
+            reply.deleteLater()
+            return
+        
         # 获取会话ID
         session_id = reply.property("session_id")
         
-        # 减少活跃请求计数
-        self._active_requests -= 1
-        
-        # 从活跃会话请求中移除
-        if session_id in self._active_session_replies:
+        # 记录连接复用情况
+        timing = self._reply_timings.pop(reply, None)
+        if timing is not None:
+            http2 = bool(reply.attribute(QNetworkRequest.Http2WasUsedAttribute))
+            self._connection_stats.record_request(timing, http2)
+        
+        # 处理流中剩余的事件
+        parser = self._stream_parsers.pop(reply, None)
+        if parser is not None:
+            self._process_streaming_response(session_id, parser.finish(), reply)
+        
+        # 报告token用量
+        usage = self._reply_usage.pop(reply, None)
+        if usage:
+            self.usage_reported.emit(session_id, usage)
+        
+        # 释放并发名额,finished对每个响应只触发一次
+        job = self._reply_requests.pop(reply, None)
+        if job is not None:
+            self._job_payloads.pop(job, None)
+            self._scheduler.release(job)
+            
+            # 记录请求的延迟和吞吐量
+            record = self._job_records.pop(job, None)
+            if record is not None:
+                if timing is not None:
+                    record.connect_ms = timing.handshake_ms or 0
+                if usage:
+                    record.output_tokens = usage.get("output_tokens")
+                    record.input_tokens = usage.get("input_tokens")
+                    record.cache_read_tokens = usage.get("cache_read_tokens")
+                record.error = record.error or reply.error() != QNetworkReply.NoError
+                self.request_metrics_recorded.emit(session_id, self._request_metrics.record(record))
+        
+        # 从活跃会话请求中移除,并提交本轮助手回复
+        if self._active_session_replies.get(session_id) is reply:
             del self._active_session_replies[session_id]
+            committed = self._commit_turn(session_id)
+            
+            # 完整成功的回复写入响应缓存和近似问题索引
+            succeeded = committed is not None and reply.error() == QNetworkReply.NoError
+            cache_key = self._cache_keys.pop(session_id, None)
+            if succeeded and cache_key and self._response_cache is not None:
+                self._response_cache.put(cache_key, committed.content, usage)
+            
+            similarity_prompt = self._similarity_prompts.pop(session_id, None)
+            if succeeded and similarity_prompt and self._similarity_cache is not None:
+                self._similarity_cache.add(similarity_prompt[0], similarity_prompt[1], committed.content)
+                self._similarity_save_timer.start()
+            
+            # 主请求已结束,不再需要对冲请求
+            hedge = self._hedge_replies.pop(session_id, None)
+            if hedge is not None:
+                self._abandon_reply(hedge)
+        
+        # 输出尚未合并完的内容
+        self._chunk_coalescer.flush(session_id)
         
         # 发送完成信号
         self.response_finished.emit(session_id)
         
         # 如果所有请求都完成了,发送信号
-        if self._active_requests <= 0:
-            self._active_requests = 0
+        if not self._scheduler.has_pending():
             self.all_requests_finished.emit()
         
         # 释放资源
@@ -579,17 +1700,66 @@ class LlmService(QObject):
     def _on_network_reply_ready_read(self):
         """网络响应数据可读处理"""
         reply = self.sender()
-        if not reply:
+        if not reply or reply.property("abandoned"):
+            return
+        
+        # 错误响应体留给错误处理,不作为流数据
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status and status >= 400:
             return
         
         # 获取会话ID
         session_id = reply.property("session_id")
         
-        # 读取数据
-        data = reply.readAll()
+        # 首个数据块到达时记录首字节时间
+        timing = self._reply_timings.get(reply)
+        if timing is not None:
+            ttfb_ms = timing.first_byte()
+            if ttfb_ms is not None:
+                self._connection_stats.record_ttfb(ttfb_ms, timing.reused)
+                self.ttfb_measured.emit(session_id, ttfb_ms, timing.reused)
+                self._on_first_byte(session_id, reply)
+        
+        parser = self._stream_parsers.get(reply)
+        if parser is None:
+            return
+        
+        # 对冲决出之后只统计留下的请求
+        record = self._job_records.get(self._reply_requests.get(reply))
+        started = time.perf_counter()
+        
+        # 读取数据并增量解析
+        data = reply.readAll().data()
+        if record is not None:
+            record.data_received(len(data))
+        events = parser.feed(data)
         
         # 处理流式响应
-        self._process_streaming_response(session_id, data)
+        self._process_streaming_response(session_id, events, reply)
+        
+        if record is not None:
+            record.data_processed(started)
+    
+    @Slot()
+    def _on_network_reply_headers(self):
+        """响应头到达时更新速率限制额度"""
+        reply = self.sender()
+        if not reply or reply.property("abandoned"):
+            return
+        
+        job = self._reply_requests.get(reply)
+        if job is None or job.rate_key is None:
+            return
+        
+        headers = {
+            name.data().decode("latin-1").lower(): value.data().decode("latin-1")
+            for name, value in reply.rawHeaderPairs()
+        }
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if self._rate_limits.update(job.rate_key, headers, status, job.provider_id):
+            # 服务器报告的剩余额度已包含本请求
+            self._rate_limits.release(job)
+            self._scheduler.reschedule()
     
     @Slot(QNetworkReply.NetworkError)
     def _on_network_reply_error(self, error):
@@ -599,178 +1769,111 @@ class LlmService(QObject):
             error: 错误码
         """
         reply = self.sender()
-        if not reply:
+        if not reply or reply.property("abandoned"):
             return
         
         # 获取会话ID
         session_id = reply.property("session_id")
         
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if reply.property("timed_out"):
+            error = QNetworkReply.TimeoutError
+        
+        # 还没收到首字节的失败可以重试
+        if self._awaiting_first_byte(reply) and self._recover_before_first_byte(session_id, reply, error, status):
+            return
+        
         # 获取错误信息
         error_string = reply.errorString()
+        if status and status >= 400:
+            detail = reply.readAll().data().decode("utf-8", errors="replace").strip()
+            if detail:
+                error_string = f"{error_string} {detail[:200]}"
         
-        # 发送错误信号
-        self.error_occurred.emit(session_id, f"网络错误: {error_string}")
-        
-        # 减少活跃请求计数
-        self._active_requests -= 1
+        # 丢弃未完成的流数据
+        self._stream_parsers.pop(reply, None)
+        self._reply_usage.pop(reply, None)
         
-        # 从活跃会话请求中移除
-        if session_id in self._active_session_replies:
-            del self._active_session_replies[session_id]
+        record = self._job_records.get(self._reply_requests.get(reply))
+        if record is not None:
+            record.error = True
+        self._chunk_coalescer.flush(session_id)
         
-        # 如果所有请求都完成了,发送信号
-        if self._active_requests <= 0:
-            self._active_requests = 0
-            self.all_requests_finished.emit()
+        # 发送错误信号,并发名额在随后的finished中释放
+        self.error_occurred.emit(session_id, f"网络错误: {error_string}")
     
-    def _process_streaming_response(self, session_id, data):
+    def _process_streaming_response(self, session_id, events, reply=None):
         """处理流式响应
         
         Args:
             session_id: 会话ID
-            data: 响应数据
+            events: SseParser解析出的事件列表
+            reply: 事件所属的网络响应,用于累计token用量
         """
-        # 将数据添加到缓冲区
-        self._response_buffer.append(data)
+        if not events:
+            return
         
-        # 获取会话信息
-        session_info = self._get_session_info(session_id)
-        if not session_info:
+        adapter = self._session_adapters.get(session_id)
+        if adapter is None:
             return
         
-        provider_id = session_info["provider_id"]
+        record = self._job_records.get(self._reply_requests.get(reply)) if reply is not None else None
         
-        # 处理不同提供商的流式响应
-        if provider_id == "openai":
-            # 处理OpenAI流式响应
-            buffer_str = self._response_buffer.data().decode("utf-8", errors="ignore")
-            
-            # 查找完整的数据行
-            lines = buffer_str.split("\n")
-            processed_lines = 0
-            
-            for line in lines:
-                line = line.strip()
-                if not line or line == "data: [DONE]":
-                    processed_lines += 1
-                    continue
+        for event in events:
+            for data in self._decode_event_data(event.data):
+                # 提取token用量
+                usage = adapter.extract_usage(event.event, data)
+                if usage and reply is not None:
+                    self._reply_usage.setdefault(reply, {}).update(usage)
                 
-                if line.startswith("data: "):
-                    try:
-                        # 解析JSON数据
-                        json_str = line[6:]  # 去除"data: "前缀
-                        data = json.loads(json_str)
-                        
-                        # 提取内容
-                        if "choices" in data and len(data["choices"]) > 0:
-                            choice = data["choices"][0]
-                            if "delta" in choice and "content" in choice["delta"]:
-                                content = choice["delta"]["content"]
-                                
-                                # 发送内容块
-                                self.response_chunk.emit(session_id, content)
-                                
-                                # 存储助手回复
-                                self._store_conversation_history(session_id, "assistant", content)
-                        
-                        processed_lines += 1
-                    except json.JSONDecodeError:
-                        # 不完整的JSON,等待更多数据
-                        break
-                else:
-                    processed_lines += 1
-            
-            # 移除已处理的行
-            if processed_lines > 0:
-                remaining = "\n".join(lines[processed_lines:])
-                self._response_buffer = QByteArray(remaining.encode("utf-8"))
-        
-        elif provider_id == "anthropic":
-            # 处理Anthropic流式响应
-            buffer_str = self._response_buffer.data().decode("utf-8", errors="ignore")
-            
-            # 查找完整的数据行
-            lines = buffer_str.split("\n")
-            processed_lines = 0
-            
-            for line in lines:
-                line = line.strip()
-                if not line or line == "data: [DONE]":
-                    processed_lines += 1
+                # 提取内容
+                content = adapter.decode_event(event.event, data)
+                if not content:
                     continue
                 
-                if line.startswith("data: "):
-                    try:
-                        # 解析JSON数据
-                        json_str = line[6:]  # 去除"data: "前缀
-                        data = json.loads(json_str)
-                        
-                        # 提取内容
-                        if "type" in data and data["type"] == "content_block_delta":
-                            if "delta" in data and "text" in data["delta"]:
-                                content = data["delta"]["text"]
-                                
-                                # 发送内容块
-                                self.response_chunk.emit(session_id, content)
-                                
-                                # 存储助手回复
-                                self._store_conversation_history(session_id, "assistant", content)
-                        
-                        processed_lines += 1
-                    except json.JSONDecodeError:
-                        # 不完整的JSON,等待更多数据
-                        break
-                else:
-                    processed_lines += 1
-            
-            # 移除已处理的行
-            if processed_lines > 0:
-                remaining = "\n".join(lines[processed_lines:])
-                self._response_buffer = QByteArray(remaining.encode("utf-8"))
-        
-        else:
-            # 默认处理方式(类似OpenAI)
-            buffer_str = self._response_buffer.data().decode("utf-8", errors="ignore")
-            
-            # 查找完整的数据行
-            lines = buffer_str.split("\n")
-            processed_lines = 0
-            
-            for line in lines:
-                line = line.strip()
-                if not line or line == "data: [DONE]":
-                    processed_lines += 1
-                    continue
+                # 发送内容块
+                self.response_chunk.emit(session_id, content)
+                if record is not None:
+                    record.output_chars += len(content)
                 
-                if line.startswith("data: "):
-                    try:
-                        # 解析JSON数据
-                        json_str = line[6:]  # 去除"data: "前缀
-                        data = json.loads(json_str)
-                        
-                        # 提取内容(通用格式)
-                        if "choices" in data and len(data["choices"]) > 0:
-                            choice = data["choices"][0]
-                            if "delta" in choice and "content" in choice["delta"]:
-                                content = choice["delta"]["content"]
-                                
-                                # 发送内容块
-                                self.response_chunk.emit(session_id, content)
-                                
-                                # 存储助手回复
-                                self._store_conversation_history(session_id, "assistant", content)
-                        
-                        processed_lines += 1
-                    except json.JSONDecodeError:
-                        # 不完整的JSON,等待更多数据
-                        break
-                else:
-                    processed_lines += 1
+                # 累积到本轮助手回复,完成时作为一条消息提交
+                self._history_store.append_delta(session_id, content)
+                if self._stream_journal is not None:
+                    self._stream_journal.append(session_id, content)
+    
+    def _decode_event_data(self, payload):
+        """解析SSE事件数据中的JSON
+        
+        Args:
+            payload: 事件data字段
             
-            # 移除已处理的行
-            if processed_lines > 0:
-                remaining = "\n".join(lines[processed_lines:])
-                self._response_buffer = QByteArray(remaining.encode("utf-8"))
+        Returns:
+            list: 解析出的JSON对象列表
+        """
+        if not payload or payload == "[DONE]":
+            return []
+        
+        try:
+            data = json.loads(payload)
+            return [data] if isinstance(data, dict) else []
+        except json.JSONDecodeError:
+            pass
+        
+        # 部分兼容服务在data行之间不发送空行,逐行解析
+        results = []
+        for line in payload.split("\n"):
+            line = line.strip()
+            if line.startswith("data:"):
+                line = line[5:].strip()
+            if not line or line == "[DONE]":
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                results.append(data)
+        return results
     
     @Slot()
     def _on_connection_test_finished(self, reply, provider_id):
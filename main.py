@@ -3,6 +3,12 @@
 
 import sys
 import os
+
+# 批量模式不需要界面,在导入界面模块之前转到batch_runner
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "batch":
+    from batch_runner import main as batch_main
+    sys.exit(batch_main(sys.argv[2:]))
+
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QTranslator, QLocale, QLibraryInfo, QFile, Qt
 from PySide6.QtGui import QIcon
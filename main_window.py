@@ -19,6 +19,7 @@ from theme_manager import ThemeManager, Theme
 from settings_page import SettingsDialog
 from session_manager import SessionManager
 from config_manager import ConfigManager
+from model_router import ModelRouter
 
 
 class MainWindow(QMainWindow):
@@ -80,6 +81,11 @@ class MainWindow(QMainWindow):
         self._tool_manager = ToolManager(self)
         self._session_manager = SessionManager(self)
         
+        # 恢复上次运行时中断的流式回复,会话已由会话管理器导入数据库
+        recovered = self._llm_service.recover_interrupted_responses()
+        if recovered:
+            print(f"已恢复 {recovered} 个中断的回复")
+        
         # 创建中央部件
         self._central_widget = QWidget(self)
         self.setCentralWidget(self._central_widget)
@@ -267,11 +273,20 @@ class MainWindow(QMainWindow):
         self._chat_stack.addWidget(chat_view)
         self._chat_views[session_id] = chat_view
         
-        # 显示欢迎消息
+        # 显示数据库中最近一页的历史,包括上次运行中断后恢复的回复
+        if chat_view.load_history():
+            if self._llm_service.take_recovered_responses(session_id):
+                chat_view.append_recovered_notice()
+            return
+        
+        # 新会话显示欢迎消息
         session_info = self._session_manager.get_session(session_id)
         if session_info:
             provider_name = session_info["provider_id"].capitalize()
             model_name = session_info["model_id"]
+            if session_info["provider_id"] == ModelRouter.GROUP_PROVIDER:
+                provider_name = self.tr("模型组")
+                model_name = self._llm_service.model_router().groups().get(model_name, model_name)
             chat_view.append_assistant_message(
                 self.tr(f"欢迎使用 {provider_name} {model_name}! 请输入您的问题。")
             )
@@ -289,8 +304,10 @@ class MainWindow(QMainWindow):
         """连接信号和槽"""
         # 连接会话管理器信号
         self._session_manager.session_added.connect(self._on_session_added)
+        self._session_manager.session_removing.connect(self._on_session_removing)
         self._session_manager.session_removed.connect(self._on_session_removed)
         self._session_manager.session_selected.connect(self._on_session_selected)
+        self._session_manager.message_selected.connect(self._on_message_selected)
         
         # 连接主题管理器信号
         ThemeManager.instance().theme_changed.connect(self._on_theme_changed)
@@ -380,7 +397,7 @@ class MainWindow(QMainWindow):
             settings_layout.setContentsMargins(0, 0, 0, 0)
             settings_layout.setSpacing(0)  # 移除内部间距
             
-            self._settings_dialog = SettingsDialog(self)
+            self._settings_dialog = SettingsDialog(self, self._llm_service)
             self._settings_dialog.setWindowFlags(Qt.Widget)  # 设置为普通Widget
             
             # 连接设置应用信号
@@ -486,6 +503,15 @@ class MainWindow(QMainWindow):
         # 切换到新会话
         self._session_manager.set_current_session(session_id)
     
+    @Slot(str)
+    def _on_session_removing(self, session_id):
+        """会话即将从数据库删除,取消会话的请求并释放内存中的历史
+        
+        Args:
+            session_id: 会话ID
+        """
+        self._llm_service.release_session(session_id)
+    
     @Slot(str)
     def _on_session_removed(self, session_id):
         """会话删除处理
@@ -510,6 +536,12 @@ class MainWindow(QMainWindow):
         Args:
             session_id: 会话ID
         """
+        # 选中会话的请求优先调度
+        self._llm_service.set_foreground_session(session_id)
+        
+        # 预热到会话提供商的连接
+        self._llm_service.preconnect(session_id)
+        
         # 切换到选中的会话视图
         if session_id in self._chat_views:
             self._chat_stack.setCurrentWidget(self._chat_views[session_id])
@@ -518,6 +550,18 @@ class MainWindow(QMainWindow):
             self._create_chat_view(session_id)
             self._chat_stack.setCurrentWidget(self._chat_views[session_id])
     
+    @Slot(str, int)
+    def _on_message_selected(self, session_id, message_id):
+        """搜索结果选择处理,在会话视图中定位到消息
+        
+        Args:
+            session_id: 会话ID
+            message_id: 消息ID
+        """
+        chat_view = self._chat_views.get(session_id)
+        if chat_view is not None:
+            chat_view.show_message(message_id)
+    
     def _get_current_chat_view(self):
         """获取当前聊天视图
         
@@ -0,0 +1,662 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""本地模拟提供商服务器
+
+按OpenAI、Anthropic和DeepSeek的流式格式返回内容,用于在没有网络和API密钥
+的情况下对流式链路做基准测试和回归测试。首字节时间、输出速率、分块方式、
+错误注入和回复长度均可配置,也可在API URL的查询参数中按提供商覆盖。
+
+用法:
+    python mock_provider_server.py [--port 8765] [--ttfb-ms 300] [--tokens-per-s 80]
+
+然后在model.toml中添加指向本机的提供商(启动时会打印示例配置):
+    [providers.mock]
+    name = "Mock"
+    api_style = "openai"
+    api_url = "http://127.0.0.1:8765/openai/v1/chat/completions?ttfb_ms=500"
+    api_key = "mock"
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+
+# 可配置项及默认值,类型由默认值决定
+DEFAULT_OPTIONS = {
+    "style": "auto",  # openai、anthropic、deepseek,auto按请求头和路径判断
+    "ttfb_ms": 200,  # 首个内容块之前的等待时间
+    "tokens_per_s": 50.0,  # 输出速率,0为不限速
+    "tokens": 100,  # 每个回复的token数
+    "token_text": "模拟token ",  # 每个token的文本
+    "reasoning_tokens": -1,  # deepseek风格的思考token数,-1为模型名含reasoner时与tokens相同
+    "fragment": "event",  # event每个事件写一次,split把事件拆成随机片段,batch多个事件合并写
+    "batch_size": 5,  # fragment为batch时每次写出的事件数
+    "error_rate": 0.0,  # 请求失败的概率
+    "error_status": 503,  # 失败时返回的HTTP状态码
+    "fail_first": 0,  # 前N个请求固定失败
+    "retry_after": 0,  # 失败响应的Retry-After秒数,0为不发送
+    "disconnect_rate": 0.0,  # 输出中途断开连接的概率
+    "disconnect_after": 0,  # 断开前输出的token数,0为回复的一半
+    "seed": 0,  # 随机种子,0为不固定
+    "rate_limit_requests": 0,  # 每个窗口每个API密钥的请求数上限,0为不限制
+    "rate_limit_tokens": 0,  # 每个窗口的token上限(输入估算加max_tokens),0为不限制
+    "rate_limit_window": 1.0,  # 速率限制窗口(秒)
+}
+
+# 各状态码在Anthropic风格中的错误类型
+_ANTHROPIC_ERROR_TYPES = {
+    400: "invalid_request_error",
+    401: "authentication_error",
+    429: "rate_limit_error",
+    529: "overloaded_error",
+}
+
+# SSE保活注释的间隔(秒),DeepSeek在排队时发送
+_KEEP_ALIVE_INTERVAL = 0.5
+
+# 模拟前缀缓存最多记住的前缀数
+_MAX_PREFIXES = 100000
+
+
+def parse_options(values, base=None):
+    """按默认值的类型转换配置项
+
+    Args:
+        values: 配置项字典,值可为字符串
+        base: 未指定项使用的配置,为None时使用DEFAULT_OPTIONS
+
+    Returns:
+        dict: 完整配置
+
+    Raises:
+        ValueError: 未知配置项或值无法转换
+    """
+    options = dict(base or DEFAULT_OPTIONS)
+    for key, value in values.items():
+        if key not in DEFAULT_OPTIONS:
+            raise ValueError(f"未知配置项: {key}")
+        options[key] = type(DEFAULT_OPTIONS[key])(value)
+
+    if options["fragment"] not in ("event", "split", "batch"):
+        raise ValueError(f"未知分块方式: {options['fragment']}")
+    if options["style"] not in ("auto", "openai", "anthropic", "deepseek"):
+        raise ValueError(f"未知API风格: {options['style']}")
+    return options
+
+
+def _plain_content(content):
+    """去掉cache_control标记,只有一个文本块时还原为字符串"""
+    if not isinstance(content, list):
+        return content
+    blocks = [{k: v for k, v in block.items() if k != "cache_control"} for block in content]
+    if len(blocks) == 1 and blocks[0].get("type") == "text":
+        return blocks[0].get("text")
+    return blocks
+
+
+class _StreamBuilder:
+    """生成一种API风格的流式事件和非流式响应"""
+
+    def __init__(self, style, model, cached_tokens=0):
+        self.style = style
+        self.model = model
+        self.cached_tokens = cached_tokens
+        self.id = uuid.uuid4().hex[:24]
+        self.created = int(time.time())
+
+    def events(self, tokens, token_text, reasoning_tokens, input_tokens, include_usage=True):
+        """生成全部SSE事件
+
+        Args:
+            include_usage: OpenAI风格是否在最后发送usage事件,对应请求的stream_options.include_usage
+
+        Returns:
+            list: (事件字节串, 是否为内容token)元组
+        """
+        if self.style == "anthropic":
+            return self._anthropic_events(tokens, token_text, input_tokens)
+        return self._openai_events(tokens, token_text, reasoning_tokens, input_tokens, include_usage)
+
+    def response(self, tokens, token_text, input_tokens):
+        """生成非流式响应体"""
+        text = token_text * tokens
+        if self.style == "anthropic":
+            body = {
+                "id": "msg_" + self.id,
+                "type": "message",
+                "role": "assistant",
+                "model": self.model,
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "usage": dict(self._anthropic_input_usage(input_tokens), output_tokens=tokens),
+            }
+        else:
+            body = {
+                "id": "chatcmpl-" + self.id,
+                "object": "chat.completion",
+                "created": self.created,
+                "model": self.model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": self._openai_usage(input_tokens, tokens),
+            }
+        return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    def error(self, status, message):
+        """生成错误响应体"""
+        if self.style == "anthropic":
+            error_type = _ANTHROPIC_ERROR_TYPES.get(status, "api_error")
+            body = {"type": "error", "error": {"type": error_type, "message": message}}
+        else:
+            body = {"error": {"message": message, "type": "server_error" if status >= 500 else "rate_limit_error",
+                              "code": status}}
+        return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    def _openai_usage(self, input_tokens, output_tokens):
+        usage = {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        if self.style == "deepseek":
+            usage["prompt_cache_hit_tokens"] = self.cached_tokens
+            usage["prompt_cache_miss_tokens"] = input_tokens - self.cached_tokens
+        else:
+            usage["prompt_tokens_details"] = {"cached_tokens": self.cached_tokens}
+        return usage
+
+    def _anthropic_input_usage(self, input_tokens):
+        return {
+            "input_tokens": input_tokens - self.cached_tokens,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": self.cached_tokens,
+        }
+
+    def _openai_chunk(self, delta, finish_reason=None, usage=None):
+        chunk = {
+            "id": "chatcmpl-" + self.id,
+            "object": "chat.completion.chunk",
+            "created": self.created,
+            "model": self.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            chunk["choices"] = []
+            chunk["usage"] = usage
+        return b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+    def _openai_events(self, tokens, token_text, reasoning_tokens, input_tokens, include_usage):
+        events = [(self._openai_chunk({"role": "assistant", "content": ""}), False)]
+        for _ in range(reasoning_tokens):
+            events.append((self._openai_chunk({"content": None, "reasoning_content": token_text}), True))
+        for _ in range(tokens):
+            events.append((self._openai_chunk({"content": token_text}), True))
+        events.append((self._openai_chunk({}, "stop"), False))
+        if include_usage:
+            usage = self._openai_usage(input_tokens, reasoning_tokens + tokens)
+            events.append((self._openai_chunk(None, usage=usage), False))
+        events.append((b"data: [DONE]\n\n", False))
+        return events
+
+    def _anthropic_event(self, name, data):
+        payload = json.dumps(dict(data, type=name), ensure_ascii=False).encode("utf-8")
+        return b"event: " + name.encode() + b"\ndata: " + payload + b"\n\n"
+
+    def _anthropic_events(self, tokens, token_text, input_tokens):
+        message = {
+            "id": "msg_" + self.id,
+            "type": "message",
+            "role": "assistant",
+            "model": self.model,
+            "content": [],
+            "stop_reason": None,
+            "usage": dict(self._anthropic_input_usage(input_tokens), output_tokens=1),
+        }
+        events = [
+            (self._anthropic_event("message_start", {"message": message}), False),
+            (self._anthropic_event("content_block_start",
+                                   {"index": 0, "content_block": {"type": "text", "text": ""}}), False),
+            (self._anthropic_event("ping", {}), False),
+        ]
+        for _ in range(tokens):
+            delta = {"index": 0, "delta": {"type": "text_delta", "text": token_text}}
+            events.append((self._anthropic_event("content_block_delta", delta), True))
+        events.append((self._anthropic_event("content_block_stop", {"index": 0}), False))
+        events.append((self._anthropic_event("message_delta", {
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": tokens},
+        }), False))
+        events.append((self._anthropic_event("message_stop", {}), False))
+        return events
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """处理对话请求"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.mock.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        """连接测试"""
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        """对话请求"""
+        mock = self.server.mock
+        url = urlsplit(self.path)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length)
+        try:
+            body = json.loads(raw_body or b"{}")
+            options = parse_options(dict(parse_qsl(url.query)), mock.options)
+        except ValueError as e:
+            self._send_json(400, json.dumps({"error": {"message": str(e)}}).encode())
+            return
+
+        request_number = mock.count_request()
+        rng = random.Random(options["seed"] + request_number if options["seed"] else None)
+        model = body.get("model", "mock-model")
+        style = self._resolve_style(options["style"], url.path, model)
+
+        # 粗略估算输入token数
+        input_tokens = max(1, len(raw_body) // 4)
+        builder = _StreamBuilder(style, model, min(input_tokens, mock.cached_tokens(body)))
+
+        # 按API密钥计算速率限制,超出时返回429
+        api_key = self.headers.get("x-api-key") or self.headers.get("Authorization") or ""
+        cost = input_tokens + int(body.get("max_tokens") or 0)
+        allowed, headers = mock.take_rate_limit(api_key, options, cost, style)
+        if not allowed:
+            time.sleep(options["ttfb_ms"] / 1000)
+            self._send_json(429, builder.error(429, "模拟速率限制"), headers=headers)
+            return
+
+        if request_number <= options["fail_first"] or rng.random() < options["error_rate"]:
+            status = options["error_status"]
+            time.sleep(options["ttfb_ms"] / 1000)
+            mock.count_error()
+            self._send_json(status, builder.error(status, f"模拟错误 {status}"), options["retry_after"], headers)
+            return
+
+        tokens = options["tokens"]
+        if not body.get("stream"):
+            time.sleep(options["ttfb_ms"] / 1000)
+            self._send_json(200, builder.response(tokens, options["token_text"], input_tokens), headers=headers)
+            return
+
+        reasoning_tokens = options["reasoning_tokens"]
+        if reasoning_tokens < 0:
+            reasoning_tokens = tokens if style == "deepseek" and "reasoner" in model else 0
+
+        disconnect_at = None
+        if rng.random() < options["disconnect_rate"]:
+            disconnect_at = options["disconnect_after"] or max(1, (reasoning_tokens + tokens) // 2)
+
+        # 与OpenAI一致,只有请求了stream_options.include_usage时才在流末尾报告用量
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        events = builder.events(tokens, options["token_text"], reasoning_tokens, input_tokens, include_usage)
+        self._stream(events, options, rng, style, disconnect_at, headers)
+
+    def _resolve_style(self, style, path, model):
+        """确定响应的API风格"""
+        if style != "auto":
+            return style
+        if self.headers.get("x-api-key") or self.headers.get("anthropic-version") or "/anthropic/" in path:
+            return "anthropic"
+        if "deepseek" in path or "deepseek" in model:
+            return "deepseek"
+        return "openai"
+
+    def _send_json(self, status, payload, retry_after=0, headers=None):
+        """发送完整的JSON响应"""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after:
+            self.send_header("Retry-After", str(retry_after))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data):
+        """以chunked编码写出数据"""
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, events, options, rng, style, disconnect_at, headers=None):
+        """按配置的节奏和分块方式写出事件
+
+        Args:
+            events: (事件字节串, 是否为内容token)列表
+            options: 配置
+            rng: 随机数生成器
+            style: API风格
+            disconnect_at: 在第几个token后断开,None为不断开
+            headers: 额外的响应头
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        started = time.perf_counter()
+        first_byte_at = started + options["ttfb_ms"] / 1000
+        rate = options["tokens_per_s"]
+
+        try:
+            # 等待首字节,DeepSeek风格在此期间发送保活注释
+            while True:
+                remaining = first_byte_at - time.perf_counter()
+                if remaining <= 0:
+                    break
+                if style == "deepseek" and remaining > _KEEP_ALIVE_INTERVAL:
+                    time.sleep(_KEEP_ALIVE_INTERVAL)
+                    self._write_chunk(b": keep-alive\n\n")
+                else:
+                    time.sleep(remaining)
+
+            pending = []
+            token_index = 0
+            for data, is_token in events:
+                if is_token:
+                    if token_index == disconnect_at:
+                        self.server.mock.count_disconnect()
+                        self._flush_events(pending, options, rng)
+                        self._disconnect()
+                        return
+
+                    # 按速率计算该token的输出时间
+                    if rate > 0:
+                        delay = first_byte_at + token_index / rate - time.perf_counter()
+                        if delay > 0:
+                            # batch模式下累积的事件在凑满后一起写出,形成突发
+                            if options["fragment"] != "batch":
+                                self._flush_events(pending, options, rng)
+                                pending = []
+                            time.sleep(delay)
+                    token_index += 1
+
+                pending.append(data)
+                if options["fragment"] != "batch" or len(pending) >= options["batch_size"]:
+                    self._flush_events(pending, options, rng)
+                    pending = []
+
+            self._flush_events(pending, options, rng)
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了请求
+            self.close_connection = True
+
+    def _flush_events(self, events, options, rng):
+        """写出累积的事件"""
+        if not events:
+            return
+
+        data = b"".join(events)
+        if options["fragment"] != "split" or len(data) < 2:
+            self._write_chunk(data)
+            return
+
+        # 在随机位置拆开,可能切断多字节字符和行
+        cuts = sorted(rng.sample(range(1, len(data)), min(len(data) - 1, rng.randint(1, 3))))
+        start = 0
+        for cut in cuts + [len(data)]:
+            self._write_chunk(data[start:cut])
+            start = cut
+
+    def _disconnect(self):
+        """不结束chunked编码直接断开连接"""
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class MockProviderServer:
+    """在后台线程运行的模拟提供商服务器
+
+    用法:
+        with MockProviderServer(ttfb_ms=100, tokens_per_s=200) as server:
+            api_url = server.url("openai", error_rate=0.1)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, verbose=False, **options):
+        """初始化服务器
+
+        Args:
+            host: 监听地址
+            port: 监听端口,0为自动分配
+            verbose: 是否打印请求日志
+            **options: DEFAULT_OPTIONS中的配置项
+        """
+        self.options = parse_options(options)
+        self.verbose = verbose
+
+        self._lock = threading.Lock()
+        self._prefixes = set()
+        self._rate_windows = {}  # API密钥 -> [窗口开始时间, 请求数, token数]
+        self.requests = 0
+        self.errors = 0
+        self.disconnects = 0
+        self.rate_limited = 0
+
+        self._server = ThreadingHTTPServer((host, port), _MockHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def port(self):
+        """实际监听的端口"""
+        return self._server.server_address[1]
+
+    def url(self, style="openai", **overrides):
+        """生成指向本服务器的API URL
+
+        Args:
+            style: API风格
+            **overrides: 只对该URL生效的配置项
+
+        Returns:
+            str: API URL
+        """
+        path = "/v1/messages" if style == "anthropic" else "/v1/chat/completions"
+        parse_options(overrides, self.options)
+        query = "?" + urlencode(overrides) if overrides else ""
+        host = self._server.server_address[0]
+        return f"http://{host}:{self.port}/{style}{path}{query}"
+
+    def start(self):
+        """在后台线程开始服务
+
+        Returns:
+            MockProviderServer: 自身
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def serve_forever(self):
+        """在当前线程服务,直到被中断"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def count_request(self):
+        """记录一个请求
+
+        Returns:
+            int: 该请求的序号,从1开始
+        """
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def cached_tokens(self, body):
+        """模拟提供商的前缀缓存
+
+        Args:
+            body: 请求体
+
+        Returns:
+            int: 与此前请求相同的最长前缀(系统提示加历史消息)的估算token数
+        """
+        system = json.dumps(_plain_content(body.get("system")), ensure_ascii=False).encode()
+        digest = hashlib.sha256(system)
+        size = len(system)
+        keys = [(digest.hexdigest(), size)] if body.get("system") else []
+        for message in (body.get("messages") or [])[:-1]:
+            encoded = json.dumps(dict(message, content=_plain_content(message.get("content"))),
+                                 ensure_ascii=False, sort_keys=True).encode()
+            digest.update(encoded)
+            size += len(encoded)
+            keys.append((digest.hexdigest(), size))
+
+        hit = 0
+        with self._lock:
+            for key, prefix_size in keys:
+                if key in self._prefixes:
+                    hit = prefix_size
+            if len(self._prefixes) > _MAX_PREFIXES:
+                self._prefixes.clear()
+            self._prefixes.update(key for key, _ in keys)
+        return hit // 4
+
+    def take_rate_limit(self, api_key, options, cost, style):
+        """按固定窗口模拟提供商的速率限制
+
+        Args:
+            api_key: 请求的API密钥
+            options: 配置
+            cost: 请求的token消耗
+            style: API风格,决定响应头格式
+
+        Returns:
+            (bool, dict): 是否允许, 速率限制响应头
+        """
+        request_limit = options["rate_limit_requests"]
+        token_limit = options["rate_limit_tokens"]
+        if not request_limit and not token_limit:
+            return True, {}
+
+        window = options["rate_limit_window"]
+        now = time.time()
+        with self._lock:
+            state = self._rate_windows.get(api_key)
+            if state is None or now - state[0] >= window:
+                state = self._rate_windows[api_key] = [now, 0, 0]
+
+            allowed = ((not request_limit or state[1] < request_limit)
+                       and (not token_limit or state[2] + cost <= token_limit))
+            if allowed:
+                state[1] += 1
+                state[2] += cost
+            else:
+                self.rate_limited += 1
+            used_requests, used_tokens = state[1], state[2]
+            reset = max(0.0, state[0] + window - now)
+
+        buckets = []
+        if request_limit:
+            buckets.append(("requests", request_limit, max(0, request_limit - used_requests)))
+        if token_limit:
+            buckets.append(("tokens", token_limit, max(0, token_limit - used_tokens)))
+
+        headers = {}
+        for name, limit, remaining in buckets:
+            if style == "anthropic":
+                reset_at = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now + reset))
+                headers[f"anthropic-ratelimit-{name}-limit"] = str(limit)
+                headers[f"anthropic-ratelimit-{name}-remaining"] = str(remaining)
+                headers[f"anthropic-ratelimit-{name}-reset"] = f"{reset_at}.{int((now + reset) % 1 * 1000):03d}Z"
+            else:
+                headers[f"x-ratelimit-limit-{name}"] = str(limit)
+                headers[f"x-ratelimit-remaining-{name}"] = str(remaining)
+                headers[f"x-ratelimit-reset-{name}"] = f"{int(reset * 1000)}ms"
+        if not allowed:
+            headers["Retry-After"] = str(max(1, round(reset)))
+        return allowed, headers
+
+    def count_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def count_disconnect(self):
+        with self._lock:
+            self.disconnects += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟提供商服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--verbose", action="store_true", help="打印请求日志")
+    for key, default in DEFAULT_OPTIONS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args()
+
+    options = {key: getattr(args, key) for key in DEFAULT_OPTIONS}
+    server = MockProviderServer(args.host, args.port, args.verbose, **options)
+
+    print(f"模拟提供商服务器已启动: http://{args.host}:{server.port}")
+    print("model.toml示例配置:")
+    for style in ("openai", "anthropic", "deepseek"):
+        print(f"""
+[providers.mock-{style}]
+name = "Mock {style}"
+api_style = "{"anthropic" if style == "anthropic" else "openai"}"
+api_url = "{server.url(style)}"
+api_key = "mock"
+[[providers.mock-{style}.models]]
+id = "mock-model"
+name = "Mock Model"
+max_tokens = 8192
+supports_stream = true""")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from config_manager import ConfigManager
+
+
+def parse_member(member):
+    """解析模型组成员
+
+    Args:
+        member: "提供商ID/模型ID"字符串,模型ID可以包含"/";
+            或{"provider": 提供商ID, "model": 模型ID}字典
+
+    Returns:
+        (str, str): 提供商ID, 模型ID,格式错误时返回None
+    """
+    if isinstance(member, dict):
+        provider_id, model_id = member.get("provider"), member.get("model")
+    elif isinstance(member, str) and "/" in member:
+        provider_id, model_id = member.split("/", 1)
+    else:
+        return None
+
+    if not provider_id or not model_id:
+        return None
+    return provider_id, model_id
+
+
+class _MemberStats:
+    """一个提供商/模型的近期表现,指数加权平均"""
+
+    __slots__ = ("ttfb_ms", "error_rate", "samples", "last_failure")
+
+    def __init__(self):
+        self.ttfb_ms = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_failure = None
+
+
+class ModelRouter:
+    """按近期首字节时间和错误率在模型组成员间选择
+
+    model.toml中定义模型组,成员提供相同或等价的模型:
+        [model_groups.deepseek-v3]
+        name = "DeepSeek V3"
+        members = ["deepseek/deepseek-chat", "硅基流动/deepseek-ai/DeepSeek-V3"]
+
+    每个成员的得分为首字节时间的加权平均乘以(1 + ERROR_PENALTY * 错误率),
+    得分低者优先;还没有样本的成员得分为0,会先被尝试一次。最近失败过的成员
+    在冷却期内排在其他成员之后。
+    """
+
+    # 绑定模型组的会话保存的提供商ID,模型ID保存模型组ID
+    GROUP_PROVIDER = "@group"
+
+    # 指数加权平均的新样本权重
+    ALPHA = 0.2
+
+    # 错误率对得分的放大系数
+    ERROR_PENALTY = 4.0
+
+    # 失败后降低优先级的时间(秒)
+    FAILURE_COOLDOWN = 30.0
+
+    def __init__(self, config_manager=None):
+        """初始化路由器
+
+        Args:
+            config_manager: 配置管理器,为None时使用ConfigManager.instance()
+        """
+        self._config_manager = config_manager or ConfigManager.instance()
+        self._stats = {}  # (提供商ID, 模型ID) -> _MemberStats
+
+    def groups(self):
+        """获取所有模型组
+
+        Returns:
+            dict: 模型组ID -> 名称
+        """
+        return {
+            group_id: group.get("name", group_id)
+            for group_id, group in self._config_manager.get_model_groups().items()
+        }
+
+    def members(self, group_id):
+        """获取模型组中已配置且可用的成员
+
+        提供商缺少API URL或密钥、或模型不存在的成员被跳过。
+
+        Args:
+            group_id: 模型组ID
+
+        Returns:
+            list: (提供商ID, 模型ID)列表,按配置顺序
+        """
+        group = self._config_manager.get_model_group(group_id)
+        if not group:
+            return []
+
+        members = []
+        for entry in group.get("members", []):
+            member = parse_member(entry)
+            if member is None or member in members:
+                continue
+
+            provider = self._config_manager.get_provider(member[0])
+            if not provider or not provider.get("api_url") or not provider.get("api_key"):
+                continue
+            if not self._config_manager.get_model(*member):
+                continue
+            members.append(member)
+        return members
+
+    def record(self, provider_id, model_id, ttfb_ms, error):
+        """记录一个请求的结果
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+            ttfb_ms: 首字节时间,没有收到数据时为None
+            error: 是否失败
+        """
+        key = (provider_id, model_id)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _MemberStats()
+
+        stats.samples += 1
+        stats.error_rate += self.ALPHA * ((1.0 if error else 0.0) - stats.error_rate)
+        if error:
+            stats.last_failure = time.monotonic()
+
+        if ttfb_ms is not None and not error:
+            if stats.ttfb_ms is None:
+                stats.ttfb_ms = float(ttfb_ms)
+            else:
+                stats.ttfb_ms += self.ALPHA * (ttfb_ms - stats.ttfb_ms)
+
+    def score(self, provider_id, model_id):
+        """计算成员得分,越低越优先
+
+        Returns:
+            float: 得分
+        """
+        stats = self._stats.get((provider_id, model_id))
+        if stats is None or stats.ttfb_ms is None:
+            # 没有成功样本时按错误率排序,全新成员为0
+            return 0.0 if stats is None else stats.error_rate * 1e6
+        return stats.ttfb_ms * (1.0 + self.ERROR_PENALTY * stats.error_rate)
+
+    def choose(self, group_id, exclude=()):
+        """选择模型组中最优的成员
+
+        Args:
+            group_id: 模型组ID
+            exclude: 本次请求已尝试过的成员
+
+        Returns:
+            (str, str): 提供商ID, 模型ID,没有可用成员时返回None
+        """
+        ranked = self.ranking(group_id, exclude)
+        if not ranked:
+            return None
+        return ranked[0]["provider_id"], ranked[0]["model_id"]
+
+    def ranking(self, group_id, exclude=()):
+        """按优先级排列模型组成员
+
+        Args:
+            group_id: 模型组ID
+            exclude: 要排除的成员
+
+        Returns:
+            list: 每个成员的provider_id、model_id、score、ttfb_ms、error_rate、samples、cooling
+        """
+        now = time.monotonic()
+        ranked = []
+        for provider_id, model_id in self.members(group_id):
+            if (provider_id, model_id) in exclude:
+                continue
+
+            stats = self._stats.get((provider_id, model_id))
+            cooling = (stats is not None and stats.last_failure is not None
+                       and now - stats.last_failure < self.FAILURE_COOLDOWN)
+            ranked.append({
+                "provider_id": provider_id,
+                "model_id": model_id,
+                "score": round(self.score(provider_id, model_id), 1),
+                "ttfb_ms": round(stats.ttfb_ms, 1) if stats is not None and stats.ttfb_ms is not None else None,
+                "error_rate": round(stats.error_rate, 3) if stats is not None else 0.0,
+                "samples": stats.samples if stats is not None else 0,
+                "cooling": cooling,
+            })
+
+        # 排序稳定,得分相同时保持配置顺序
+        ranked.sort(key=lambda entry: (entry["cooling"], entry["score"]))
+        return ranked
+
+    def reset(self):
+        """清空统计"""
+        self._stats.clear()
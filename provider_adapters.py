@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+
+
+class ProviderAdapter(ABC):
+    """提供商适配器基类,封装一种API风格的请求头、请求体和流式事件格式
+
+    子类必须实现build_body和decode_event,缺少时无法实例化,注册时即报错。
+    """
+
+    # 在model.toml中通过api_style引用的名称
+    api_style = ""
+
+    # 显示名称
+    display_name = ""
+
+    # 是否支持在请求中显式标记提示缓存断点
+    supports_cache_control = False
+
+    def headers(self, api_key):
+        """构建认证相关的请求头
+
+        Args:
+            api_key: API密钥
+
+        Returns:
+            list: (头名称, 头内容)字节串元组列表
+        """
+        return [(b"Authorization", f"Bearer {api_key}".encode())]
+
+    @abstractmethod
+    def build_body(self, model_id, system_prompt, messages, params, stream=True, cache_prompt=False,
+                   stream_usage=False):
+        """构建请求体
+
+        字段顺序固定,系统提示总在消息之前,使相同的前缀序列化后逐字节一致,
+        提供商的前缀缓存才能命中。
+
+        Args:
+            model_id: 模型ID
+            system_prompt: 系统提示,可为空
+            messages: 消息字典列表,不含系统提示
+            params: 采样参数(temperature、max_tokens、top_p)
+            stream: 是否流式返回
+            cache_prompt: 是否在系统提示上标记缓存断点,仅supports_cache_control时有效
+            stream_usage: 流式请求是否显式要求返回token用量,提供商不接受该字段时为False
+
+        Returns:
+            dict: 请求体
+        """
+
+    def cache_breakpoint(self, message):
+        """在消息上标记缓存断点,断点之前的内容由提供商缓存
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            dict: 标记后的消息,不支持时原样返回
+        """
+        return message
+
+    @abstractmethod
+    def decode_event(self, event_type, data):
+        """从流式事件中提取增量文本
+
+        Args:
+            event_type: SSE事件类型
+            data: 事件JSON对象
+
+        Returns:
+            str: 增量文本,没有文本时返回None
+        """
+
+    def extract_usage(self, event_type, data):
+        """从流式事件中提取token用量
+
+        Args:
+            event_type: SSE事件类型
+            data: 事件JSON对象
+
+        Returns:
+            dict: 用量字段,没有用量时返回None。input_tokens为全部输入token数,
+                output_tokens为输出token数,提供商报告提示缓存时还有
+                cache_read_tokens(命中缓存的输入token数)和cache_write_tokens
+        """
+        return None
+
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI Chat Completions风格,DeepSeek、硅基流动等兼容服务也使用此格式"""
+
+    api_style = "openai"
+    display_name = "OpenAI兼容"
+
+    def build_body(self, model_id, system_prompt, messages, params, stream=True, cache_prompt=False,
+                   stream_usage=False):
+        """构建请求体,这类服务自动缓存相同的前缀,不需要标记
+
+        流式请求需要stream_options.include_usage,否则服务不发送包含usage的最后一个事件。
+        部分兼容服务遇到未知字段会返回400,只在stream_usage为True时发送。
+        """
+        if system_prompt:
+            messages = [{"role": "system", "content": system_prompt}] + list(messages)
+
+        body = {
+            "model": model_id,
+            "messages": messages,
+            "stream": stream,
+        }
+        if stream and stream_usage:
+            body["stream_options"] = {"include_usage": True}
+        body.update(params)
+        return body
+
+    def decode_event(self, event_type, data):
+        """提取choices[0].delta.content"""
+        choices = data.get("choices")
+        if not choices:
+            return None
+
+        delta = choices[0].get("delta")
+        if not delta:
+            return None
+
+        return delta.get("content")
+
+    def extract_usage(self, event_type, data):
+        """提取最后一个事件中的usage
+
+        OpenAI在prompt_tokens_details.cached_tokens中报告缓存命中的输入token,
+        DeepSeek使用prompt_cache_hit_tokens。
+        """
+        usage = data.get("usage")
+        if not usage:
+            return None
+
+        result = {
+            "input_tokens": usage.get("prompt_tokens", 0),
+            "output_tokens": usage.get("completion_tokens", 0),
+        }
+
+        details = usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens", usage.get("prompt_cache_hit_tokens"))
+        if cached is not None:
+            result["cache_read_tokens"] = cached
+        return result
+
+
+class AnthropicAdapter(ProviderAdapter):
+    """Anthropic Messages风格"""
+
+    api_style = "anthropic"
+    display_name = "Anthropic"
+
+    API_VERSION = b"2023-06-01"
+
+    supports_cache_control = True
+
+    # 缓存断点标记
+    CACHE_CONTROL = {"type": "ephemeral"}
+
+    def headers(self, api_key):
+        """使用x-api-key认证"""
+        return [
+            (b"x-api-key", api_key.encode()),
+            (b"anthropic-version", self.API_VERSION),
+        ]
+
+    def build_body(self, model_id, system_prompt, messages, params, stream=True, cache_prompt=False,
+                   stream_usage=False):
+        """构建请求体,系统提示作为顶层字段放在消息之前,流式事件总是包含用量"""
+        body = {"model": model_id}
+
+        if system_prompt:
+            if cache_prompt:
+                body["system"] = [{"type": "text", "text": system_prompt, "cache_control": self.CACHE_CONTROL}]
+            else:
+                body["system"] = system_prompt
+
+        body["messages"] = list(messages)
+        body["stream"] = stream
+        body.update(params)
+        return body
+
+    def cache_breakpoint(self, message):
+        """把消息内容转为文本块并在最后一块上标记cache_control"""
+        content = message.get("content")
+        if isinstance(content, list):
+            if not content:
+                return message
+            blocks = [dict(block) for block in content]
+        else:
+            blocks = [{"type": "text", "text": content or ""}]
+        blocks[-1]["cache_control"] = self.CACHE_CONTROL
+        return dict(message, content=blocks)
+
+    def decode_event(self, event_type, data):
+        """提取content_block_delta中的文本"""
+        if data.get("type", event_type) != "content_block_delta":
+            return None
+
+        delta = data.get("delta")
+        if not delta:
+            return None
+
+        return delta.get("text")
+
+    def extract_usage(self, event_type, data):
+        """message_start携带输入用量,message_delta携带输出用量"""
+        event = data.get("type", event_type)
+
+        if event == "message_start":
+            usage = (data.get("message") or {}).get("usage")
+        elif event == "message_delta":
+            usage = data.get("usage")
+        else:
+            return None
+
+        if not usage:
+            return None
+
+        result = {}
+        if "input_tokens" in usage:
+            # input_tokens不含缓存读写的部分,统一为全部输入token数
+            cache_read = usage.get("cache_read_input_tokens") or 0
+            cache_write = usage.get("cache_creation_input_tokens") or 0
+            result["input_tokens"] = usage["input_tokens"] + cache_read + cache_write
+            if "cache_read_input_tokens" in usage:
+                result["cache_read_tokens"] = cache_read
+            if "cache_creation_input_tokens" in usage:
+                result["cache_write_tokens"] = cache_write
+        if "output_tokens" in usage:
+            result["output_tokens"] = usage["output_tokens"]
+        return result or None
+
+
+# 已注册的适配器
+_adapters = {}
+
+# 未配置api_style时使用的风格
+DEFAULT_API_STYLE = "openai"
+
+
+def register_adapter(adapter):
+    """注册适配器
+
+    Args:
+        adapter: ProviderAdapter实例
+
+    Raises:
+        TypeError: adapter不是ProviderAdapter实例
+        ValueError: 适配器没有设置api_style
+    """
+    if not isinstance(adapter, ProviderAdapter):
+        raise TypeError(f"适配器必须是ProviderAdapter实例: {adapter!r}")
+    if not adapter.api_style:
+        raise ValueError(f"适配器没有设置api_style: {type(adapter).__name__}")
+    _adapters[adapter.api_style] = adapter
+
+
+def get_adapter(api_style):
+    """按API风格获取适配器
+
+    Args:
+        api_style: API风格名称
+
+    Returns:
+        ProviderAdapter: 适配器,未注册时返回默认风格的适配器
+    """
+    return _adapters.get(api_style) or _adapters[DEFAULT_API_STYLE]
+
+
+def available_adapters():
+    """获取所有已注册的适配器
+
+    Returns:
+        list: ProviderAdapter列表
+    """
+    return list(_adapters.values())
+
+
+def resolve_adapter(provider_id, provider_config):
+    """解析提供商使用的适配器
+
+    优先使用model.toml中提供商的api_style字段,未配置时提供商ID为
+    已注册的风格名(如anthropic)则使用对应风格,否则按OpenAI兼容处理。
+
+    Args:
+        provider_id: 提供商ID
+        provider_config: 提供商配置
+
+    Returns:
+        ProviderAdapter: 适配器
+    """
+    api_style = (provider_config or {}).get("api_style")
+    if not api_style and provider_id in _adapters:
+        api_style = provider_id
+    return get_adapter(api_style)
+
+
+register_adapter(OpenAIAdapter())
+register_adapter(AnthropicAdapter())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import hashlib
+import re
+import time
+
+
+# OpenAI兼容接口: x-ratelimit-{limit,remaining,reset}-{requests,tokens,...}
+_OPENAI_HEADER = re.compile(r"^x-ratelimit-(limit|remaining|reset)-([a-z-]+)$")
+
+# Anthropic: anthropic-ratelimit-{requests,tokens,input-tokens,output-tokens}-{limit,remaining,reset}
+_ANTHROPIC_HEADER = re.compile(r"^anthropic-ratelimit-([a-z-]+?)-(limit|remaining|reset)$")
+
+# 时长格式,如"1s"、"6m0s"、"20ms"、"1h2m3.5s"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def rate_limit_key(api_url, api_key):
+    """计算速率限制的统计键,同一主机上相同密钥的提供商共享额度
+
+    Args:
+        api_url: API URL
+        api_key: API密钥
+
+    Returns:
+        str: 主机名#密钥摘要,不包含密钥本身
+    """
+    host = re.sub(r"^[a-z]+://", "", api_url or "").split("/", 1)[0]
+    digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+    return f"{host}#{digest}"
+
+
+def request_cost(input_tokens, output_tokens):
+    """计算一个请求在各额度上的消耗
+
+    Args:
+        input_tokens: 估算的输入token数
+        output_tokens: 请求的最大输出token数
+
+    Returns:
+        dict: 额度名 -> 消耗
+    """
+    return {
+        "requests": 1,
+        "tokens": input_tokens + output_tokens,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+    }
+
+
+def parse_reset(value, now=None):
+    """解析额度重置时间
+
+    Args:
+        value: 秒数、"1m30s"形式的时长或RFC 3339时间
+        now: 当前的time.time(),用于换算绝对时间
+
+    Returns:
+        float: 距离重置的秒数,无法解析时返回None
+    """
+    value = value.strip()
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+    try:
+        moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, moment.timestamp() - (time.time() if now is None else now))
+
+
+def parse_headers(headers):
+    """从响应头中提取速率限制
+
+    Args:
+        headers: 小写头名 -> 值
+
+    Returns:
+        dict: 额度名 -> {"limit", "remaining", "reset"},reset为距离重置的秒数
+    """
+    now = time.time()
+    buckets = {}
+    for name, value in headers.items():
+        match = _OPENAI_HEADER.match(name)
+        if match:
+            field, bucket = match.groups()
+        else:
+            match = _ANTHROPIC_HEADER.match(name)
+            if not match:
+                continue
+            bucket, field = match.groups()
+
+        if field == "reset":
+            parsed = parse_reset(value, now)
+        else:
+            try:
+                parsed = int(float(value))
+            except ValueError:
+                parsed = None
+        if parsed is not None:
+            buckets.setdefault(bucket.replace("-", "_"), {})[field] = parsed
+    return buckets
+
+
+class _Bucket:
+    """一项额度的最近状态"""
+
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+
+    def refresh(self, now):
+        """重置时间已过时按上限恢复额度"""
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = None
+
+
+class _KeyState:
+    """一个API密钥的全部额度"""
+
+    __slots__ = ("buckets", "reserved", "blocked_until", "providers", "updated_at", "paced")
+
+    def __init__(self):
+        self.buckets = {}  # 额度名 -> _Bucket
+        self.reserved = {}  # 额度名 -> 已发送但响应头尚未反映的消耗
+        self.blocked_until = None
+        self.providers = set()
+        self.updated_at = None
+        self.paced = 0
+
+
+class RateLimitTracker:
+    """按API密钥跟踪提供商响应头报告的速率限制额度
+
+    请求发出时预留估算的消耗,响应头到达后以服务器报告的剩余额度为准。
+    调度器在发送前查询所需等待的时间,额度不足的请求推迟到重置之后,
+    其他密钥的请求可以先发送。
+    """
+
+    # 429响应没有给出等待时间、或额度不足但重置时间未知时的等待(秒)
+    DEFAULT_BLOCK = 1.0
+
+    def __init__(self):
+        """初始化跟踪器"""
+        self._states = {}  # 统计键 -> _KeyState
+        self._reservations = {}  # 请求 -> (统计键, 消耗)
+
+    def update(self, key, headers, status=None, provider_id=None):
+        """根据响应头更新额度
+
+        Args:
+            key: 统计键
+            headers: 小写头名 -> 值
+            status: HTTP状态码
+            provider_id: 提供商ID,用于显示
+
+        Returns:
+            bool: 响应头包含速率限制信息时返回True
+        """
+        buckets = parse_headers(headers)
+        retry_after = parse_reset(headers["retry-after"]) if "retry-after" in headers else None
+        if not buckets and status != 429:
+            return False
+
+        now = time.monotonic()
+        state = self._state(key)
+        if provider_id:
+            state.providers.add(provider_id)
+        state.updated_at = now
+
+        for name, values in buckets.items():
+            bucket = state.buckets.get(name)
+            if bucket is None:
+                bucket = state.buckets[name] = _Bucket()
+            bucket.refresh(now)
+            if "limit" in values:
+                bucket.limit = values["limit"]
+            if "remaining" in values:
+                if bucket.reset_at is not None and bucket.remaining is not None:
+                    # 并发请求的响应头可能乱序到达,重置前额度只会减少
+                    bucket.remaining = min(bucket.remaining, values["remaining"])
+                else:
+                    bucket.remaining = values["remaining"]
+            if "reset" in values:
+                bucket.reset_at = now + values["reset"]
+
+        if status == 429:
+            # 服务器已拒绝,暂停到建议的时间
+            if retry_after is None:
+                resets = [bucket.reset_at - now for bucket in state.buckets.values()
+                          if bucket.reset_at is not None and bucket.remaining == 0]
+                retry_after = max(resets) if resets else self.DEFAULT_BLOCK
+            state.blocked_until = now + retry_after
+        return True
+
+    def delay(self, key, cost):
+        """计算请求需要等待多久才不会超出额度
+
+        Args:
+            key: 统计键,为None时不限制
+            cost: 各额度上的消耗
+
+        Returns:
+            int: 需要等待的毫秒数,0表示可以立即发送
+        """
+        state = self._states.get(key) if key is not None else None
+        if state is None:
+            return 0
+
+        now = time.monotonic()
+        wait = 0.0
+        if state.blocked_until is not None:
+            if now < state.blocked_until:
+                wait = state.blocked_until - now
+            else:
+                state.blocked_until = None
+
+        for name, bucket in state.buckets.items():
+            bucket.refresh(now)
+            needed = cost.get(name, 0)
+            if not needed or bucket.remaining is None:
+                continue
+
+            reserved = state.reserved.get(name, 0)
+            if bucket.limit is not None and needed > bucket.limit:
+                # 超过整个额度的请求只能在额度全满时发送
+                needed = bucket.limit
+            if bucket.remaining - reserved >= needed:
+                continue
+
+            if bucket.reset_at is not None:
+                wait = max(wait, bucket.reset_at - now)
+            elif reserved:
+                # 重置时间未知,等进行中请求的响应头更新额度
+                wait = max(wait, self.DEFAULT_BLOCK)
+
+        return int(wait * 1000 + 0.5) if wait > 0 else 0
+
+    def reserve(self, request, key, cost):
+        """请求发出时预留消耗
+
+        Args:
+            request: 请求对象,释放时使用
+            key: 统计键,为None时不记录
+            cost: 各额度上的消耗
+        """
+        if key is None:
+            return
+
+        self.release(request)
+        state = self._state(key)
+        for name, amount in cost.items():
+            if amount:
+                state.reserved[name] = state.reserved.get(name, 0) + amount
+        self._reservations[request] = (key, cost)
+
+    def release(self, request):
+        """释放请求的预留,响应头已到达或请求结束时调用,多次调用只生效一次
+
+        Args:
+            request: 请求对象
+        """
+        entry = self._reservations.pop(request, None)
+        if entry is None:
+            return
+
+        key, cost = entry
+        reserved = self._states[key].reserved
+        for name, amount in cost.items():
+            value = reserved.get(name, 0) - amount
+            if value > 0:
+                reserved[name] = value
+            else:
+                reserved.pop(name, None)
+
+    def mark_paced(self, key):
+        """记录一次因额度不足推迟的发送"""
+        state = self._states.get(key)
+        if state is not None:
+            state.paced += 1
+
+    def snapshot(self):
+        """获取各密钥的额度状态
+
+        Returns:
+            dict: 统计键 -> {"providers", "buckets", "blocked_ms", "paced"},
+                buckets为额度名 -> {"limit", "remaining", "reserved", "reset_ms"}
+        """
+        now = time.monotonic()
+        result = {}
+        for key, state in self._states.items():
+            buckets = {}
+            for name, bucket in state.buckets.items():
+                bucket.refresh(now)
+                buckets[name] = {
+                    "limit": bucket.limit,
+                    "remaining": bucket.remaining,
+                    "reserved": state.reserved.get(name, 0),
+                    "reset_ms": None if bucket.reset_at is None else max(0, int((bucket.reset_at - now) * 1000)),
+                }
+
+            blocked = state.blocked_until
+            result[key] = {
+                "providers": sorted(state.providers),
+                "buckets": buckets,
+                "blocked_ms": int((blocked - now) * 1000) if blocked is not None and blocked > now else 0,
+                "paced": state.paced,
+            }
+        return result
+
+    def reset(self):
+        """清空额度状态,进行中的预留保留到请求结束"""
+        for state in self._states.values():
+            state.buckets.clear()
+            state.blocked_until = None
+            state.paced = 0
+
+    def _state(self, key):
+        """获取或创建密钥状态"""
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState()
+        return state
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+
+# 在请求体中占据历史消息位置的标记消息
+_HISTORY_MARKER = {"role": "__history__", "content": ""}
+_HISTORY_MARKER_JSON = json.dumps(_HISTORY_MARKER)
+
+
+class _EncodedHistory:
+    """一个会话已编码的历史消息片段"""
+
+    __slots__ = ("start", "count", "first", "last", "fragment")
+
+    def __init__(self, start, count, first, last, fragment):
+        self.start = start
+        self.count = count
+        self.first = first
+        self.last = last
+        self.fragment = fragment
+
+
+class RequestBodyEncoder:
+    """增量请求体编码器
+
+    每条已提交消息的JSON只编码一次并缓存在消息上,每个会话再缓存已发送
+    历史拼接好的JSON片段。下一轮请求只需编码新增的消息和少量请求参数,
+    然后与缓存片段拼接成完整请求体。
+    """
+
+    def __init__(self):
+        """初始化编码器"""
+        self._cache = {}  # 会话ID -> _EncodedHistory
+
+    def encode(self, session_id, adapter, model_id, system_prompt, history, start, message, params,
+               cache_prompt=False, stream_usage=False):
+        """编码请求体
+
+        cache_prompt为True且适配器支持缓存断点时,在系统提示和最后一条历史消息上
+        标记断点,下一轮请求可以读取本轮写入的缓存。
+
+        Args:
+            session_id: 会话ID
+            adapter: ProviderAdapter
+            model_id: 模型ID
+            system_prompt: 系统提示
+            history: 已提交的历史消息序列
+            start: 要发送的第一条历史消息下标
+            message: 当前用户消息
+            params: 采样参数
+            cache_prompt: 是否标记提示缓存断点
+            stream_usage: 是否要求流式响应返回token用量
+
+        Returns:
+            bytes: UTF-8编码的请求体
+        """
+        cache_prompt = cache_prompt and adapter.supports_cache_control
+        fragment = self._history_fragment(session_id, history, start)
+
+        # 用标记消息占位,由适配器决定系统提示和消息的位置
+        messages = [_HISTORY_MARKER, {"role": "user", "content": message}]
+        body = json.dumps(adapter.build_body(model_id, system_prompt, messages, params, cache_prompt=cache_prompt,
+                                             stream_usage=stream_usage))
+
+        head, marker, tail = body.partition(_HISTORY_MARKER_JSON)
+        if not marker:
+            # 适配器改写了消息,退回完整编码
+            full = [entry.to_dict() for entry in history[start:]]
+            if cache_prompt and full:
+                full[-1] = adapter.cache_breakpoint(full[-1])
+            full.append({"role": "user", "content": message})
+            return json.dumps(adapter.build_body(model_id, system_prompt, full, params,
+                                                 cache_prompt=cache_prompt,
+                                                 stream_usage=stream_usage)).encode()
+
+        if cache_prompt and fragment:
+            # 只重新编码带断点的最后一条,其余部分仍使用缓存片段
+            last = history[-1]
+            plain = _encode_message(last)
+            marked = json.dumps(adapter.cache_breakpoint(last.to_dict())).encode()
+            fragment = fragment[:len(fragment) - len(plain)] + marked
+
+        if not fragment:
+            # 没有历史时去掉标记及其后的分隔符
+            return (head + tail[2:]).encode()
+
+        return b"".join((head.encode(), fragment, tail.encode()))
+
+    def invalidate(self, session_id):
+        """清除会话的编码缓存
+
+        Args:
+            session_id: 会话ID
+        """
+        self._cache.pop(session_id, None)
+
+    def _history_fragment(self, session_id, history, start):
+        """获取history[start:]的JSON片段,尽量复用缓存
+
+        Returns:
+            bytes: 以", "分隔的消息JSON,没有历史时为空
+        """
+        count = len(history)
+        if start >= count:
+            return b""
+
+        cached = self._cache.get(session_id)
+        if (cached is not None
+                and cached.start == start
+                and cached.count <= count
+                and history[start] is cached.first
+                and history[cached.count - 1] is cached.last):
+            if cached.count == count:
+                return cached.fragment
+            tail = b", ".join(_encode_message(entry) for entry in history[cached.count:count])
+            fragment = cached.fragment + b", " + tail
+        else:
+            fragment = b", ".join(_encode_message(entry) for entry in history[start:count])
+
+        self._cache[session_id] = _EncodedHistory(start, count, history[start], history[count - 1], fragment)
+        return fragment
+
+
+def _encode_message(message):
+    """编码单条消息,结果缓存在消息上
+
+    Args:
+        message: ChatMessage对象
+
+    Returns:
+        bytes: 消息的JSON
+    """
+    encoded = message.encoded
+    if encoded is None:
+        encoded = message.encoded = json.dumps(message.to_dict()).encode()
+    return encoded
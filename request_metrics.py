@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+
+class RingHistogram:
+    """固定容量的环形样本缓冲,只保留最近的样本用于计算分位数"""
+
+    __slots__ = ("_samples", "_capacity", "_next", "total_count")
+
+    def __init__(self, capacity=256):
+        """初始化缓冲
+
+        Args:
+            capacity: 保留的样本数
+        """
+        self._samples = []
+        self._capacity = capacity
+        self._next = 0
+
+        # 累计记录过的样本数,包括已被覆盖的
+        self.total_count = 0
+
+    def add(self, value):
+        """记录一个样本
+
+        Args:
+            value: 样本值
+        """
+        if len(self._samples) < self._capacity:
+            self._samples.append(value)
+        else:
+            self._samples[self._next] = value
+            self._next = (self._next + 1) % self._capacity
+        self.total_count += 1
+
+    def percentile(self, quantile):
+        """获取分位数
+
+        Args:
+            quantile: 分位(0~1)
+
+        Returns:
+            float: 分位数,没有样本时返回None
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+    def summary(self):
+        """汇总缓冲中的样本
+
+        Returns:
+            dict: count、mean、p50、p90、p99、max,没有样本时返回None
+        """
+        count = len(self._samples)
+        if not count:
+            return None
+
+        ordered = sorted(self._samples)
+        return {
+            "count": self.total_count,
+            "mean": round(sum(ordered) / count, 2),
+            "p50": ordered[min(count - 1, int(count * 0.5))],
+            "p90": ordered[min(count - 1, int(count * 0.9))],
+            "p99": ordered[min(count - 1, int(count * 0.99))],
+            "max": ordered[-1],
+        }
+
+
+class RequestRecord:
+    """一个进行中请求的计量数据,时间单位毫秒
+
+    从调度器分配名额开始计时,重试和对冲都计入同一个记录,
+    首字节时间因此包含重试等待,与用户实际感受到的一致。
+    """
+
+    __slots__ = ("provider_id", "model_id", "started", "queue_wait_ms", "connect_ms", "ttfb_ms",
+                 "last_data", "gaps", "process_ms", "bytes_received", "output_chars",
+                 "output_tokens", "input_tokens", "cache_read_tokens", "error")
+
+    def __init__(self, provider_id, model_id, queue_wait_ms):
+        """开始计量
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+            queue_wait_ms: 在调度器中排队的时间
+        """
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.started = time.perf_counter()
+        self.queue_wait_ms = queue_wait_ms
+        self.connect_ms = None
+        self.ttfb_ms = None
+        self.last_data = None
+        self.gaps = []
+        self.process_ms = []
+        self.bytes_received = 0
+        self.output_chars = 0
+        self.output_tokens = None
+        self.input_tokens = None
+        self.cache_read_tokens = None
+        self.error = False
+
+    def data_received(self, size):
+        """收到一块响应数据
+
+        Args:
+            size: 字节数
+        """
+        now = time.perf_counter()
+        if self.last_data is None:
+            self.ttfb_ms = (now - self.started) * 1000
+        else:
+            self.gaps.append(round((now - self.last_data) * 1000, 2))
+        self.last_data = now
+        self.bytes_received += size
+
+    def data_processed(self, started):
+        """一块数据的解析和分发完成
+
+        Args:
+            started: 开始处理时的time.perf_counter()
+        """
+        self.process_ms.append(round((time.perf_counter() - started) * 1000, 3))
+
+    def elapsed_ms(self):
+        """从发出请求到现在的毫秒数"""
+        return (time.perf_counter() - self.started) * 1000
+
+
+class _MetricGroup:
+    """一个提供商/模型的直方图"""
+
+    # 直方图名称及含义
+    HISTOGRAMS = (
+        "queue_wait_ms",  # 调度器排队时间
+        "connect_ms",  # 新建连接的握手时间,复用连接为0
+        "ttfb_ms",  # 首字节时间
+        "ttfb_cache_hit_ms",  # 命中提供商提示缓存的请求的首字节时间
+        "chunk_gap_ms",  # 相邻数据块的间隔
+        "process_ms",  # 界面线程解析和分发一块数据的耗时
+        "duration_ms",  # 总耗时
+        "chars_per_s",  # 输出字符速率
+        "tokens_per_s",  # 输出token速率,提供商报告用量时才有
+        "bytes_received",  # 响应字节数
+    )
+
+    __slots__ = ("histograms", "requests", "errors", "input_tokens", "cache_read_tokens")
+
+    def __init__(self, capacity):
+        self.histograms = {name: RingHistogram(capacity) for name in self.HISTOGRAMS}
+        self.requests = 0
+        self.errors = 0
+
+        # 报告了提示缓存用量的请求的输入token数及其中命中缓存的部分
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+
+
+class RequestMetrics:
+    """按提供商和模型汇总的请求延迟和吞吐量"""
+
+    # 每个直方图保留的样本数
+    DEFAULT_CAPACITY = 256
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """初始化统计
+
+        Args:
+            capacity: 每个直方图保留的样本数
+        """
+        self._capacity = capacity
+        self._groups = {}  # (提供商ID, 模型ID) -> _MetricGroup
+
+    def record(self, record):
+        """记录一个已结束的请求
+
+        Args:
+            record: RequestRecord
+
+        Returns:
+            dict: 本次请求的计量结果
+        """
+        key = (record.provider_id, record.model_id)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _MetricGroup(self._capacity)
+
+        duration_ms = record.elapsed_ms()
+        ttfb_ms = record.ttfb_ms
+        output_tokens = record.output_tokens
+
+        # 吞吐量按首字节之后的生成时间计算
+        generation_s = (duration_ms - (ttfb_ms or 0)) / 1000
+        chars_per_s = record.output_chars / generation_s if generation_s > 0 and record.output_chars else None
+        tokens_per_s = output_tokens / generation_s if generation_s > 0 and output_tokens else None
+
+        result = {
+            "provider_id": record.provider_id,
+            "model_id": record.model_id,
+            "queue_wait_ms": round(record.queue_wait_ms, 1),
+            "connect_ms": record.connect_ms,
+            "ttfb_ms": round(ttfb_ms, 1) if ttfb_ms is not None else None,
+            "duration_ms": round(duration_ms, 1),
+            "chars_per_s": round(chars_per_s, 1) if chars_per_s is not None else None,
+            "tokens_per_s": round(tokens_per_s, 1) if tokens_per_s is not None else None,
+            "bytes_received": record.bytes_received,
+            "output_chars": record.output_chars,
+            "output_tokens": output_tokens,
+            "input_tokens": record.input_tokens,
+            "cache_read_tokens": record.cache_read_tokens,
+            "chunks": len(record.gaps) + (1 if record.last_data is not None else 0),
+            "error": record.error,
+        }
+
+        group.requests += 1
+        if record.error:
+            group.errors += 1
+
+        histograms = group.histograms
+        for name in ("queue_wait_ms", "connect_ms", "ttfb_ms", "duration_ms",
+                     "chars_per_s", "tokens_per_s", "bytes_received"):
+            if result[name] is not None:
+                histograms[name].add(result[name])
+        if record.cache_read_tokens is not None and record.input_tokens:
+            group.input_tokens += record.input_tokens
+            group.cache_read_tokens += record.cache_read_tokens
+            if record.cache_read_tokens and result["ttfb_ms"] is not None:
+                histograms["ttfb_cache_hit_ms"].add(result["ttfb_ms"])
+        for gap in record.gaps:
+            histograms["chunk_gap_ms"].add(gap)
+        for process in record.process_ms:
+            histograms["process_ms"].add(process)
+
+        return result
+
+    def summary(self, provider_id=None, model_id=None):
+        """获取汇总
+
+        Args:
+            provider_id: 只汇总该提供商,为None时汇总全部
+            model_id: 只汇总该模型,为None时汇总全部
+
+        Returns:
+            dict: "提供商ID/模型ID" -> {"requests", "errors", "cache_hit_rate"(命中提示缓存的
+                输入token比例,提供商未报告时为None), 各直方图的summary()}
+        """
+        result = {}
+        for (pid, mid), group in self._groups.items():
+            if provider_id is not None and pid != provider_id:
+                continue
+            if model_id is not None and mid != model_id:
+                continue
+
+            entry = {
+                "requests": group.requests,
+                "errors": group.errors,
+                "cache_hit_rate": (round(group.cache_read_tokens / group.input_tokens, 3)
+                                   if group.input_tokens else None),
+            }
+            for name, histogram in group.histograms.items():
+                entry[name] = histogram.summary()
+            result[f"{pid}/{mid}"] = entry
+        return result
+
+    def reset(self):
+        """清空统计"""
+        self._groups.clear()
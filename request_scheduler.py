@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import time
+
+from PySide6.QtCore import QObject, Signal, QTimer
+
+from config_manager import ConfigManager
+
+
+class ScheduledRequest:
+    """一个由RequestScheduler调度的请求"""
+
+    def __init__(self, session_id, provider_id, model_id, dispatch, priority=1, rate_key=None, rate_cost=None):
+        """初始化调度请求
+
+        Args:
+            session_id: 会话ID
+            provider_id: 提供商ID
+            model_id: 模型ID
+            dispatch: 获得执行许可时调用的函数,参数为本请求
+            priority: 优先级,数值越小越优先
+            rate_key: 速率限制的统计键,为None时不检查额度
+            rate_cost: 在各速率限制额度上的估算消耗
+        """
+        self.session_id = session_id
+        self.provider_id = provider_id
+        self.model_id = model_id
+        self.dispatch = dispatch
+        self.priority = priority
+        self.rate_key = rate_key
+        self.rate_cost = rate_cost or {}
+
+        # 调度状态
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.released = False
+        self.cancelled = False
+        self.paced = False
+
+    def queue_wait(self):
+        """获取排队等待时间(秒)"""
+        if self.started_at is None:
+            return time.monotonic() - self.enqueued_at
+        return self.started_at - self.enqueued_at
+
+
+class RequestScheduler(QObject):
+    """请求调度器,按提供商和模型限制并发并对超出的请求排队
+
+    设置了RateLimitTracker时,速率限制额度不足的请求留在队列中直到额度重置,
+    期间其他请求可以越过它先发送。
+    """
+
+    # 信号
+    queue_depth_changed = Signal(int, int)  # 排队数, 进行中数
+    provider_load_changed = Signal(str, int, int)  # 提供商ID, 排队数, 进行中数
+
+    # 优先级
+    PRIORITY_FOREGROUND = 0  # 当前可见会话
+    PRIORITY_BACKGROUND = 1  # 后台会话
+
+    DEFAULT_PROVIDER_CONCURRENCY = 4
+
+    def __init__(self, parent=None):
+        """初始化请求调度器"""
+        super().__init__(parent)
+
+        # 每个提供商/模型一个优先队列: (优先级, 序号, 请求),同优先级先进先出。
+        # 同一模型的请求受相同的并发限制,调度时只需检查各队列的队首
+        self._queues = {}  # (提供商ID, 模型ID) -> 堆
+        self._queued = 0
+        self._sequence = itertools.count()
+
+        # 进行中的请求
+        self._in_flight = set()
+        self._provider_in_flight = {}  # 提供商ID -> 进行中数
+        self._model_in_flight = {}  # (提供商ID, 模型ID) -> 进行中数
+        self._provider_queued = {}  # 提供商ID -> 排队数
+
+        # 正在执行调度,避免dispatch中同步释放导致重入;期间名额或队列变化时再调度一轮
+        self._pumping = False
+        self._repump = False
+
+        # 速率限制额度,以及额度恢复后重新调度的计时器
+        self._rate_limiter = None
+        self._wake_timer = QTimer(self)
+        self._wake_timer.setSingleShot(True)
+        self._wake_timer.timeout.connect(self._pump)
+
+        # 配置管理器
+        self._config_manager = ConfigManager.instance()
+
+    def set_rate_limiter(self, rate_limiter):
+        """设置速率限制跟踪器
+
+        Args:
+            rate_limiter: RateLimitTracker,为None时只限制并发
+        """
+        self._rate_limiter = rate_limiter
+
+    def submit(self, request):
+        """提交请求,有空闲名额时立即执行,否则排队
+
+        Args:
+            request: ScheduledRequest对象
+        """
+        key = (request.provider_id, request.model_id)
+        heapq.heappush(self._queues.setdefault(key, []), (request.priority, next(self._sequence), request))
+        self._queued += 1
+        self._adjust(self._provider_queued, request.provider_id, 1)
+        self._pump()
+        self._emit_load(request.provider_id)
+
+    def release(self, request):
+        """释放请求占用的并发名额,同一请求多次释放只生效一次
+
+        Args:
+            request: ScheduledRequest对象
+        """
+        if request.released or request not in self._in_flight:
+            return
+
+        request.released = True
+        self._in_flight.discard(request)
+        if self._rate_limiter is not None:
+            self._rate_limiter.release(request)
+        self._adjust(self._provider_in_flight, request.provider_id, -1)
+        self._adjust(self._model_in_flight, (request.provider_id, request.model_id), -1)
+
+        self._pump()
+        self._emit_load(request.provider_id)
+
+    def reschedule(self):
+        """限制条件变化后重新检查排队请求,如速率限制额度已更新"""
+        self._pump()
+
+    def cancel_session(self, session_id):
+        """移除会话中尚未执行的排队请求
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            list: 被移除的请求
+        """
+        removed = []
+        for key, queue in list(self._queues.items()):
+            kept = [entry for entry in queue if entry[2].session_id != session_id]
+            if len(kept) == len(queue):
+                continue
+
+            removed.extend(entry[2] for entry in queue if entry[2].session_id == session_id)
+            if kept:
+                heapq.heapify(kept)
+                self._queues[key] = kept
+            else:
+                del self._queues[key]
+
+        if not removed:
+            return []
+
+        self._queued -= len(removed)
+        providers = set()
+        for request in removed:
+            request.cancelled = True
+            self._adjust(self._provider_queued, request.provider_id, -1)
+            providers.add(request.provider_id)
+
+        for provider_id in providers:
+            self._emit_load(provider_id)
+
+        return removed
+
+    def set_session_priority(self, session_id, priority):
+        """调整会话中排队请求的优先级
+
+        Args:
+            session_id: 会话ID
+            priority: 新的优先级
+        """
+        for key, queue in self._queues.items():
+            changed = False
+            entries = []
+            for old_priority, sequence, request in queue:
+                if request.session_id == session_id and old_priority != priority:
+                    request.priority = priority
+                    changed = True
+                entries.append((request.priority, sequence, request))
+
+            if changed:
+                heapq.heapify(entries)
+                self._queues[key] = entries
+
+    def queued_count(self, provider_id=None):
+        """获取排队请求数"""
+        if provider_id is None:
+            return self._queued
+        return self._provider_queued.get(provider_id, 0)
+
+    def in_flight_count(self, provider_id=None):
+        """获取进行中的请求数"""
+        if provider_id is None:
+            return len(self._in_flight)
+        return self._provider_in_flight.get(provider_id, 0)
+
+    def has_pending(self):
+        """检查是否有排队或进行中的请求"""
+        return bool(self._queued or self._in_flight)
+
+    def _pump(self):
+        """按优先级执行所有可以获得名额的排队请求"""
+        if self._pumping:
+            self._repump = True
+            return
+
+        self._pumping = True
+        wake = None
+        try:
+            self._repump = True
+            while self._repump:
+                self._repump = False
+                wake = self._pump_once()
+        finally:
+            self._pumping = False
+
+        # 只因额度不足而等待的请求,在最早的额度重置后再调度
+        if wake is not None:
+            if not self._wake_timer.isActive() or self._wake_timer.remainingTime() > wake:
+                self._wake_timer.start(wake)
+
+    def _pump_once(self):
+        """按优先级依次检查各提供商/模型队列的队首,执行可以获得名额的请求
+
+        队首不能执行时,该队列在本轮中不再检查。每轮的开销与队列数和执行的
+        请求数相关,与排队请求的总数无关。
+
+        Returns:
+            int: 因额度不足等待的请求中最短的等待毫秒数,没有时为None
+        """
+        wake = None
+        heads = [(queue[0][0], queue[0][1], key) for key, queue in self._queues.items()]
+        heapq.heapify(heads)
+
+        while heads:
+            priority, sequence, key = heapq.heappop(heads)
+            queue = self._queues.get(key)
+            if not queue:
+                continue
+            if (queue[0][0], queue[0][1]) != (priority, sequence):
+                # dispatch期间队列被取消或调整过,按当前的队首重新排序
+                heapq.heappush(heads, (queue[0][0], queue[0][1], key))
+                continue
+
+            request = queue[0][2]
+            delay = self._admission_delay(request)
+            if delay is not None:
+                if delay > 0:
+                    wake = delay if wake is None else min(wake, delay)
+                continue
+
+            heapq.heappop(queue)
+            if not queue:
+                del self._queues[key]
+            self._queued -= 1
+
+            self._adjust(self._provider_queued, request.provider_id, -1)
+            self._in_flight.add(request)
+            self._adjust(self._provider_in_flight, request.provider_id, 1)
+            self._adjust(self._model_in_flight, key, 1)
+
+            request.started_at = time.monotonic()
+            if self._rate_limiter is not None:
+                self._rate_limiter.reserve(request, request.rate_key, request.rate_cost)
+            request.dispatch(request)
+
+            queue = self._queues.get(key)
+            if queue:
+                heapq.heappush(heads, (queue[0][0], queue[0][1], key))
+
+        return wake
+
+    def _admission_delay(self, request):
+        """检查请求能否立即执行
+
+        Args:
+            request: 队首的请求
+
+        Returns:
+            int: None表示可以执行;0表示并发已满;大于0为速率限制额度恢复前的等待毫秒数
+        """
+        provider_limit, model_limit = self._limits(request.provider_id, request.model_id)
+
+        if provider_limit and self._provider_in_flight.get(request.provider_id, 0) >= provider_limit:
+            return 0
+
+        key = (request.provider_id, request.model_id)
+        if model_limit and self._model_in_flight.get(key, 0) >= model_limit:
+            return 0
+
+        if self._rate_limiter is not None:
+            delay = self._rate_limiter.delay(request.rate_key, request.rate_cost)
+            if delay > 0:
+                if not request.paced:
+                    request.paced = True
+                    self._rate_limiter.mark_paced(request.rate_key)
+                return delay
+
+        return None
+
+    def _limits(self, provider_id, model_id):
+        """读取model.toml中的并发限制,0表示不限制
+
+        Returns:
+            (int, int): 提供商并发上限, 模型并发上限
+        """
+        provider = self._config_manager.get_provider(provider_id)
+        provider_limit = provider.get("max_concurrency", self.DEFAULT_PROVIDER_CONCURRENCY)
+
+        model_limit = 0
+        model = self._config_manager.get_model(provider_id, model_id)
+        if model:
+            model_limit = model.get("max_concurrency", 0)
+
+        return int(provider_limit or 0), int(model_limit or 0)
+
+    def _adjust(self, counter, key, delta):
+        """调整计数器,归零时删除键"""
+        value = counter.get(key, 0) + delta
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def _emit_load(self, provider_id):
+        """发送队列深度信号"""
+        self.provider_load_changed.emit(
+            provider_id,
+            self._provider_queued.get(provider_id, 0),
+            self._provider_in_flight.get(provider_id, 0)
+        )
+        self.queue_depth_changed.emit(self._queued, len(self._in_flight))
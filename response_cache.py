@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """规范化消息内容,统一换行并去掉首尾和行尾空白
+
+    Args:
+        text: 消息内容
+
+    Returns:
+        str: 规范化后的内容
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+class ResponseCache:
+    """磁盘响应缓存
+
+    每个条目是缓存目录下的一个JSON文件,文件修改时间记录最近使用时间,
+    总大小超过上限时按LRU淘汰。只应缓存确定性的请求(temperature为0或强制缓存)。
+    """
+
+    # 默认大小上限(字节)
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """初始化缓存,扫描已有条目
+
+        Args:
+            directory: 缓存目录
+            max_bytes: 大小上限(字节)
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+
+        # 按最近使用排序的条目,最久未用的在前
+        self._entries = OrderedDict()  # 缓存键 -> 文件大小
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def make_key(provider_id, model_id, system_prompt, messages, params):
+        """计算请求的缓存键
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+            system_prompt: 系统提示
+            messages: 消息序列,元素为ChatMessage或{"role", "content"}字典
+            params: 采样参数
+
+        Returns:
+            str: SHA-256十六进制摘要
+        """
+        normalized = []
+        for message in messages:
+            if isinstance(message, dict):
+                role, content = message.get("role", ""), message.get("content", "")
+            else:
+                role, content = message.role, message.content
+            normalized.append([role, normalize_text(content)])
+
+        payload = json.dumps(
+            [provider_id, model_id, normalize_text(system_prompt or ""), normalized, params],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """读取缓存的回复
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            dict: {"content": 回复内容, "usage": token用量},未命中时返回None
+        """
+        if key not in self._entries:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # 更新最近使用时间,重启后仍保持LRU顺序
+            os.utime(path)
+        except (OSError, ValueError):
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, content, usage=None):
+        """写入回复
+
+        Args:
+            key: 缓存键
+            content: 回复内容
+            usage: token用量
+        """
+        data = json.dumps(
+            {"content": content, "usage": usage or {}, "created": int(time.time())},
+            ensure_ascii=False
+        ).encode("utf-8")
+
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"写入响应缓存失败: {e}")
+            return
+
+        self._total_bytes -= self._entries.pop(key, 0)
+        self._entries[key] = len(data)
+        self._total_bytes += len(data)
+        self._evict()
+
+    def set_max_bytes(self, max_bytes):
+        """设置大小上限并立即淘汰超出部分
+
+        Args:
+            max_bytes: 大小上限(字节)
+        """
+        self._max_bytes = max(0, int(max_bytes))
+        self._evict()
+
+    def clear(self):
+        """删除所有条目"""
+        for key in list(self._entries):
+            self._remove(key)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """获取缓存统计
+
+        Returns:
+            dict: hits、misses、entries、bytes
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+        }
+
+    def _path(self, key):
+        """条目文件路径"""
+        return os.path.join(self._directory, key + ".json")
+
+    def _scan(self):
+        """按修改时间加载已有条目"""
+        found = []
+        for name in os.listdir(self._directory):
+            path = os.path.join(self._directory, name)
+            if name.endswith(".tmp"):
+                # 上次写入中断留下的临时文件
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name[:-5], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到不超过上限"""
+        while self._entries and self._total_bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        """删除一个条目"""
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
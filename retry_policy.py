@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+from PySide6.QtNetwork import QNetworkReply
+
+
+# 可重试的网络层错误
+TRANSIENT_NETWORK_ERRORS = frozenset((
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.ProxyTimeoutError,
+    QNetworkReply.UnknownNetworkError,
+))
+
+# 可重试的HTTP状态码
+TRANSIENT_HTTP_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+class RetryPolicy:
+    """请求重试和对冲策略
+
+    只在收到首个响应字节之前的失败才重试,已经开始输出的回复不会重复。
+    重试间隔为带全抖动的指数退避,服务器返回Retry-After时以其为准。
+    可选的对冲: 超过hedge_after毫秒仍未收到首字节时,再发送一个相同的请求,
+    使用先开始输出的那一个。
+
+    在model.toml中按提供商配置:
+        max_retries: 最大重试次数
+        retry_base_delay: 首次重试的退避上限(毫秒)
+        retry_max_delay: 退避上限(毫秒)
+        hedge_after: 对冲延迟(毫秒),0为关闭,"auto"使用近期首字节时间的p95
+        first_byte_timeout: 等待首字节的超时(毫秒),0为不限,超时按可重试错误处理
+    """
+
+    DEFAULT_MAX_RETRIES = 2
+    DEFAULT_BASE_DELAY = 500
+    DEFAULT_MAX_DELAY = 8000
+
+    # Retry-After超过此值(毫秒)时不再重试,直接报告错误
+    MAX_RETRY_AFTER = 60000
+
+    # hedge_after为auto时,样本不足使用的对冲延迟(毫秒)
+    AUTO_HEDGE_FALLBACK = 3000
+
+    # hedge_after为auto时所需的最少首字节样本数
+    AUTO_HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, hedge_after=0, first_byte_timeout=0):
+        """初始化策略
+
+        Args:
+            max_retries: 最大重试次数
+            base_delay: 首次重试的退避上限(毫秒)
+            max_delay: 退避上限(毫秒)
+            hedge_after: 对冲延迟(毫秒),0为关闭,"auto"为自适应
+            first_byte_timeout: 等待首字节的超时(毫秒),0为不限
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = max(0, int(base_delay))
+        self.max_delay = max(self.base_delay, int(max_delay))
+        self.hedge_after = hedge_after if hedge_after == "auto" else max(0, int(hedge_after or 0))
+        self.first_byte_timeout = max(0, int(first_byte_timeout or 0))
+
+    @classmethod
+    def from_config(cls, provider_config):
+        """从提供商配置创建策略
+
+        Args:
+            provider_config: 提供商配置
+
+        Returns:
+            RetryPolicy: 策略
+        """
+        config = provider_config or {}
+        try:
+            return cls(
+                config.get("max_retries", cls.DEFAULT_MAX_RETRIES),
+                config.get("retry_base_delay", cls.DEFAULT_BASE_DELAY),
+                config.get("retry_max_delay", cls.DEFAULT_MAX_DELAY),
+                config.get("hedge_after", 0),
+                config.get("first_byte_timeout", 0),
+            )
+        except (TypeError, ValueError):
+            return cls()
+
+    def should_retry(self, attempt, error=None, status=None):
+        """判断失败的请求是否应重试
+
+        Args:
+            attempt: 已重试次数
+            error: QNetworkReply.NetworkError
+            status: HTTP状态码,没有时为None
+
+        Returns:
+            bool: 是否重试
+        """
+        if attempt >= self.max_retries:
+            return False
+
+        if status:
+            return status in TRANSIENT_HTTP_STATUSES
+
+        return error in TRANSIENT_NETWORK_ERRORS
+
+    def retry_delay(self, attempt, retry_after=None):
+        """计算下次重试前的等待时间
+
+        Args:
+            attempt: 已重试次数
+            retry_after: 响应的Retry-After头内容
+
+        Returns:
+            int: 等待毫秒数,Retry-After过长时返回None表示不应重试
+        """
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return server_delay if server_delay <= self.MAX_RETRY_AFTER else None
+
+        # 全抖动: 在[0, min(上限, 基数*2^n)]中均匀取值,避免多个会话同时重试
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return int(random.uniform(0, ceiling))
+
+    def hedge_delay(self, ttfb_percentile=None):
+        """获取对冲延迟
+
+        Args:
+            ttfb_percentile: 返回近期首字节时间p95的函数,hedge_after为auto时使用
+
+        Returns:
+            int: 对冲延迟(毫秒),0表示不对冲
+        """
+        if self.hedge_after != "auto":
+            return self.hedge_after
+
+        p95 = ttfb_percentile(0.95, self.AUTO_HEDGE_MIN_SAMPLES) if ttfb_percentile else None
+        return int(p95) if p95 else self.AUTO_HEDGE_FALLBACK
+
+
+def parse_retry_after(value):
+    """解析Retry-After头
+
+    Args:
+        value: 秒数或HTTP日期,可为bytes
+
+    Returns:
+        int: 等待毫秒数,无法解析时返回None
+    """
+    if not value:
+        return None
+
+    if isinstance(value, (bytes, bytearray)):
+        value = bytes(value).decode("latin-1")
+    value = value.strip()
+
+    try:
+        return max(0, int(float(value) * 1000))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    delta = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(0, int(delta * 1000))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import html
+import re
+
+
+# 中日韩文字连续出现时没有分词边界,按相邻二字组切分
+_CJK_RUN = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+# 其他文字按单词切分,与FTS5的unicode61分词器一致
+_WORD = re.compile(r"[^\W_]+")
+
+
+def _cjk_tokens(run):
+    """把一段连续的中日韩文字切分为二字组
+
+    最后一个字单独作为一个词,使单字查询可以用前缀匹配到每个字。
+
+    Args:
+        run: 连续的中日韩文字
+
+    Returns:
+        list: 词列表
+    """
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def index_text(text):
+    """生成写入全文索引的文本
+
+    中日韩文字替换为以空格分隔的二字组,其他文字保持原样由FTS5分词。
+
+    Args:
+        text: 消息内容
+
+    Returns:
+        str: 索引文本
+    """
+    return _CJK_RUN.sub(lambda match: " " + " ".join(_cjk_tokens(match.group())) + " ", text.lower())
+
+
+def query_terms(query):
+    """从搜索输入中提取检索词
+
+    Args:
+        query: 搜索输入
+
+    Returns:
+        list: 检索词,中日韩文字为连续的一段,其他为单词
+    """
+    terms = []
+    position = 0
+    query = query.lower()
+    for match in _CJK_RUN.finditer(query):
+        terms.extend(_WORD.findall(query[position:match.start()]))
+        terms.append(match.group())
+        position = match.end()
+    terms.extend(_WORD.findall(query[position:]))
+    return terms
+
+
+def build_match_query(terms):
+    """生成FTS5的MATCH表达式,所有检索词都需出现
+
+    中日韩检索词为二字组组成的短语;单字和最后一个单词按前缀匹配,输入过程中即可搜到结果。
+
+    Args:
+        terms: query_terms()返回的检索词
+
+    Returns:
+        str: MATCH表达式,没有检索词时返回空字符串
+    """
+    phrases = []
+    for index, term in enumerate(terms):
+        if _CJK_RUN.fullmatch(term):
+            if len(term) == 1:
+                phrases.append(f'"{term}"*')
+            else:
+                bigrams = [term[i:i + 2] for i in range(len(term) - 1)]
+                phrases.append('"' + " ".join(bigrams) + '"')
+        else:
+            phrase = '"' + term.replace('"', '""') + '"'
+            phrases.append(phrase + "*" if index == len(terms) - 1 else phrase)
+    return " ".join(phrases)
+
+
+def make_snippet(content, terms, width=80):
+    """截取消息中包含检索词的片段,检索词用<b>标出
+
+    Args:
+        content: 消息内容
+        terms: 检索词
+        width: 片段的大致字符数
+
+    Returns:
+        str: HTML片段
+    """
+    text = " ".join(content.split())
+    if not terms:
+        return html.escape(text[:width])
+
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(text)
+    start = 0
+    if first is not None and first.start() > width // 3:
+        start = first.start() - width // 3
+    end = min(len(text), start + width)
+
+    parts = []
+    if start > 0:
+        parts.append("…")
+    position = start
+    for match in pattern.finditer(text, start, end):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f"<b>{html.escape(match.group())}</b>")
+        position = match.end()
+    parts.append(html.escape(text[position:end]))
+    if end < len(text):
+        parts.append("…")
+    return "".join(parts)
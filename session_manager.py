@@ -1,13 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from PySide6.QtCore import QObject, Signal, Slot, QSettings, Qt, QDateTime, QSize
+import html
+
+from PySide6.QtCore import QObject, Signal, Slot, QSettings, Qt, QDateTime, QSize, QTimer
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QListWidget, QListWidgetItem, 
                               QPushButton, QMenu, QInputDialog, QMessageBox, 
                               QDialog, QFormLayout, QComboBox, QLineEdit, QDialogButtonBox,
                               QLabel, QHBoxLayout)
 from PySide6.QtGui import QIcon
 
+from chat_database import ChatDatabase
+from model_router import ModelRouter
+
 class AddSessionDialog(QDialog):
     """添加会话对话框"""
     
@@ -33,6 +38,10 @@ class AddSessionDialog(QDialog):
         self.provider_combo.addItem("OpenAI", "openai")
         self.provider_combo.addItem("Anthropic", "anthropic")
         self.provider_combo.addItem("DeepSeek", "deepseek")
+        # model.toml中定义了模型组时,可以把会话绑定到模型组,由路由器选择成员
+        self._groups = ModelRouter().groups()
+        if self._groups:
+            self.provider_combo.addItem(self.tr("模型组"), ModelRouter.GROUP_PROVIDER)
         self.provider_combo.currentIndexChanged.connect(self._on_provider_changed)
         form_layout.addRow(self.tr("提供商:"), self.provider_combo)
         
@@ -68,13 +77,16 @@ class AddSessionDialog(QDialog):
             self.model_combo.addItems(["claude-2", "claude-instant-1", "claude-3-opus", "claude-3-sonnet"])
         elif provider_id == "deepseek":
             self.model_combo.addItems(["deepseek-chat", "deepseek-coder"])
+        elif provider_id == ModelRouter.GROUP_PROVIDER:
+            for group_id, name in self._groups.items():
+                self.model_combo.addItem(name, group_id)
     
     def get_session_info(self):
-        """获取会话信息"""
+        """获取会话信息,模型组会话的模型ID为模型组ID"""
         return {
             "name": self.name_edit.text().strip(),
             "provider_id": self.provider_combo.currentData(),
-            "model_id": self.model_combo.currentText()
+            "model_id": self.model_combo.currentData() or self.model_combo.currentText()
         }
 
 class SessionManager(QObject):
@@ -82,13 +94,23 @@ class SessionManager(QObject):
     
     # 信号
     session_added = Signal(str, str)  # 会话ID, 会话名称
+    session_removing = Signal(str)  # 会话ID,在数据库中的会话删除之前发出
     session_removed = Signal(str)  # 会话ID
     session_selected = Signal(str)  # 会话ID
+    message_selected = Signal(str, int)  # 会话ID, 消息ID,在搜索结果中选择消息时发出
     
-    def __init__(self, parent=None):
-        """初始化会话管理器"""
+    def __init__(self, parent=None, database=None):
+        """初始化会话管理器
+        
+        Args:
+            parent: 父对象
+            database: 会话数据库,为None时使用ChatDatabase.instance()
+        """
         super().__init__(parent)
         
+        # 会话数据库,启动时只读取会话元数据
+        self._database = database or ChatDatabase.instance()
+        
         # 会话列表
         self._sessions = {}  # 会话ID -> 会话信息
         self._current_session_id = None
@@ -116,6 +138,26 @@ class SessionManager(QObject):
         title_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(title_label)
         
+        # 创建搜索框,输入停顿后搜索所有会话的消息
+        self._search_edit = QLineEdit(widget)
+        self._search_edit.setObjectName("session_search")
+        self._search_edit.setPlaceholderText(self.tr("搜索消息..."))
+        self._search_edit.setClearButtonEnabled(True)
+        self._search_edit.textChanged.connect(self._on_search_text_changed)
+        layout.addWidget(self._search_edit)
+        
+        self._search_timer = QTimer(widget)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(200)
+        self._search_timer.timeout.connect(self._run_search)
+        
+        # 创建搜索结果列表,搜索时代替会话列表显示
+        self._search_results = QListWidget(widget)
+        self._search_results.setWordWrap(True)
+        self._search_results.itemClicked.connect(self._on_search_result_selected)
+        self._search_results.setVisible(False)
+        layout.addWidget(self._search_results)
+        
         # 创建会话列表
         self._session_list = QListWidget(widget)
         self._session_list.setContextMenuPolicy(Qt.CustomContextMenu)
@@ -157,19 +199,11 @@ class SessionManager(QObject):
         import uuid
         session_id = str(uuid.uuid4())
         
-        # 创建会话信息
-        session_info = {
-            "name": name,
-            "provider_id": provider_id,
-            "model_id": model_id,
-            "created_at": QDateTime.currentDateTime().toString()
-        }
+        # 写入数据库
+        self._database.add_session(session_id, name, provider_id, model_id)
         
         # 添加到会话列表
-        self._sessions[session_id] = session_info
-        
-        # 保存会话
-        self._save_sessions()
+        self._sessions[session_id] = self._database.get_session(session_id)
         
         # 发送信号
         self.session_added.emit(session_id, name)
@@ -212,8 +246,11 @@ class SessionManager(QObject):
             # 从会话列表中删除
             del self._sessions[session_id]
             
-            # 保存会话
-            self._save_sessions()
+            # 先让进行中的请求取消并写入历史,再删除会话
+            self.session_removing.emit(session_id)
+            
+            # 从数据库中删除会话及其消息
+            self._database.delete_session(session_id)
             
             # 发送信号
             self.session_removed.emit(session_id)
@@ -259,21 +296,38 @@ class SessionManager(QObject):
         return self._sessions
     
     def _load_sessions(self):
-        """加载会话"""
+        """加载会话元数据,消息在打开会话时才读取"""
+        self._import_legacy_sessions()
+        self._sessions = self._database.list_sessions()
+    
+    def _import_legacy_sessions(self):
+        """把旧版本保存在QSettings中的会话导入数据库,导入后删除旧数据"""
         settings = QSettings()
-        sessions_data = settings.value("Sessions/Data", "{}")
+        sessions_data = settings.value("Sessions/Data")
+        if not sessions_data:
+            return
         
         try:
             import json
-            self._sessions = json.loads(sessions_data)
-        except:
-            self._sessions = {}
-    
-    def _save_sessions(self):
-        """保存会话"""
-        settings = QSettings()
-        import json
-        settings.setValue("Sessions/Data", json.dumps(self._sessions))
+            sessions = json.loads(sessions_data)
+        except ValueError:
+            sessions = {}
+        
+        with self._database.transaction():
+            for session_id, session_info in sessions.items():
+                if self._database.get_session(session_id) is not None:
+                    continue
+                
+                created_at = QDateTime.fromString(session_info.get("created_at", ""))
+                self._database.add_session(
+                    session_id,
+                    session_info.get("name", session_id),
+                    session_info.get("provider_id", ""),
+                    session_info.get("model_id", ""),
+                    created_at.toSecsSinceEpoch() if created_at.isValid() else None
+                )
+        
+        settings.remove("Sessions/Data")
     
     def _update_session_list(self):
         """更新会话列表"""
@@ -284,6 +338,58 @@ class SessionManager(QObject):
             item.setData(Qt.UserRole, session_id)
             self._session_list.addItem(item)
     
+    @Slot(str)
+    def _on_search_text_changed(self, text):
+        """搜索输入变化处理,清空时立即恢复会话列表"""
+        if text.strip():
+            self._search_timer.start()
+        else:
+            self._search_timer.stop()
+            self._run_search()
+    
+    @Slot()
+    def _run_search(self):
+        """搜索所有会话的消息并显示结果"""
+        query = self._search_edit.text().strip()
+        self._search_results.clear()
+        self._search_results.setVisible(bool(query))
+        self._session_list.setVisible(not query)
+        if not query:
+            return
+        
+        results = self._database.search_messages(query)
+        if not results:
+            item = QListWidgetItem(self.tr("没有找到匹配的消息"))
+            item.setFlags(Qt.NoItemFlags)
+            self._search_results.addItem(item)
+            return
+        
+        for result in results:
+            role = self.tr("用户") if result["role"] == "user" else self.tr("AI助手")
+            time = QDateTime.fromSecsSinceEpoch(int(result["created_at"])).toString("yyyy-MM-dd HH:mm")
+            label = QLabel(
+                f"<b>{html.escape(result['session_name'])}</b> "
+                f"<span style='color:gray;'>{role} {time}</span><br>{result['snippet']}"
+            )
+            label.setWordWrap(True)
+            label.setTextFormat(Qt.RichText)
+            label.setContentsMargins(4, 4, 4, 4)
+            
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, result["session_id"])
+            item.setData(Qt.UserRole + 1, result["message_id"])
+            item.setSizeHint(label.sizeHint())
+            self._search_results.addItem(item)
+            self._search_results.setItemWidget(item, label)
+    
+    @Slot(QListWidgetItem)
+    def _on_search_result_selected(self, item):
+        """搜索结果选择处理,切换到消息所在的会话并定位到该消息"""
+        session_id = item.data(Qt.UserRole)
+        if session_id:
+            self.set_current_session(session_id)
+            self.message_selected.emit(session_id, item.data(Qt.UserRole + 1))
+    
     @Slot()
     def _on_add_session(self):
         """添加会话按钮点击处理"""
@@ -353,7 +459,7 @@ class SessionManager(QObject):
                 session_info["name"] = new_name
                 
                 # 保存会话
-                self._save_sessions()
+                self._database.rename_session(session_id, new_name)
                 
                 # 更新会话列表
                 self._update_session_list()
@@ -7,12 +7,14 @@ from PySide6.QtWidgets import (QWidget, QDialog, QVBoxLayout, QFormLayout,
                               QSpinBox, QDoubleSpinBox, QPushButton, QTabWidget,
                               QDialogButtonBox, QLabel, QHBoxLayout, QStackedWidget,
                               QListWidget, QListWidgetItem, QFrame, QScrollArea,
-                              QSplitter, QSizePolicy, QMessageBox)
-from PySide6.QtCore import Qt, Signal, Slot, QSettings, QSize
+                              QSplitter, QSizePolicy, QMessageBox, QTableWidget,
+                              QTableWidgetItem, QHeaderView, QAbstractItemView)
+from PySide6.QtCore import Qt, Signal, Slot, QSettings, QSize, QTimer, QT_TR_NOOP
 from PySide6.QtGui import QIcon, QPixmap
 
 from config_manager import ConfigManager
 from llm_service import LlmService
+from provider_adapters import available_adapters, resolve_adapter
 
 
 class SettingsDialog(QWidget):
@@ -21,8 +23,13 @@ class SettingsDialog(QWidget):
     # 信号
     settings_applied = Signal()
     
-    def __init__(self, parent=None):
-        """初始化设置对话框"""
+    def __init__(self, parent=None, llm_service=None):
+        """初始化设置对话框
+        
+        Args:
+            parent: 父窗口
+            llm_service: 用于模型连通性测试的LlmService,为None时自行创建
+        """
         super().__init__(parent)
         
         self.setWindowTitle(self.tr("设置"))
@@ -30,6 +37,20 @@ class SettingsDialog(QWidget):
         # 配置管理器
         self._config_manager = ConfigManager.instance()
         
+        # 模型连通性测试
+        self._llm_service = llm_service or LlmService(self)
+        self._llm_service.model_test_started.connect(self._on_model_test_started)
+        self._llm_service.model_test_finished.connect(self._on_model_test_finished)
+        self._llm_service.model_tests_finished.connect(self._on_model_tests_finished)
+        self._model_test_results = {}  # (提供商ID, 模型ID) -> HealthCheckResult, 测试中为None
+        
+        # 请求完成后刷新性能统计,同时完成的多个请求合并为一次刷新
+        self._metrics_refresh_timer = QTimer(self)
+        self._metrics_refresh_timer.setSingleShot(True)
+        self._metrics_refresh_timer.setInterval(500)
+        self._metrics_refresh_timer.timeout.connect(self._refresh_visible_request_metrics)
+        self._llm_service.request_metrics_recorded.connect(self._metrics_refresh_timer.start)
+        
         # 创建界面
         self._setup_ui()
         
@@ -215,6 +236,12 @@ class SettingsDialog(QWidget):
         
         left_layout.addWidget(scroll)
         
+        # 检测所有平台
+        self._test_all_button = QPushButton(self.tr("检测全部平台"))
+        self._test_all_button.setObjectName("test_all_button")
+        self._test_all_button.clicked.connect(self._on_test_all_providers)
+        left_layout.addWidget(self._test_all_button)
+        
         # 添加按钮
         add_button = QPushButton(self.tr("添加自定义平台"))
         add_button.setObjectName("add_platform_button")
@@ -400,6 +427,18 @@ class SettingsDialog(QWidget):
         
         api_layout.addRow(self.tr("API地址:"), api_url_input)
         
+        # API风格
+        api_style_combo = QComboBox()
+        for adapter in available_adapters():
+            api_style_combo.addItem(adapter.display_name, adapter.api_style)
+        current_style = resolve_adapter(provider_id, provider).api_style
+        api_style_combo.setCurrentIndex(max(0, api_style_combo.findData(current_style)))
+        api_style_combo.currentIndexChanged.connect(
+            lambda index, pid=provider_id, combo=api_style_combo: self._on_provider_field_changed(pid, "api_style", combo.itemData(index))
+        )
+        
+        api_layout.addRow(self.tr("API风格:"), api_style_combo)
+        
         layout.addWidget(api_group)
         
         # 模型列表区域
@@ -448,7 +487,7 @@ class SettingsDialog(QWidget):
             button.setIcon(QIcon(":/icons/eye_off.png"))
     
     def _on_test_api_key(self, provider_id):
-        """测试API密钥"""
+        """并发测试提供商的所有模型,结果在模型列表中逐个显示"""
         provider = self._config_manager.get_provider(provider_id)
         if not provider or not provider.get("api_key"):
             QMessageBox.warning(self, self.tr("提示"), self.tr("请先输入API密钥"))
@@ -460,121 +499,86 @@ class SettingsDialog(QWidget):
             QMessageBox.warning(self, self.tr("提示"), self.tr("该提供商没有配置模型"))
             return
         
-        # 创建模型选择对话框
-        dialog = QDialog(self)
-        dialog.setWindowTitle(self.tr("选择要测试的模型"))
-        dialog.setMinimumWidth(300)
-        
-        dialog_layout = QVBoxLayout(dialog)
-        
-        # 添加模型选择下拉框
-        model_label = QLabel(self.tr("选择模型:"))
-        dialog_layout.addWidget(model_label)
-        
-        model_combo = QComboBox()
-        for model in models:
-            model_combo.addItem(model.get("name", model.get("id", "")), model.get("id"))
-        
-        dialog_layout.addWidget(model_combo)
-        
-        # 按钮
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(dialog.accept)
-        button_box.rejected.connect(dialog.reject)
-        dialog_layout.addWidget(button_box)
+        self._llm_service.test_provider_models(provider_id)
+    
+    def _on_test_all_providers(self):
+        """并发测试所有已配置密钥的平台"""
+        if self._llm_service.is_testing_models():
+            # 测试进行中时按钮用于取消
+            self._llm_service.cancel_model_tests()
+            self._on_model_tests_finished()
+            return
         
-        # 显示对话框
-        if dialog.exec_() == QDialog.Accepted:
-            # 获取选择的模型
-            model_id = model_combo.currentData()
-            
-            # 创建测试中对话框（使用QDialog而不是QMessageBox）
-            progress_dialog = QDialog(self)
-            progress_dialog.setWindowTitle(self.tr("正在测试"))
-            progress_dialog.setMinimumWidth(300)
-            progress_dialog.setMinimumHeight(100)
-            progress_dialog.setModal(True)
-            
-            progress_layout = QVBoxLayout(progress_dialog)
-            
-            # 添加消息标签
-            message_label = QLabel(self.tr("正在测试API连接，请稍候..."))
-            message_label.setAlignment(Qt.AlignCenter)
-            progress_layout.addWidget(message_label)
-            
-            # 添加取消按钮
-            cancel_button = QPushButton(self.tr("取消"))
-            cancel_button.clicked.connect(lambda: self._cancel_api_test(progress_dialog))
-            
-            button_layout = QHBoxLayout()
-            button_layout.addStretch()
-            button_layout.addWidget(cancel_button)
-            button_layout.addStretch()
-            
-            progress_layout.addLayout(button_layout)
-            
-            # 设置对话框属性，用于标识正在测试中
-            progress_dialog.setProperty("testing", True)
-            
-            # 显示对话框
-            progress_dialog.show()
-            
-            # 创建定时器，在超时后强制关闭对话框
-            from PySide6.QtCore import QTimer
-            self._test_timeout_timer = QTimer()
-            self._test_timeout_timer.setSingleShot(True)
-            self._test_timeout_timer.timeout.connect(lambda: self._handle_test_timeout(progress_dialog))
-            self._test_timeout_timer.start(15000)  # 15秒超时
-            
-            # 使用QTimer以非阻塞方式运行测试
-            QTimer.singleShot(100, lambda: self._show_test_result(provider_id, model_id, progress_dialog))
+        if not self._llm_service.test_all_models():
+            QMessageBox.warning(self, self.tr("提示"), self.tr("没有已配置密钥和模型的平台"))
+    
+    @Slot(str, str)
+    def _on_model_test_started(self, provider_id, model_id):
+        """模型测试开始"""
+        self._model_test_results[(provider_id, model_id)] = None
+        self._update_model_status(provider_id, model_id)
+        self._test_all_button.setText(self.tr("取消检测"))
     
-    def _cancel_api_test(self, progress_dialog):
-        """取消API测试"""
-        if hasattr(self, '_test_timeout_timer') and self._test_timeout_timer.isActive():
-            self._test_timeout_timer.stop()
-        
-        if progress_dialog and progress_dialog.isVisible():
-            progress_dialog.reject()
-            progress_dialog.close()
+    @Slot(str, str, object)
+    def _on_model_test_finished(self, provider_id, model_id, result):
+        """模型测试完成"""
+        self._model_test_results[(provider_id, model_id)] = result
+        self._update_model_status(provider_id, model_id)
+        self._update_platform_status(provider_id)
     
-    def _handle_test_timeout(self, progress_dialog):
-        """处理测试超时"""
-        if progress_dialog and progress_dialog.isVisible() and progress_dialog.property("testing"):
-            progress_dialog.setProperty("testing", False)
-            progress_dialog.close()
-            QMessageBox.warning(self, self.tr("超时"), self.tr("API连接测试超时，请检查网络连接或API服务器状态"))
+    @Slot()
+    def _on_model_tests_finished(self):
+        """全部模型测试完成"""
+        self._test_all_button.setText(self.tr("检测全部平台"))
+        
+        # 已取消的测试不会返回结果,清除其测试中状态
+        for key, result in list(self._model_test_results.items()):
+            if result is None:
+                del self._model_test_results[key]
+                self._update_model_status(*key)
     
-    def _show_test_result(self, provider_id, model_id, progress_dialog):
-        """显示测试结果"""
-        # 检查进度对话框是否仍然有效
-        if progress_dialog is None or not progress_dialog.isVisible():
+    def _update_model_status(self, provider_id, model_id):
+        """更新模型列表中的测试状态"""
+        models_container = self.findChild(QWidget, f"models_container_{provider_id}")
+        if not models_container:
             return
-            
-        # 尝试关闭进度对话框
-        try:
-            progress_dialog.close()
-        except:
-            # 如果关闭失败，尝试另一种方式
-            if hasattr(progress_dialog, 'reject'):
-                progress_dialog.reject()
-        
-        # 创建LlmService实例进行测试
-        llm_service = LlmService()
-        success, message = llm_service.test_model_connection(provider_id, model_id)
-        
-        # 确保结果对话框有关闭按钮
-        if success:
-            result_dialog = QMessageBox(QMessageBox.Information, self.tr("测试结果"), 
-                                         self.tr(f"API连接测试成功\n\n{message}"), 
-                                         QMessageBox.Ok, self)
+        
+        for label in models_container.findChildren(QLabel, "model_status"):
+            if label.property("model_id") == model_id:
+                self._apply_model_status(label, provider_id, model_id)
+    
+    def _apply_model_status(self, label, provider_id, model_id):
+        """按测试结果设置状态标签"""
+        key = (provider_id, model_id)
+        if key not in self._model_test_results:
+            label.setText("")
+            label.setToolTip("")
+            return
+        
+        result = self._model_test_results[key]
+        if result is None:
+            label.setText(self.tr("测试中..."))
+            label.setToolTip("")
+        elif result.success:
+            label.setText(f"✓ {result.summary()}")
+            label.setToolTip(result.message)
         else:
-            result_dialog = QMessageBox(QMessageBox.Warning, self.tr("测试结果"), 
-                                         self.tr(f"API连接测试失败\n\n{message}"), 
-                                         QMessageBox.Ok, self)
+            label.setText(self.tr("✗ 失败"))
+            label.setToolTip(f"{result.message}\n{result.summary()}".strip())
+    
+    def _update_platform_status(self, provider_id):
+        """在平台项的提示中汇总测试结果"""
+        results = [
+            result for (pid, _), result in self._model_test_results.items()
+            if pid == provider_id and result is not None
+        ]
+        if not results:
+            return
         
-        # 显示结果对话框
-        result_dialog.exec_()
+        passed = sum(1 for result in results if result.success)
+        for item in self._platforms_container.findChildren(QPushButton, "platform_item"):
+            if item.property("provider_id") == provider_id:
+                item.setToolTip(self.tr("模型测试: {}/{} 可用").format(passed, len(results)))
     
     def _refresh_model_list(self, provider_id):
         """刷新模型列表"""
@@ -608,6 +612,13 @@ class SettingsDialog(QWidget):
         model_name.setObjectName("model_name")
         item_layout.addWidget(model_name, 1)
         
+        # 测试状态
+        model_status = QLabel()
+        model_status.setObjectName("model_status")
+        model_status.setProperty("model_id", model.get("id"))
+        self._apply_model_status(model_status, provider_id, model.get("id"))
+        item_layout.addWidget(model_status)
+        
         # 编辑按钮
         edit_button = QPushButton(self.tr("编辑"))
         edit_button.setObjectName("edit_model_button")
@@ -876,6 +887,10 @@ class SettingsDialog(QWidget):
         """菜单切换处理"""
         self._content_stack.setCurrentIndex(index)
         self._title_label.setText(self._menu_list.item(index).text())
+        
+        if self._content_stack.currentWidget() is self._data_settings_page:
+            self._update_response_cache_stats()
+            self._update_request_metrics()
     
     def _load_settings(self):
         """加载设置"""
@@ -1174,8 +1189,211 @@ class SettingsDialog(QWidget):
         label.setObjectName("settings_section_title")
         layout.addWidget(label)
         
+        # 响应缓存
+        cache_group = QGroupBox(self.tr("响应缓存"))
+        cache_layout = QFormLayout(cache_group)
+        
+        self._response_cache_check = QCheckBox()
+        self._response_cache_check.setToolTip(self.tr("temperature为0的相同请求直接使用缓存的回复"))
+        self._response_cache_check.setChecked(self._config_manager.get("cache", "response_cache", False))
+        self._response_cache_check.stateChanged.connect(self._on_response_cache_changed)
+        cache_layout.addRow(self.tr("启用响应缓存:"), self._response_cache_check)
+        
+        self._response_cache_size = QSpinBox()
+        self._response_cache_size.setRange(1, 4096)
+        self._response_cache_size.setSuffix(" MB")
+        self._response_cache_size.setValue(self._config_manager.get("cache", "response_cache_size", 64))
+        self._response_cache_size.valueChanged.connect(self._on_response_cache_changed)
+        cache_layout.addRow(self.tr("缓存大小上限:"), self._response_cache_size)
+        
+        self._similarity_cache_check = QCheckBox()
+        self._similarity_cache_check.setToolTip(self.tr("问题与历史问题近似时先显示历史回答,真实回复随后到达"))
+        self._similarity_cache_check.setChecked(self._config_manager.get("cache", "similarity_cache", False))
+        self._similarity_cache_check.stateChanged.connect(self._on_similarity_cache_changed)
+        cache_layout.addRow(self.tr("近似问题提示:"), self._similarity_cache_check)
+        
+        self._response_cache_stats = QLabel()
+        cache_layout.addRow(self.tr("缓存统计:"), self._response_cache_stats)
+        
+        clear_cache_button = QPushButton(self.tr("清空缓存"))
+        clear_cache_button.clicked.connect(self._on_clear_response_cache)
+        cache_layout.addRow("", clear_cache_button)
+        
+        layout.addWidget(cache_group)
+        self._update_response_cache_stats()
+        
+        # 请求性能
+        metrics_group = QGroupBox(self.tr("请求性能"))
+        metrics_layout = QVBoxLayout(metrics_group)
+        
+        self._request_metrics_table = QTableWidget(0, len(self._REQUEST_METRIC_COLUMNS))
+        self._request_metrics_table.setHorizontalHeaderLabels(
+            [self.tr(title) for title, _, _ in self._REQUEST_METRIC_COLUMNS]
+        )
+        self._request_metrics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._request_metrics_table.setSelectionMode(QAbstractItemView.NoSelection)
+        self._request_metrics_table.verticalHeader().setVisible(False)
+        self._request_metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self._request_metrics_table.setToolTip(self.tr("最近请求的中位数/p90,时间单位毫秒"))
+        metrics_layout.addWidget(self._request_metrics_table)
+        
+        # 提供商响应头报告的速率限制额度
+        metrics_layout.addWidget(QLabel(self.tr("速率限制额度:")))
+        self._rate_limit_table = QTableWidget(0, len(self._RATE_LIMIT_COLUMNS))
+        self._rate_limit_table.setHorizontalHeaderLabels([self.tr(title) for title in self._RATE_LIMIT_COLUMNS])
+        self._rate_limit_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self._rate_limit_table.setSelectionMode(QAbstractItemView.NoSelection)
+        self._rate_limit_table.verticalHeader().setVisible(False)
+        self._rate_limit_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self._rate_limit_table.setToolTip(self.tr("剩余/上限,括号内为已发送但尚未计入的估算消耗;额度不足的请求会排队到重置之后"))
+        metrics_layout.addWidget(self._rate_limit_table)
+        
+        metrics_buttons = QHBoxLayout()
+        metrics_buttons.addStretch()
+        refresh_metrics_button = QPushButton(self.tr("刷新"))
+        refresh_metrics_button.clicked.connect(self._update_request_metrics)
+        metrics_buttons.addWidget(refresh_metrics_button)
+        reset_metrics_button = QPushButton(self.tr("清空统计"))
+        reset_metrics_button.clicked.connect(self._on_reset_request_metrics)
+        metrics_buttons.addWidget(reset_metrics_button)
+        metrics_layout.addLayout(metrics_buttons)
+        
+        layout.addWidget(metrics_group)
+        self._update_request_metrics()
+        
+        # 添加弹性空间
+        layout.addStretch()
+        
         # 添加到内容栈
         self._content_stack.addWidget(page)
+        self._data_settings_page = page
+    
+    @Slot()
+    def _on_response_cache_changed(self):
+        """响应缓存设置变更处理"""
+        enabled = self._response_cache_check.isChecked()
+        size = self._response_cache_size.value()
+        
+        self._config_manager.set("cache", "response_cache", enabled)
+        self._config_manager.set("cache", "response_cache_size", size)
+        self._config_manager.save()
+        
+        self._llm_service.set_response_cache_enabled(enabled, size)
+        self._update_response_cache_stats()
+    
+    @Slot()
+    def _on_similarity_cache_changed(self):
+        """近似问题缓存设置变更处理"""
+        enabled = self._similarity_cache_check.isChecked()
+        self._config_manager.set("cache", "similarity_cache", enabled)
+        self._config_manager.save()
+        
+        self._llm_service.set_similarity_cache_enabled(enabled)
+    
+    @Slot()
+    def _on_clear_response_cache(self):
+        """清空响应缓存和近似问题索引"""
+        self._llm_service.clear_response_cache()
+        self._llm_service.clear_similarity_cache()
+        self._update_response_cache_stats()
+    
+    def _update_response_cache_stats(self):
+        """刷新响应缓存统计"""
+        stats = self._llm_service.response_cache_stats()
+        if not stats["enabled"]:
+            self._response_cache_stats.setText(self.tr("未启用"))
+            return
+        
+        self._response_cache_stats.setText(self.tr("{} 条, {:.1f} MB, 命中 {} 次, 未命中 {} 次").format(
+            stats["entries"], stats["bytes"] / (1024 * 1024), stats["hits"], stats["misses"]
+        ))
+    
+    # 请求性能表格的列: 标题, 指标名, 显示的分位
+    _REQUEST_METRIC_COLUMNS = (
+        (QT_TR_NOOP("模型"), None, None),
+        (QT_TR_NOOP("请求数"), "requests", None),
+        (QT_TR_NOOP("错误"), "errors", None),
+        (QT_TR_NOOP("排队"), "queue_wait_ms", ("p50", "p90")),
+        (QT_TR_NOOP("连接"), "connect_ms", ("p50", "p90")),
+        (QT_TR_NOOP("首字节"), "ttfb_ms", ("p50", "p90")),
+        (QT_TR_NOOP("块间隔"), "chunk_gap_ms", ("p50", "p99")),
+        (QT_TR_NOOP("总耗时"), "duration_ms", ("p50", "p90")),
+        (QT_TR_NOOP("字符/秒"), "chars_per_s", ("p50",)),
+        (QT_TR_NOOP("token/秒"), "tokens_per_s", ("p50",)),
+        (QT_TR_NOOP("缓存命中"), "cache_hit_rate", None),
+    )
+    
+    # 速率限制表格的列
+    _RATE_LIMIT_COLUMNS = (
+        QT_TR_NOOP("提供商"), QT_TR_NOOP("请求额度"), QT_TR_NOOP("token额度"),
+        QT_TR_NOOP("重置(ms)"), QT_TR_NOOP("推迟发送"),
+    )
+    
+    @Slot()
+    def _update_request_metrics(self):
+        """刷新请求性能表格和速率限制表格"""
+        self._update_rate_limits()
+        metrics = self._llm_service.request_metrics()
+        table = self._request_metrics_table
+        table.setRowCount(len(metrics))
+        
+        for row, (name, entry) in enumerate(sorted(metrics.items())):
+            for column, (_, metric, quantiles) in enumerate(self._REQUEST_METRIC_COLUMNS):
+                if metric is None:
+                    text = name
+                elif metric == "cache_hit_rate":
+                    text = "-" if entry[metric] is None else f"{entry[metric]:.0%}"
+                elif quantiles is None:
+                    text = str(entry[metric])
+                elif entry[metric] is None:
+                    text = "-"
+                else:
+                    text = " / ".join(f"{entry[metric][q]:.0f}" for q in quantiles)
+                table.setItem(row, column, QTableWidgetItem(text))
+    
+    @Slot()
+    def _refresh_visible_request_metrics(self):
+        """数据设置页可见时刷新请求性能,不可见时在切换到该页时刷新"""
+        if self.isVisible() and self._content_stack.currentWidget() is self._data_settings_page:
+            self._update_request_metrics()
+    
+    def _update_rate_limits(self):
+        """刷新速率限制表格"""
+        state = self._llm_service.rate_limit_state()
+        table = self._rate_limit_table
+        table.setRowCount(len(state))
+        
+        for row, (key, entry) in enumerate(sorted(state.items())):
+            buckets = entry["buckets"]
+            
+            def quota(name):
+                bucket = buckets.get(name) or buckets.get("input_" + name)
+                if not bucket or bucket["remaining"] is None:
+                    return "-"
+                text = f"{bucket['remaining']}/{bucket['limit'] if bucket['limit'] is not None else '?'}"
+                return f"{text} ({bucket['reserved']})" if bucket["reserved"] else text
+            
+            resets = [bucket["reset_ms"] for bucket in buckets.values() if bucket["reset_ms"] is not None]
+            reset_ms = max(resets + [entry["blocked_ms"]]) if resets or entry["blocked_ms"] else None
+            
+            texts = (
+                ", ".join(entry["providers"]) or key,
+                quota("requests"),
+                quota("tokens"),
+                "-" if reset_ms is None else str(reset_ms),
+                str(entry["paced"]),
+            )
+            for column, text in enumerate(texts):
+                item = QTableWidgetItem(text)
+                if column == 0:
+                    item.setToolTip(key)
+                table.setItem(row, column, item)
+    
+    @Slot()
+    def _on_reset_request_metrics(self):
+        """清空请求性能统计"""
+        self._llm_service.reset_request_metrics()
+        self._update_request_metrics()
     
     def _create_about_page(self):
         """创建关于我们页"""
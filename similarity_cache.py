@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import hashlib
+import zlib
+import random
+import heapq
+from collections import OrderedDict
+
+
+# 规范化时去掉的空白和标点(含全角标点)
+_NOISE_RE = re.compile(
+    r"[\s!-/:-@\[-`{-~\u3000-\u303f\uff00-\uff0f\uff1a-\uff20\uff3b-\uff40\uff5b-\uff65]+"
+)
+
+# 哈希取模用的梅森素数
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text, size=3):
+    """将文本切分为字符n-gram集合
+
+    去掉空白和标点并转为小写后按字符切分,对中文和英文都适用,
+    只差空格、标点或个别字词的问题会得到高度重合的集合。
+
+    Args:
+        text: 文本
+        size: n-gram长度
+
+    Returns:
+        set: 各n-gram的32位哈希
+    """
+    text = _NOISE_RE.sub("", text.lower())
+    if not text:
+        return set()
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+class _Entry:
+    """索引中的一个问题"""
+
+    __slots__ = ("scope", "prompt", "signature", "response")
+
+    def __init__(self, scope, prompt, signature, response):
+        self.scope = scope
+        self.prompt = prompt
+        self.signature = signature
+        self.response = response
+
+
+class SimilarityCache:
+    """近似重复问题缓存
+
+    每个问题计算MinHash签名,按带(band)分组写入LSH哈希表。查询时只比较
+    与新问题至少有一个带完全相同的候选,耗时与已索引问题数无关。条目数
+    有上限,超出后淘汰最久未使用的条目;索引可保存到JSON文件。
+    """
+
+    DEFAULT_NUM_PERM = 64
+    DEFAULT_BANDS = 16
+    DEFAULT_MAX_ENTRIES = 1000
+    DEFAULT_THRESHOLD = 0.8
+
+    # 超过此长度(字符)的回答不索引
+    MAX_RESPONSE_CHARS = 20000
+
+    # 签名最多使用的n-gram数,长问题只取哈希值最小的部分,计算耗时不随问题长度增长
+    MAX_SHINGLES = 256
+
+    # 签名排列参数的随机种子,改变后已保存的索引失效
+    SEED = 20240601
+
+    def __init__(self, path=None, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, threshold=DEFAULT_THRESHOLD):
+        """初始化缓存并加载已保存的索引
+
+        Args:
+            path: 索引文件路径,为None时不持久化
+            num_perm: 签名长度,必须是bands的整数倍
+            bands: LSH带数,每带num_perm // bands行
+            max_entries: 最大条目数
+            threshold: 判定为近似重复的估算Jaccard相似度
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm必须是bands的整数倍")
+
+        self._path = path
+        self._num_perm = num_perm
+        self._bands = bands
+        self._rows = num_perm // bands
+        self._max_entries = max_entries
+        self.threshold = threshold
+
+        rng = random.Random(self.SEED)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+        self._entries = OrderedDict()  # 条目ID -> _Entry,最久未用的在前
+        self._buckets = {}  # (范围, 带序号, 带内签名) -> {条目ID}
+        self._prompts = {}  # (范围, 问题) -> 条目ID,同一问题只索引一次
+        self._next_id = 0
+
+        # 有未保存的修改
+        self.dirty = False
+
+        if path:
+            self._load()
+
+    @staticmethod
+    def make_scope(provider_id, model_id, system_prompt=""):
+        """生成问题的匹配范围
+
+        只有模型和系统提示都相同时回答才可以互相借用。
+
+        Args:
+            provider_id: 提供商ID
+            model_id: 模型ID
+            system_prompt: 系统提示
+
+        Returns:
+            tuple: 范围
+        """
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        return (provider_id, model_id, digest)
+
+    def signature(self, text):
+        """计算文本的MinHash签名
+
+        n-gram多于MAX_SHINGLES时只取哈希值最小的MAX_SHINGLES个。两个问题的
+        样本按同一规则选出,估算的相似度与使用全部n-gram时接近。
+
+        Args:
+            text: 文本
+
+        Returns:
+            tuple: num_perm个最小哈希值,空文本返回None
+        """
+        hashes = shingles(text)
+        if not hashes:
+            return None
+        if len(hashes) > self.MAX_SHINGLES:
+            hashes = heapq.nsmallest(self.MAX_SHINGLES, hashes)
+        return tuple(
+            min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH
+            for a, b in self._perms
+        )
+
+    def lookup(self, scope, prompt):
+        """查找近似重复的问题
+
+        Args:
+            scope: make_scope()生成的范围,不同范围互不匹配
+            prompt: 问题文本
+
+        Returns:
+            (str, float): 缓存的回答和估算相似度,没有超过阈值的条目时返回None
+        """
+        signature = self.signature(prompt)
+        if signature is None:
+            return None
+
+        scope = list(scope)
+        candidates = set()
+        for key in self._band_keys(scope, signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            matches = sum(1 for x, y in zip(signature, entry.signature) if x == y)
+            score = matches / self._num_perm
+            if score > best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None or best_score < self.threshold:
+            return None
+
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id].response, best_score
+
+    def add(self, scope, prompt, response):
+        """索引一个问题及其回答
+
+        同一范围内已索引过的问题不重复添加,只更新其使用顺序。
+
+        Args:
+            scope: 范围
+            prompt: 问题文本
+            response: 回答
+        """
+        if not response or len(response) > self.MAX_RESPONSE_CHARS:
+            return
+
+        existing = self._prompts.get((tuple(scope), prompt))
+        if existing is not None:
+            self._entries.move_to_end(existing)
+            return
+
+        signature = self.signature(prompt)
+        if signature is None:
+            return
+
+        self._insert(_Entry(list(scope), prompt, signature, response))
+
+        while len(self._entries) > self._max_entries:
+            self._remove(next(iter(self._entries)))
+
+        self.dirty = True
+
+    def clear(self):
+        """删除所有条目"""
+        self._entries.clear()
+        self._buckets.clear()
+        self._prompts.clear()
+        self.dirty = True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        """将索引保存到文件"""
+        if not self._path or not self.dirty:
+            return
+
+        data = {
+            "num_perm": self._num_perm,
+            "bands": self._bands,
+            "seed": self.SEED,
+            "max_shingles": self.MAX_SHINGLES,
+            "entries": [
+                [entry.scope, entry.prompt, list(entry.signature), entry.response]
+                for entry in self._entries.values()
+            ],
+        }
+
+        temp_path = self._path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self._path)
+            self.dirty = False
+        except OSError as e:
+            print(f"保存相似问题索引失败: {e}")
+
+    def _load(self):
+        """加载已保存的索引,参数不一致时丢弃"""
+        if not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载相似问题索引失败: {e}")
+            return
+
+        if (data.get("num_perm") != self._num_perm
+                or data.get("bands") != self._bands
+                or data.get("seed") != self.SEED
+                or data.get("max_shingles") != self.MAX_SHINGLES):
+            return
+
+        for scope, prompt, signature, response in data.get("entries", [])[-self._max_entries:]:
+            existing = self._prompts.get((tuple(scope), prompt))
+            if existing is not None:
+                self._remove(existing)
+            self._insert(_Entry(scope, prompt, tuple(signature), response))
+        self.dirty = False
+
+    def _insert(self, entry):
+        """添加一个条目及其哈希表项"""
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._entries[entry_id] = entry
+        self._prompts[(tuple(entry.scope), entry.prompt)] = entry_id
+        for key in self._band_keys(entry.scope, entry.signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+    def _band_keys(self, scope, signature):
+        """生成签名各带的哈希表键"""
+        scope_key = tuple(scope)
+        rows = self._rows
+        return [
+            (scope_key, band, signature[band * rows:(band + 1) * rows])
+            for band in range(self._bands)
+        ]
+
+    def _remove(self, entry_id):
+        """删除一个条目及其哈希表项"""
+        entry = self._entries.pop(entry_id)
+        self._prompts.pop((tuple(entry.scope), entry.prompt), None)
+        for key in self._band_keys(entry.scope, entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+        self.dirty = True
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import codecs
+from operator import itemgetter
+
+
+_new_tuple = tuple.__new__
+
+
+class SseEvent(tuple):
+    """一个完整的SSE事件
+
+    元组子类,解析时直接用tuple.__new__创建,每个事件不必调用Python层的构造函数。
+    """
+
+    __slots__ = ()
+
+    event = property(itemgetter(0), doc="事件类型,未指定时为\"message\"")
+    data = property(itemgetter(1), doc="事件数据,多行data字段以换行符连接")
+    id = property(itemgetter(2), doc="事件ID,可选")
+
+    def __new__(cls, event, data, event_id=None):
+        """创建SSE事件
+
+        Args:
+            event: 事件类型,未指定时为"message"
+            data: 事件数据,多行data字段以换行符连接
+            event_id: 事件ID,可选
+        """
+        return _new_tuple(cls, (event, data, event_id))
+
+    def __repr__(self):
+        return f"SseEvent(event={self.event!r}, data={self.data!r})"
+
+
+class SseParser:
+    """增量式SSE流解析器
+
+    每个QNetworkReply使用一个独立的解析器实例。收到的字节只经过一次
+    增量UTF-8解码,每次feed只在新数据中查找行结束符;不完整的最后一行
+    按片段保留,直到所在行结束时才拼接一次。跨数据包截断的多字节字符
+    和CRLF同样可以正确处理。
+    """
+
+    def __init__(self):
+        """初始化解析器"""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        # 尚未遇到行结束符的剩余文本片段(不含换行符)
+        self._pending = []
+
+        # 上一个数据包以CR结尾,需要跳过下一个数据包开头的LF
+        self._skip_lf = False
+
+        # 当前事件的字段
+        self._event_type = ""
+        self._data_lines = []
+        self._last_event_id = None
+
+        # 已接收字节数
+        self.bytes_received = 0
+
+    def feed(self, data):
+        """输入一段原始字节数据
+
+        Args:
+            data: bytes、bytearray或QByteArray
+
+        Returns:
+            list: 本次数据中解析出的完整SseEvent列表
+        """
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+
+        self.bytes_received += len(data)
+
+        text = self._decoder.decode(data)
+        if not text:
+            return []
+
+        if self._skip_lf:
+            self._skip_lf = False
+            if text[0] == "\n":
+                text = text[1:]
+
+        # 新数据中没有行结束符时只保存片段,不扫描之前的半行
+        end = max(text.rfind("\n"), text.rfind("\r")) + 1
+        if not end:
+            self._pending.append(text)
+            return []
+
+        if self._pending:
+            self._pending.append(text[:end])
+            lines = "".join(self._pending)
+        else:
+            lines = text[:end]
+        self._pending = [text[end:]] if end < len(text) else []
+
+        return self._consume(lines)
+
+    def finish(self):
+        """流结束时调用,分发缓冲区中剩余的事件
+
+        Returns:
+            list: 剩余的SseEvent列表
+        """
+        events = []
+
+        self._pending.append(self._decoder.decode(b"", final=True))
+        text = "".join(self._pending)
+        self._pending = []
+
+        if text:
+            events.extend(self._consume(text + "\n"))
+
+        # 没有以空行结束的最后一个事件
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+
+        return events
+
+    def reset(self):
+        """丢弃所有缓冲数据"""
+        self._decoder.reset()
+        self._pending = []
+        self._skip_lf = False
+        self._event_type = ""
+        self._data_lines = []
+        self._last_event_id = None
+
+    def _consume(self, text):
+        """切分完整行并处理
+
+        Args:
+            text: 以行结束符结尾的文本,以上次剩余的半行开头
+
+        Returns:
+            list: 解析出的SseEvent列表
+        """
+        if "\r" in text:
+            # 文本末尾的CR可能是被截断的CRLF
+            if text[-1] == "\r":
+                self._skip_lf = True
+            crlf = text.count("\r\n")
+            if crlf == text.count("\r") == text.count("\n"):
+                # 全部是CRLF时直接切分,不必生成替换后的副本
+                lines = text.split("\r\n")
+            else:
+                lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        else:
+            lines = text.split("\n")
+
+        # 以行结束符结尾,最后一段为空
+        lines.pop()
+
+        events = []
+        data_lines = self._data_lines
+        for line in lines:
+            # 最常见的单行data事件走快速路径
+            if line[:6] == "data: ":
+                data_lines.append(line[6:])
+            elif line:
+                self._process_line(line)
+            elif data_lines:
+                data = data_lines[0] if len(data_lines) == 1 else "\n".join(data_lines)
+                events.append(_new_tuple(SseEvent, (self._event_type or "message", data, self._last_event_id)))
+                self._event_type = ""
+                data_lines = self._data_lines = []
+            else:
+                self._event_type = ""
+
+        return events
+
+    def _process_line(self, line):
+        """按SSE规范处理一行
+
+        Args:
+            line: 不含行结束符的非空行
+        """
+        # 注释行
+        if line[0] == ":":
+            return
+
+        colon = line.find(":")
+        if colon == -1:
+            field = line
+            value = ""
+        else:
+            field = line[:colon]
+            value = line[colon + 1:]
+            if value[:1] == " ":
+                value = value[1:]
+
+        if field == "data":
+            self._data_lines.append(value)
+        elif field == "event":
+            self._event_type = value
+        elif field == "id":
+            self._last_event_id = value
+
+    def _dispatch(self):
+        """分发当前事件并重置字段
+
+        Returns:
+            SseEvent: 当前事件,没有data字段时返回None
+        """
+        if not self._data_lines:
+            self._event_type = ""
+            return None
+
+        event = SseEvent(
+            self._event_type or "message",
+            "\n".join(self._data_lines),
+            self._last_event_id
+        )
+
+        self._event_type = ""
+        self._data_lines = []
+        return event
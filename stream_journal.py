@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import itertools
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _acquire_lock(path):
+    """打开锁文件并加非阻塞的排他锁,进程退出或关闭文件时锁自动释放
+
+    Args:
+        path: 锁文件路径,不存在时创建
+
+    Returns:
+        file: 锁文件,已被其他实例锁定时返回None
+    """
+    f = open(path, "ab")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _release_lock(lock, path):
+    """释放锁并删除锁文件"""
+    lock.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class StreamJournal:
+    """进行中流式回复的追加写日志
+
+    每条记录是一行JSON: begin记录本轮的用户消息,delta记录一批回复内容,
+    end表示本轮已提交或丢弃。响应块先累积在内存中,由调用方按固定间隔调用
+    flush()合并写出并fsync,流式热路径上只有一次列表追加。日志文件只打开一次。
+
+    同时运行的多个实例(多个窗口、设置页单独创建的服务、批量运行)各自写入
+    stream-<进程ID>-<序号>.jsonl,并在写入期间对同名的.lock文件持有排他锁。
+    没有进行中的轮次时日志被截断为空,否则重写为只包含进行中的轮次。
+
+    程序崩溃或在输出中途关闭后,下次启动时recover()接管锁可以取得、即所属
+    实例已经退出的日志,返回其中未结束的轮次并删除这些日志。
+    """
+
+    # 日志文件名前缀,旧版本使用的stream.jsonl同样会被恢复
+    PREFIX = "stream"
+
+    # 同一进程内实例的序号
+    _counter = itertools.count()
+
+    def __init__(self, directory):
+        """初始化日志,文件在第一次写入时才打开
+
+        Args:
+            directory: 日志目录
+        """
+        name = f"{self.PREFIX}-{os.getpid()}-{next(self._counter)}"
+        self._directory = directory
+        self._path = os.path.join(directory, name + ".jsonl")
+        self._lock_path = os.path.join(directory, name + ".lock")
+        self._file = None
+        self._lock = None
+
+        # 进行中的轮次: 会话ID -> {"user", "provider_id", "model_id", "started", "parts"}
+        self._turns = {}
+
+        # 尚未写出的响应块,以及已写入但尚未同步到磁盘的记录
+        self._pending = {}  # 会话ID -> [内容]
+        self._dirty = False
+
+        # 已写出记录中已结束轮次的记录数,用于判断是否需要压缩
+        self._dead_records = 0
+
+    def begin(self, session_id, message, provider_id=None, model_id=None):
+        """开始记录一轮回复
+
+        Args:
+            session_id: 会话ID
+            message: 本轮的用户消息
+            provider_id: 提供商ID
+            model_id: 模型ID
+        """
+        if session_id in self._turns:
+            self.end(session_id)
+
+        turn = {
+            "user": message,
+            "provider_id": provider_id,
+            "model_id": model_id,
+            "started": time.time(),
+            "parts": [],
+        }
+        self._turns[session_id] = turn
+        self._write(self._begin_record(session_id, turn))
+
+    def append(self, session_id, content):
+        """记录一个响应块,在下次flush时写出
+
+        Args:
+            session_id: 会话ID
+            content: 响应内容
+        """
+        if session_id in self._turns:
+            self._pending.setdefault(session_id, []).append(content)
+
+    def has_pending(self):
+        """检查是否有尚未写出或尚未同步的内容"""
+        return self._dirty or bool(self._pending)
+
+    def flush(self):
+        """合并写出累积的响应块并同步到磁盘"""
+        if not self.has_pending():
+            return
+
+        for session_id, parts in self._pending.items():
+            text = "".join(parts)
+            self._turns[session_id]["parts"].append(text)
+            self._write({"op": "delta", "sid": session_id, "text": text})
+        self._pending.clear()
+
+        # close()之后仍可能有新的内容写入,此时重新打开文件
+        file = self._open()
+        file.flush()
+        os.fsync(file.fileno())
+        self._dirty = False
+
+    def end(self, session_id):
+        """结束一轮回复,回复已提交到历史或被丢弃
+
+        Args:
+            session_id: 会话ID
+        """
+        turn = self._turns.pop(session_id, None)
+        if turn is None:
+            return
+
+        self._pending.pop(session_id, None)
+        self._dead_records += 1 + len(turn["parts"])
+
+        if not self._turns:
+            # 没有进行中的轮次,整个日志都已无用
+            self._truncate()
+        elif self._dead_records > 4 * (len(self._turns) + 1):
+            self._compact()
+        else:
+            self._write({"op": "end", "sid": session_id})
+            self._dead_records += 1
+
+    def recover(self):
+        """接管所属实例已退出的日志,读取其中未结束的轮次并删除这些日志
+
+        仍在运行的实例持有日志的锁,它们进行中的轮次不受影响。
+
+        Returns:
+            list: 每项为{"session_id", "user", "text", "provider_id", "model_id", "started"},按开始时间排列
+        """
+        try:
+            names = sorted(os.listdir(self._directory))
+        except OSError:
+            return []
+
+        recovered = []
+        for name in names:
+            path = os.path.join(self._directory, name)
+            if not (name.startswith(self.PREFIX) and name.endswith(".jsonl")) or path == self._path:
+                continue
+
+            lock_path = path[:-len(".jsonl")] + ".lock"
+            lock = _acquire_lock(lock_path)
+            if lock is None:
+                continue
+
+            try:
+                for session_id, turn in self._read(path).items():
+                    recovered.append({
+                        "session_id": session_id,
+                        "user": turn["user"],
+                        "text": "".join(turn["parts"]),
+                        "provider_id": turn["provider_id"],
+                        "model_id": turn["model_id"],
+                        "started": turn["started"],
+                    })
+                os.remove(path)
+            finally:
+                _release_lock(lock, lock_path)
+
+        recovered.sort(key=lambda turn: turn["started"] or 0)
+        return recovered
+
+    def close(self):
+        """写出剩余内容并关闭文件,释放锁
+
+        进行中的轮次保留在日志中,由下次启动的recover()接管;没有时删除日志。
+        """
+        if self._file is None:
+            return
+
+        self.flush()
+        self._file.close()
+        self._file = None
+        if not self._turns:
+            os.remove(self._path)
+
+        _release_lock(self._lock, self._lock_path)
+        self._lock = None
+
+    def _open(self):
+        """打开日志文件,第一次打开时取得锁
+
+        Returns:
+            file: 追加写的文件对象
+        """
+        if self._file is None:
+            os.makedirs(self._directory, exist_ok=True)
+            if self._lock is None:
+                self._lock = _acquire_lock(self._lock_path)
+                if self._lock is None:
+                    raise OSError(f"流式日志被其他实例占用: {self._lock_path}")
+            self._file = open(self._path, "ab")
+        return self._file
+
+    def _write(self, record):
+        """追加一条记录,不立即同步"""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._open().write(line.encode("utf-8"))
+        self._dirty = True
+
+    def _begin_record(self, session_id, turn):
+        """生成begin记录"""
+        return {
+            "op": "begin",
+            "sid": session_id,
+            "user": turn["user"],
+            "provider": turn["provider_id"],
+            "model": turn["model_id"],
+            "ts": turn["started"],
+        }
+
+    def _read(self, path):
+        """读取日志中未结束的轮次
+
+        Args:
+            path: 日志文件路径
+
+        Returns:
+            dict: 会话ID -> 轮次
+        """
+        turns = {}
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时写了一半的最后一行
+                        break
+
+                    op = record.get("op")
+                    session_id = record.get("sid")
+                    if op == "begin":
+                        turns[session_id] = {
+                            "user": record.get("user", ""),
+                            "provider_id": record.get("provider"),
+                            "model_id": record.get("model"),
+                            "started": record.get("ts"),
+                            "parts": [],
+                        }
+                    elif op == "delta" and session_id in turns:
+                        turns[session_id]["parts"].append(record.get("text", ""))
+                    elif op == "end":
+                        turns.pop(session_id, None)
+        except OSError:
+            pass
+        return turns
+
+    def _truncate(self):
+        """清空日志"""
+        f = self._open()
+        f.seek(0)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        self._dead_records = 0
+        self._dirty = False
+
+    def _compact(self):
+        """重写日志,只保留进行中的轮次"""
+        self.flush()
+
+        turns = self._turns
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "wb") as f:
+            for session_id, turn in turns.items():
+                records = [self._begin_record(session_id, turn)]
+                if turn["parts"]:
+                    records.append({"op": "delta", "sid": session_id, "text": "".join(turn["parts"])})
+                for record in records:
+                    f.write((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._file is not None:
+            self._file.close()
+        os.replace(temp_path, self._path)
+        self._file = open(self._path, "ab")
+        self._dead_records = 0
+        self._dirty = False
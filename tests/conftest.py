@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import pytest
+
+# 模块位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+class FakeConfigManager:
+    """只包含模型配置的ConfigManager替身,测试不读写Data目录"""
+
+    def __init__(self, providers=None, model_groups=None):
+        self.providers = providers or {}
+        self.model_groups = model_groups or {}
+
+    def get_provider(self, provider_id):
+        return self.providers.get(provider_id, {})
+
+    def get_model(self, provider_id, model_id):
+        for model in self.get_provider(provider_id).get("models", []):
+            if model.get("id") == model_id:
+                return model
+        return None
+
+    def get_model_groups(self):
+        return self.model_groups
+
+    def get_model_group(self, group_id):
+        return self.model_groups.get(group_id)
+
+
+@pytest.fixture
+def config_manager(monkeypatch):
+    """用FakeConfigManager替换ConfigManager单例"""
+    from config_manager import ConfigManager
+
+    fake = FakeConfigManager()
+    monkeypatch.setattr(ConfigManager, "_instance", fake)
+    return fake
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """QTimer需要的应用程序实例"""
+    from PySide6.QtCore import QCoreApplication
+
+    return QCoreApplication.instance() or QCoreApplication([])
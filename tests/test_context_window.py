@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from context_window import ContextWindowPlanner
+from conversation_store import ChatMessage
+
+
+def count_tokens(message):
+    """每条消息的token数等于内容长度"""
+    return len(message.content)
+
+
+def make_history(*contents):
+    """交替生成用户和助手消息"""
+    return [ChatMessage("user" if i % 2 == 0 else "assistant", content) for i, content in enumerate(contents)]
+
+
+def test_history_within_budget_is_sent_whole():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history("aaaa", "bbbb")
+    assert planner.plan("s", history, 8) == 0
+    assert planner.history_tokens("s", history) == 8
+
+
+def test_trims_oldest_messages():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history("aaaa", "bb", "cc", "dd")
+    assert planner.plan("s", history, 6) == 2
+
+
+def test_start_skips_to_a_user_message():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history("aa", "bbbb", "cc", "dd")
+    # 只放得下最后三条时,不以助手消息开头
+    assert planner.plan("s", history, 8) == 2
+
+
+def test_no_budget_or_no_history():
+    planner = ContextWindowPlanner(count_tokens)
+    assert planner.plan("s", [], 10) == 0
+    history = make_history("aa", "bb")
+    assert planner.plan("s", history, 0) == len(history)
+
+
+def test_single_message_over_budget_sends_nothing():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history("a" * 20)
+    assert planner.plan("s", history, 10) == 1
+
+
+def test_prefix_sums_extend_incrementally():
+    counted = []
+
+    def counting(message):
+        counted.append(message)
+        return len(message.content)
+
+    planner = ContextWindowPlanner(counting)
+    history = make_history("aa", "bb")
+    planner.plan("s", history, 100)
+    history += make_history("cc", "dd")
+    planner.plan("s", history, 100)
+
+    assert len(counted) == 4
+
+
+def test_replaced_history_is_recounted():
+    planner = ContextWindowPlanner(count_tokens)
+    planner.plan("s", make_history("aaaa", "bbbb", "cccc"), 100)
+    history = make_history("a")
+    assert planner.history_tokens("s", history) == 1
+
+
+def test_slack_keeps_start_stable_until_budget_is_exceeded():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history(*["xx"] * 10)
+    start = planner.plan("s", history, 10, slack=0.5)
+    # 超出预算时多裁掉一半,只保留5个token以内
+    assert start == 8
+
+    starts = []
+    for _ in range(4):
+        history += make_history("yy")
+        starts.append(planner.plan("s", history, 10, slack=0.5))
+    assert starts[:3] == [start] * 3
+
+    # 再次超出后重新裁剪
+    assert starts[3] > start
+
+
+def test_without_slack_every_turn_takes_the_most_history():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history(*["xx"] * 10)
+    assert planner.plan("s", history, 10) == 6
+    history += make_history("yy", "zz")
+    assert planner.plan("s", history, 10) == 8
+
+
+def test_invalidate_forgets_the_session():
+    planner = ContextWindowPlanner(count_tokens)
+    history = make_history(*["xx"] * 10)
+    planner.plan("s", history, 10, slack=0.5)
+    planner.invalidate("s")
+    assert planner.plan("s", history, 10) == 6
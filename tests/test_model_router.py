@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from model_router import ModelRouter, parse_member
+
+
+def provider(*models, api_key="key"):
+    """生成提供商配置"""
+    return {"api_url": "https://example.com/v1", "api_key": api_key, "models": [{"id": m} for m in models]}
+
+
+@pytest.fixture
+def router(config_manager):
+    config_manager.providers.update({
+        "a": provider("chat"),
+        "b": provider("vendor/chat"),
+        "c": provider("chat"),
+        "nokey": provider("chat", api_key=""),
+    })
+    config_manager.model_groups["g"] = {
+        "name": "组",
+        "members": ["a/chat", "b/vendor/chat", {"provider": "c", "model": "chat"},
+                    "nokey/chat", "a/missing", "a/chat", "broken"],
+    }
+    return ModelRouter(config_manager)
+
+
+def test_parse_member():
+    assert parse_member("p/org/model") == ("p", "org/model")
+    assert parse_member({"provider": "p", "model": "m"}) == ("p", "m")
+    assert parse_member("no-slash") is None
+    assert parse_member("/m") is None
+    assert parse_member(None) is None
+
+
+def test_members_skip_unusable_and_duplicate_entries(router):
+    assert router.members("g") == [("a", "chat"), ("b", "vendor/chat"), ("c", "chat")]
+    assert router.members("unknown") == []
+    assert router.groups() == {"g": "组"}
+
+
+def test_untried_members_are_chosen_in_config_order(router):
+    assert router.choose("g") == ("a", "chat")
+    router.record("a", "chat", 100, False)
+    # 没有样本的成员得分为0,先被尝试
+    assert router.choose("g") == ("b", "vendor/chat")
+
+
+def test_prefers_lower_time_to_first_byte(router):
+    router.record("a", "chat", 400, False)
+    router.record("b", "vendor/chat", 100, False)
+    router.record("c", "chat", 250, False)
+    assert [m["provider_id"] for m in router.ranking("g")] == ["b", "c", "a"]
+
+
+def test_errors_penalise_and_cool_down_a_member(router):
+    for member in router.members("g"):
+        router.record(*member, 100, False)
+    router.record("a", "chat", None, True)
+
+    ranking = router.ranking("g")
+    assert ranking[-1]["provider_id"] == "a"
+    assert ranking[-1]["cooling"]
+    assert router.score("a", "chat") > router.score("b", "vendor/chat")
+
+
+def test_cooldown_expires(router, monkeypatch):
+    for member in router.members("g"):
+        router.record(*member, 100, False)
+    router.record("a", "chat", None, True)
+    monkeypatch.setattr(ModelRouter, "FAILURE_COOLDOWN", 0.0)
+    assert not any(entry["cooling"] for entry in router.ranking("g"))
+
+
+def test_exclude_moves_to_the_next_member(router):
+    assert router.choose("g", exclude={("a", "chat")}) == ("b", "vendor/chat")
+    assert router.choose("g", exclude=set(router.members("g"))) is None
+
+
+def test_ttfb_is_an_exponential_moving_average(router):
+    router.record("a", "chat", 100, False)
+    router.record("a", "chat", 200, False)
+    entry = next(e for e in router.ranking("g") if e["provider_id"] == "a")
+    assert entry["ttfb_ms"] == pytest.approx(100 + ModelRouter.ALPHA * 100)
+    assert entry["samples"] == 2
+
+
+def test_reset_forgets_statistics(router):
+    router.record("a", "chat", 900, False)
+    router.reset()
+    assert router.score("a", "chat") == 0.0
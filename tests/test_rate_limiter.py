@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from rate_limiter import RateLimitTracker, parse_headers, parse_reset, rate_limit_key, request_cost
+
+
+KEY = "api.example.com#key"
+
+
+def test_parse_reset_formats():
+    assert parse_reset("1.5") == 1.5
+    assert parse_reset("6m0s") == 360
+    assert parse_reset("1h2m3.5s") == 3723.5
+    assert parse_reset("20ms") == 0.02
+    assert parse_reset("2030-01-01T00:00:10Z", now=1893456000.0) == 10
+    assert parse_reset("later") is None
+    assert parse_reset(" ") is None
+
+
+def test_parse_openai_headers():
+    buckets = parse_headers({
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "59",
+        "x-ratelimit-reset-requests": "1s",
+        "x-ratelimit-remaining-tokens": "1000",
+        "content-type": "text/event-stream",
+    })
+    assert buckets == {
+        "requests": {"limit": 60, "remaining": 59, "reset": 1.0},
+        "tokens": {"remaining": 1000},
+    }
+
+
+def test_parse_anthropic_headers():
+    buckets = parse_headers({
+        "anthropic-ratelimit-input-tokens-limit": "40000",
+        "anthropic-ratelimit-input-tokens-remaining": "39000",
+    })
+    assert buckets == {"input_tokens": {"limit": 40000, "remaining": 39000}}
+
+
+def test_key_does_not_contain_the_secret():
+    key = rate_limit_key("https://api.example.com/v1/chat/completions", "sk-secret")
+    assert key.startswith("api.example.com#")
+    assert "sk-secret" not in key
+    assert key == rate_limit_key("https://api.example.com/other", "sk-secret")
+    assert key != rate_limit_key("https://api.example.com/v1", "sk-other")
+
+
+def test_unknown_key_is_not_limited():
+    tracker = RateLimitTracker()
+    assert tracker.delay(KEY, request_cost(10, 10)) == 0
+    assert tracker.delay(None, request_cost(10, 10)) == 0
+    assert not tracker.update(KEY, {"content-type": "text/plain"})
+
+
+def test_waits_for_reset_when_quota_is_exhausted():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {
+        "x-ratelimit-limit-tokens": "1000",
+        "x-ratelimit-remaining-tokens": "50",
+        "x-ratelimit-reset-tokens": "2s",
+    })
+    assert tracker.delay(KEY, request_cost(10, 20)) == 0
+    assert 1900 <= tracker.delay(KEY, request_cost(100, 100)) <= 2000
+
+
+def test_reservations_count_against_remaining_quota():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {
+        "x-ratelimit-limit-requests": "10",
+        "x-ratelimit-remaining-requests": "1",
+        "x-ratelimit-reset-requests": "5s",
+    })
+    first, second = object(), object()
+    tracker.reserve(first, KEY, request_cost(1, 1))
+    assert tracker.delay(KEY, request_cost(1, 1)) > 0
+
+    tracker.release(first)
+    tracker.release(first)
+    assert tracker.delay(KEY, request_cost(1, 1)) == 0
+
+    tracker.reserve(second, KEY, request_cost(1, 1))
+    assert tracker.snapshot()[KEY]["buckets"]["requests"]["reserved"] == 1
+
+
+def test_quota_recovers_after_reset():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {
+        "x-ratelimit-limit-requests": "10",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "10ms",
+    })
+    time.sleep(0.02)
+    assert tracker.delay(KEY, request_cost(1, 1)) == 0
+
+
+def test_out_of_order_headers_only_lower_remaining():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "5s"})
+    tracker.update(KEY, {"x-ratelimit-remaining-requests": "7", "x-ratelimit-reset-requests": "5s"})
+    assert tracker.snapshot()[KEY]["buckets"]["requests"]["remaining"] == 5
+
+
+def test_429_blocks_for_retry_after():
+    tracker = RateLimitTracker()
+    assert tracker.update(KEY, {"retry-after": "3"}, status=429, provider_id="openai")
+    assert 2900 <= tracker.delay(KEY, request_cost(1, 1)) <= 3000
+    snapshot = tracker.snapshot()[KEY]
+    assert snapshot["providers"] == ["openai"]
+    assert snapshot["blocked_ms"] > 0
+
+
+def test_429_without_retry_after_uses_default_block():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {}, status=429)
+    delay = tracker.delay(KEY, request_cost(1, 1))
+    assert 0 < delay <= RateLimitTracker.DEFAULT_BLOCK * 1000
+
+
+def test_oversized_request_waits_only_for_a_full_quota():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {"x-ratelimit-limit-tokens": "100", "x-ratelimit-remaining-tokens": "100"})
+    assert tracker.delay(KEY, request_cost(500, 500)) == 0
+
+
+def test_reset_clears_quota_state():
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {"retry-after": "3"}, status=429)
+    tracker.mark_paced(KEY)
+    tracker.reset()
+    assert tracker.delay(KEY, request_cost(1, 1)) == 0
+    assert tracker.snapshot()[KEY]["paced"] == 0
+
+
+def test_scheduler_holds_only_requests_without_quota(qapp, config_manager):
+    from request_scheduler import RequestScheduler, ScheduledRequest
+
+    config_manager.providers["p"] = {"max_concurrency": 4, "models": [{"id": "m"}]}
+    config_manager.providers["q"] = {"max_concurrency": 4, "models": [{"id": "m"}]}
+    tracker = RateLimitTracker()
+    tracker.update(KEY, {"retry-after": "5"}, status=429)
+    scheduler = RequestScheduler()
+    scheduler.set_rate_limiter(tracker)
+
+    started = []
+    held = ScheduledRequest("a", "p", "m", started.append, rate_key=KEY, rate_cost=request_cost(1, 1))
+    other = ScheduledRequest("b", "q", "m", started.append, rate_key="other#key", rate_cost=request_cost(1, 1))
+    scheduler.submit(held)
+    scheduler.submit(other)
+
+    # 额度不足的请求留在队列中,其他密钥的请求越过它先发送
+    assert started == [other]
+    assert held.paced
+    assert scheduler.queued_count() == 1
+    assert tracker.snapshot()[KEY]["paced"] == 1
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from request_scheduler import RequestScheduler, ScheduledRequest
+
+
+@pytest.fixture
+def scheduler(qapp, config_manager):
+    """提供商p最多2个并发,其中模型slow最多1个"""
+    config_manager.providers["p"] = {
+        "max_concurrency": 2,
+        "models": [{"id": "fast"}, {"id": "slow", "max_concurrency": 1}],
+    }
+    config_manager.providers["q"] = {"max_concurrency": 1, "models": [{"id": "fast"}]}
+    return RequestScheduler()
+
+
+class Recorder:
+    """记录各请求获得执行许可的顺序"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.started = []
+
+    def submit(self, name, provider_id="p", model_id="fast", priority=RequestScheduler.PRIORITY_BACKGROUND,
+               session_id=None):
+        request = ScheduledRequest(
+            session_id or name, provider_id, model_id, lambda req: self.started.append(name), priority
+        )
+        request.name = name
+        self.scheduler.submit(request)
+        return request
+
+
+def test_provider_cap_queues_excess_requests(scheduler):
+    recorder = Recorder(scheduler)
+    requests = [recorder.submit(f"r{i}") for i in range(4)]
+
+    assert recorder.started == ["r0", "r1"]
+    assert scheduler.in_flight_count("p") == 2
+    assert scheduler.queued_count("p") == 2
+
+    scheduler.release(requests[0])
+    assert recorder.started == ["r0", "r1", "r2"]
+
+
+def test_model_cap_below_provider_cap(scheduler):
+    recorder = Recorder(scheduler)
+    recorder.submit("s0", model_id="slow")
+    recorder.submit("s1", model_id="slow")
+    recorder.submit("f0", model_id="fast")
+
+    # slow已满,同一提供商的fast不被队首的s1阻塞
+    assert recorder.started == ["s0", "f0"]
+    assert scheduler.queued_count() == 1
+
+
+def test_providers_are_limited_independently(scheduler):
+    recorder = Recorder(scheduler)
+    recorder.submit("q0", provider_id="q")
+    recorder.submit("q1", provider_id="q")
+    recorder.submit("p0")
+
+    assert recorder.started == ["q0", "p0"]
+    assert scheduler.queued_count("q") == 1
+
+
+def test_foreground_requests_overtake_background(scheduler):
+    recorder = Recorder(scheduler)
+    first = recorder.submit("busy0")
+    recorder.submit("busy1")
+    recorder.submit("bg0")
+    recorder.submit("bg1")
+    recorder.submit("fg", priority=RequestScheduler.PRIORITY_FOREGROUND)
+
+    scheduler.release(first)
+    assert recorder.started[-1] == "fg"
+
+
+def test_same_priority_is_first_in_first_out(scheduler):
+    recorder = Recorder(scheduler)
+    running = [recorder.submit(f"r{i}") for i in range(2)]
+    for i in range(2, 6):
+        recorder.submit(f"r{i}")
+
+    for request in running:
+        scheduler.release(request)
+    assert recorder.started == ["r0", "r1", "r2", "r3"]
+
+
+def test_queued_requests_across_models_keep_submission_order(scheduler):
+    recorder = Recorder(scheduler)
+    running = [recorder.submit("a"), recorder.submit("b")]
+    recorder.submit("slow", model_id="slow")
+    recorder.submit("fast", model_id="fast")
+
+    scheduler.release(running[0])
+    scheduler.release(running[1])
+    assert recorder.started == ["a", "b", "slow", "fast"]
+
+
+def test_set_session_priority_moves_queued_request_forward(scheduler):
+    recorder = Recorder(scheduler)
+    running = recorder.submit("busy0")
+    recorder.submit("busy1")
+    recorder.submit("bg0")
+    recorder.submit("bg1", session_id="visible")
+
+    scheduler.set_session_priority("visible", RequestScheduler.PRIORITY_FOREGROUND)
+    scheduler.release(running)
+    assert recorder.started[-1] == "bg1"
+
+
+def test_release_is_idempotent(scheduler):
+    recorder = Recorder(scheduler)
+    first = recorder.submit("r0")
+    recorder.submit("r1")
+    recorder.submit("r2")
+    recorder.submit("r3")
+
+    scheduler.release(first)
+    scheduler.release(first)
+    assert recorder.started == ["r0", "r1", "r2"]
+    assert scheduler.in_flight_count("p") == 2
+
+
+def test_release_inside_dispatch_does_not_exceed_cap(scheduler):
+    started = []
+
+    def dispatch(request):
+        started.append(request)
+        if len(started) == 1:
+            # 同步失败的请求在dispatch中立即释放
+            scheduler.release(request)
+
+    for i in range(4):
+        scheduler.submit(ScheduledRequest(f"s{i}", "p", "fast", dispatch))
+
+    assert len(started) == 3
+    assert scheduler.in_flight_count("p") == 2
+
+
+def test_cancel_session_removes_only_queued_requests(scheduler):
+    recorder = Recorder(scheduler)
+    recorder.submit("r0", session_id="a")
+    recorder.submit("r1", session_id="b")
+    queued = recorder.submit("r2", session_id="a")
+    recorder.submit("r3", session_id="b")
+
+    assert scheduler.cancel_session("a") == [queued]
+    assert queued.cancelled
+    assert scheduler.queued_count() == 1
+    assert scheduler.in_flight_count() == 2
+
+
+def test_queue_depth_signal(scheduler):
+    depths = []
+    scheduler.queue_depth_changed.connect(lambda queued, in_flight: depths.append((queued, in_flight)))
+    recorder = Recorder(scheduler)
+    for i in range(3):
+        recorder.submit(f"r{i}")
+
+    assert depths[-1] == (1, 2)
+    assert scheduler.has_pending()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from PySide6.QtNetwork import QNetworkReply
+
+from retry_policy import RetryPolicy, parse_retry_after
+
+
+def test_retries_transient_statuses_up_to_the_limit():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry(0, status=503)
+    assert policy.should_retry(1, status=429)
+    assert not policy.should_retry(2, status=503)
+
+
+def test_does_not_retry_client_errors():
+    policy = RetryPolicy()
+    for status in (400, 401, 403, 404):
+        assert not policy.should_retry(0, status=status)
+
+
+def test_retries_transient_network_errors_only():
+    policy = RetryPolicy()
+    assert policy.should_retry(0, error=QNetworkReply.RemoteHostClosedError)
+    assert policy.should_retry(0, error=QNetworkReply.TimeoutError)
+    assert not policy.should_retry(0, error=QNetworkReply.HostNotFoundError)
+    assert not policy.should_retry(0, error=QNetworkReply.SslHandshakeFailedError)
+
+
+def test_backoff_is_bounded_by_exponential_ceiling():
+    policy = RetryPolicy(base_delay=100, max_delay=1000)
+    for attempt, ceiling in ((0, 100), (1, 200), (3, 800), (6, 1000)):
+        delays = [policy.retry_delay(attempt) for _ in range(200)]
+        assert 0 <= min(delays) and max(delays) <= ceiling
+
+
+def test_retry_after_overrides_backoff():
+    policy = RetryPolicy(base_delay=100, max_delay=1000)
+    assert policy.retry_delay(0, b"2") == 2000
+    assert policy.retry_delay(0, "0.5") == 500
+
+
+def test_long_retry_after_stops_retrying():
+    policy = RetryPolicy()
+    assert policy.retry_delay(0, str(RetryPolicy.MAX_RETRY_AFTER // 1000 + 1)) is None
+
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = parse_retry_after(format_datetime(when, usegmt=True))
+    assert 28000 <= delay <= 30000
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0
+
+
+def test_parse_retry_after_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_from_config():
+    policy = RetryPolicy.from_config({"max_retries": 5, "retry_base_delay": 50, "retry_max_delay": 10,
+                                      "hedge_after": 800, "first_byte_timeout": 3000})
+    assert (policy.max_retries, policy.base_delay, policy.hedge_after, policy.first_byte_timeout) == (5, 50, 800, 3000)
+    # 上限不小于基数
+    assert policy.max_delay == 50
+
+
+def test_from_config_falls_back_on_invalid_values():
+    policy = RetryPolicy.from_config({"max_retries": "many"})
+    assert policy.max_retries == RetryPolicy.DEFAULT_MAX_RETRIES
+    assert RetryPolicy.from_config(None).max_retries == RetryPolicy.DEFAULT_MAX_RETRIES
+
+
+def test_hedge_delay():
+    assert RetryPolicy(hedge_after=0).hedge_delay() == 0
+    assert RetryPolicy(hedge_after=700).hedge_delay() == 700
+
+    auto = RetryPolicy(hedge_after="auto")
+    assert auto.hedge_delay() == RetryPolicy.AUTO_HEDGE_FALLBACK
+    assert auto.hedge_delay(lambda quantile, min_samples: None) == RetryPolicy.AUTO_HEDGE_FALLBACK
+    assert auto.hedge_delay(lambda quantile, min_samples: 1234.5) == 1234
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from chat_database import ChatDatabase
+from search_index import build_match_query, index_text, make_snippet, query_terms
+
+
+def test_index_text_splits_cjk_into_bigrams():
+    assert index_text("生成器") == " 生成 成器 器 "
+    assert index_text("Python生成器Yield") == "python 生成 成器 器 yield"
+    assert index_text("中") == " 中 "
+
+
+def test_query_terms():
+    assert query_terms("Python 生成器, yield") == ["python", "生成器", "yield"]
+    assert query_terms("  ") == []
+
+
+def test_build_match_query():
+    assert build_match_query(["生成器"]) == '"生成 成器"'
+    assert build_match_query(["生"]) == '"生"*'
+    assert build_match_query(["say", "he\"llo"]) == '"say" "he""llo"*'
+
+
+def test_make_snippet_marks_terms_and_escapes_html():
+    snippet = make_snippet("前缀 <b>标签</b> 生成器的用法", ["生成器"])
+    assert "<b>生成器</b>" in snippet
+    assert "&lt;b&gt;标签&lt;/b&gt;" in snippet
+
+
+def test_make_snippet_centres_on_the_first_match():
+    snippet = make_snippet("无关内容" * 50 + "目标词" + "后续" * 50, ["目标词"], width=40)
+    assert snippet.startswith("…")
+    assert "<b>目标词</b>" in snippet
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def database(request, tmp_path):
+    """分别测试FTS5索引和没有FTS5时的逐条匹配"""
+    database = ChatDatabase(str(tmp_path / "chat.db"))
+    if request.param and not database._fts:
+        pytest.skip("SQLite没有编译FTS5")
+    database._fts = request.param and database._fts
+
+    database.add_session("a", "编程", "openai", "gpt-4")
+    database.add_session("b", "旅行", "openai", "gpt-4")
+    database.append_messages("a", [
+        ("user", "Python的生成器和迭代器有什么区别?"),
+        ("assistant", "生成器是一种特殊的迭代器,使用yield逐个产生值。"),
+    ])
+    database.append_messages("b", [
+        ("user", "去北京旅游需要准备什么"),
+        ("assistant", "建议提前预订故宫门票。"),
+    ])
+    yield database
+    database.close()
+
+
+def search(database, query):
+    return [(result["session_id"], result["role"]) for result in database.search_messages(query)]
+
+
+def test_cjk_substring_search(database):
+    assert sorted(search(database, "生成器")) == [("a", "assistant"), ("a", "user")]
+    assert search(database, "故宫") == [("b", "assistant")]
+    # 词中间的片段同样可以搜到
+    assert search(database, "成器") and search(database, "宫门")
+
+
+def test_single_cjk_character(database):
+    assert search(database, "宫") == [("b", "assistant")]
+
+
+def test_all_terms_must_match(database):
+    assert search(database, "生成器 yield") == [("a", "assistant")]
+    assert search(database, "生成器 北京") == []
+
+
+def test_mixed_script_and_case(database):
+    assert search(database, "PYTHON生成器") == [("a", "user")]
+
+
+def test_unrelated_and_empty_queries(database):
+    assert search(database, "天气") == []
+    assert search(database, "  ,") == []
+
+
+def test_result_fields(database):
+    result = database.search_messages("故宫")[0]
+    assert result["session_name"] == "旅行"
+    assert "<b>故宫</b>" in result["snippet"]
+    stored = database.load_messages("b")
+    assert result["message_id"] == stored[-1].id
+
+
+def test_deleted_messages_are_not_found(database):
+    database.clear_messages("a")
+    assert search(database, "生成器") == []
+    database.delete_session("b")
+    assert search(database, "故宫") == []
+
+
+def test_existing_messages_are_indexed_when_the_index_is_created(tmp_path):
+    path = str(tmp_path / "chat.db")
+    database = ChatDatabase(path)
+    if not database._fts:
+        pytest.skip("SQLite没有编译FTS5")
+    database.add_session("a", "旧会话", "openai", "gpt-4")
+    database.append_messages("a", [("user", "旧版本写入的消息")])
+    database._connection.execute("DROP TABLE messages_fts")
+    database.close()
+
+    reopened = ChatDatabase(path)
+    assert [result["session_id"] for result in reopened.search_messages("旧版本")] == ["a"]
+    reopened.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import random
+
+from similarity_cache import SimilarityCache, shingles
+
+
+SCOPE = SimilarityCache.make_scope("openai", "gpt-4", "你是一个助手")
+
+QUESTION = "请解释一下Python中生成器和迭代器的区别,并给出示例代码"
+VARIANT = "请解释一下 Python 中生成器与迭代器的区别，并给出示例代码。"
+UNRELATED = "明天北京的天气怎么样,需要带伞吗"
+
+
+def test_shingles_ignore_case_whitespace_and_punctuation():
+    assert shingles("Hello, World!") == shingles("hello world")
+    assert shingles("你好，世界。") == shingles("你好世界")
+    assert shingles(" !?") == set()
+    assert len(shingles("ab")) == 1
+
+
+def test_near_duplicate_is_found():
+    cache = SimilarityCache()
+    cache.add(SCOPE, QUESTION, "回答")
+    response, score = cache.lookup(SCOPE, VARIANT)
+    assert response == "回答"
+    assert cache.threshold <= score <= 1.0
+
+
+def test_unrelated_prompt_and_other_scope_do_not_match():
+    cache = SimilarityCache()
+    cache.add(SCOPE, QUESTION, "回答")
+    assert cache.lookup(SCOPE, UNRELATED) is None
+    assert cache.lookup(SimilarityCache.make_scope("openai", "gpt-4", "另一个系统提示"), QUESTION) is None
+    assert cache.lookup(SimilarityCache.make_scope("openai", "gpt-3.5", "你是一个助手"), QUESTION) is None
+
+
+def test_threshold_controls_matching():
+    cache = SimilarityCache(threshold=1.0)
+    cache.add(SCOPE, QUESTION, "回答")
+    assert cache.lookup(SCOPE, QUESTION + "能详细一点吗") is None
+    assert cache.lookup(SCOPE, QUESTION)[1] == 1.0
+
+
+def test_empty_and_oversized_responses_are_not_indexed():
+    cache = SimilarityCache()
+    cache.add(SCOPE, QUESTION, "")
+    cache.add(SCOPE, QUESTION, "长" * (SimilarityCache.MAX_RESPONSE_CHARS + 1))
+    cache.add(SCOPE, "。。。", "回答")
+    assert len(cache) == 0
+
+
+def test_same_prompt_is_indexed_once():
+    cache = SimilarityCache()
+    cache.add(SCOPE, QUESTION, "第一次")
+    cache.add(SCOPE, QUESTION, "第二次")
+    assert len(cache) == 1
+    assert cache.lookup(SCOPE, QUESTION)[0] == "第一次"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SimilarityCache(max_entries=2)
+    cache.add(SCOPE, QUESTION, "a")
+    cache.add(SCOPE, UNRELATED, "b")
+    # 命中后移到最近使用
+    cache.lookup(SCOPE, QUESTION)
+    cache.add(SCOPE, "如何用SQL统计每个用户的订单数量", "c")
+
+    assert len(cache) == 2
+    assert cache.lookup(SCOPE, UNRELATED) is None
+    assert cache.lookup(SCOPE, QUESTION)[0] == "a"
+
+
+def test_long_prompts_use_a_bounded_sample():
+    rng = random.Random(1)
+    alphabet = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面"
+    text = "".join(rng.choice(alphabet) for _ in range(5000))
+    edited = list(text)
+    for index in rng.sample(range(len(text)), 50):
+        edited[index] = rng.choice(alphabet)
+
+    cache = SimilarityCache()
+    assert len(shingles(text)) > SimilarityCache.MAX_SHINGLES
+    cache.add(SCOPE, text, "长问题的回答")
+    assert cache.lookup(SCOPE, "".join(edited))[0] == "长问题的回答"
+    assert cache.lookup(SCOPE, "".join(rng.choice(alphabet) for _ in range(5000))) is None
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "similarity.json")
+    cache = SimilarityCache(path)
+    cache.add(SCOPE, QUESTION, "回答")
+    assert cache.dirty
+    cache.save()
+    assert not cache.dirty
+
+    loaded = SimilarityCache(path)
+    assert len(loaded) == 1
+    assert loaded.lookup(SCOPE, VARIANT)[0] == "回答"
+
+
+def test_index_with_other_parameters_is_discarded(tmp_path):
+    path = tmp_path / "similarity.json"
+    cache = SimilarityCache(str(path))
+    cache.add(SCOPE, QUESTION, "回答")
+    cache.save()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data["max_shingles"] = SimilarityCache.MAX_SHINGLES + 1
+    path.write_text(json.dumps(data), encoding="utf-8")
+    assert len(SimilarityCache(str(path))) == 0
+    assert len(SimilarityCache(str(path), num_perm=32, bands=8)) == 0
+
+
+def test_clear():
+    cache = SimilarityCache()
+    cache.add(SCOPE, QUESTION, "回答")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.lookup(SCOPE, QUESTION) is None
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from sse_parser import SseEvent, SseParser
+
+
+def feed_all(parser, chunks):
+    """依次输入各数据包并结束,返回全部事件"""
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    return events
+
+
+def split_every(data, size):
+    """把字节串切分为固定长度的数据包"""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+STREAM = (
+    "event: message_start\n"
+    "data: {\"a\": 1}\n"
+    "\n"
+    ": 注释行\n"
+    "id: 7\n"
+    "data: 第一行\n"
+    "data: 第二行\n"
+    "\n"
+    "data: [DONE]\n"
+    "\n"
+).encode("utf-8")
+
+EXPECTED = [
+    SseEvent("message_start", "{\"a\": 1}"),
+    SseEvent("message", "第一行\n第二行", "7"),
+    SseEvent("message", "[DONE]", "7"),
+]
+
+
+def test_whole_stream():
+    assert feed_all(SseParser(), [STREAM]) == EXPECTED
+
+
+def test_event_fields():
+    event = SseParser().feed(b"event: delta\nid: 3\ndata: x\n\n")[0]
+    assert (event.event, event.data, event.id) == ("delta", "x", "3")
+
+
+def test_every_split_point():
+    for size in range(1, 12):
+        assert feed_all(SseParser(), split_every(STREAM, size)) == EXPECTED
+
+
+def test_crlf_line_endings():
+    data = STREAM.replace(b"\n", b"\r\n")
+    assert feed_all(SseParser(), [data]) == EXPECTED
+    assert feed_all(SseParser(), split_every(data, 1)) == EXPECTED
+
+
+def test_crlf_split_between_packets():
+    parser = SseParser()
+    assert parser.feed(b"data: a\r") == []
+    assert parser.feed(b"\n\r") == [SseEvent("message", "a")]
+    # 跳过的只有紧跟CR的一个LF,之后的LF是空行
+    assert parser.feed(b"\ndata: b\r\n\r\n") == [SseEvent("message", "b")]
+
+
+def test_bare_cr_and_mixed_line_endings():
+    data = b"data: a\rdata: b\r\n\ndata: c\n\r"
+    assert feed_all(SseParser(), [data]) == [SseEvent("message", "a\nb"), SseEvent("message", "c")]
+
+
+def test_multibyte_character_split_across_packets():
+    data = "data: 你好,世界🙂\n\n".encode("utf-8")
+    start = data.index("好".encode("utf-8"))
+    parser = SseParser()
+    events = parser.feed(data[:start + 1])
+    events += parser.feed(data[start + 1:start + 2])
+    events += parser.feed(data[start + 2:])
+    assert events == [SseEvent("message", "你好,世界🙂")]
+    assert parser.bytes_received == len(data)
+
+
+def test_single_byte_packets_with_multibyte_text():
+    data = "data: 流式输出\r\n\r\n".encode("utf-8")
+    assert feed_all(SseParser(), split_every(data, 1)) == [SseEvent("message", "流式输出")]
+
+
+def test_invalid_utf8_is_replaced():
+    assert SseParser().feed(b"data: \xff\n\n") == [SseEvent("message", "�")]
+
+
+def test_field_without_space_and_without_value():
+    events = feed_all(SseParser(), [b"data:x\ndata\n\n"])
+    assert events == [SseEvent("message", "x\n")]
+
+
+def test_event_without_data_is_not_dispatched():
+    assert feed_all(SseParser(), [b"event: ping\n\ndata: x\n\n"]) == [SseEvent("message", "x")]
+
+
+def test_finish_dispatches_unterminated_event():
+    parser = SseParser()
+    assert parser.feed(b"data: tail") == []
+    assert parser.finish() == [SseEvent("message", "tail")]
+
+
+def test_reset_discards_state():
+    parser = SseParser()
+    parser.feed(b"id: 9\nevent: delta\ndata: partial\n")
+    parser.reset()
+    assert parser.feed(b"data: fresh\n\n") == [SseEvent("message", "fresh", None)]
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+from stream_journal import StreamJournal
+
+
+def crash(journal):
+    """模拟进程崩溃: 已写出的记录留在磁盘上,锁随进程退出而释放"""
+    journal.flush()
+    journal._file.close()
+    journal._lock.close()
+
+
+def journal_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+
+def test_recovers_interrupted_turns_after_a_crash(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("s1", "问题一", "openai", "gpt-4")
+    journal.append("s1", "部分")
+    journal.append("s1", "回复")
+    journal.begin("s2", "问题二")
+    journal.append("s2", "已完成")
+    journal.flush()
+    journal.end("s2")
+    journal.append("s1", "未写出的内容")
+    crash(journal)
+
+    recovered = StreamJournal(str(tmp_path)).recover()
+    assert [(turn["session_id"], turn["user"], turn["text"]) for turn in recovered] == [
+        ("s1", "问题一", "部分回复未写出的内容"),
+    ]
+    assert recovered[0]["provider_id"] == "openai"
+    assert recovered[0]["model_id"] == "gpt-4"
+    # 接管后删除日志和锁文件
+    assert os.listdir(tmp_path) == []
+
+
+def test_unflushed_deltas_are_lost_but_the_turn_is_recovered(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("s", "问题")
+    journal.flush()
+    journal.append("s", "未写出")
+    # 崩溃发生在下次flush之前
+    journal._file.close()
+    journal._lock.close()
+
+    recovered = StreamJournal(str(tmp_path)).recover()
+    assert [(turn["session_id"], turn["text"]) for turn in recovered] == [("s", "")]
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("s", "问题")
+    journal.append("s", "内容")
+    crash(journal)
+    with open(journal._path, "ab") as f:
+        f.write(b'{"op":"delta","sid":"s","te')
+
+    recovered = StreamJournal(str(tmp_path)).recover()
+    assert recovered[0]["text"] == "内容"
+
+
+def test_live_instance_is_not_recovered(tmp_path):
+    live = StreamJournal(str(tmp_path))
+    live.begin("s", "问题")
+    live.append("s", "进行中")
+    live.flush()
+
+    assert StreamJournal(str(tmp_path)).recover() == []
+    assert journal_files(tmp_path) == [os.path.basename(live._path)]
+
+    live.close()
+    assert [turn["text"] for turn in StreamJournal(str(tmp_path)).recover()] == ["进行中"]
+
+
+def test_legacy_journal_is_recovered(tmp_path):
+    with open(tmp_path / "stream.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "begin", "sid": "old", "user": "旧问题", "ts": 1.0}) + "\n")
+        f.write(json.dumps({"op": "delta", "sid": "old", "text": "旧回复"}) + "\n")
+
+    recovered = StreamJournal(str(tmp_path)).recover()
+    assert [(turn["session_id"], turn["text"]) for turn in recovered] == [("old", "旧回复")]
+    assert journal_files(tmp_path) == []
+
+
+def test_recovered_turns_are_sorted_by_start_time(tmp_path):
+    for session_id, started in (("late", 20.0), ("early", 10.0)):
+        journal = StreamJournal(str(tmp_path))
+        journal.begin(session_id, "问题")
+        journal._turns[session_id]["started"] = started
+        journal._compact()
+        crash(journal)
+
+    assert [turn["session_id"] for turn in StreamJournal(str(tmp_path)).recover()] == ["early", "late"]
+
+
+def test_finished_turns_truncate_the_journal(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("s", "问题")
+    journal.append("s", "回复")
+    journal.flush()
+    journal.end("s")
+
+    assert os.path.getsize(journal._path) == 0
+    journal.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_compaction_keeps_only_live_turns(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("live", "进行中的问题")
+    journal.append("live", "前半")
+    journal.flush()
+
+    for index in range(10):
+        session_id = f"done{index}"
+        journal.begin(session_id, "问题")
+        journal.append(session_id, "回复")
+        journal.flush()
+        journal.end(session_id)
+    journal.append("live", "后半")
+    journal.flush()
+
+    with open(journal._path, "rb") as f:
+        records = [json.loads(line) for line in f]
+    # 未压缩时有2 + 10 * 4条记录,压缩后只剩进行中的轮次和之后结束的少量轮次
+    assert records[0]["op"] == "begin" and records[0]["sid"] == "live"
+    assert len(records) <= 4 * 2 + 3
+
+    crash(journal)
+    recovered = StreamJournal(str(tmp_path)).recover()
+    assert [(turn["session_id"], turn["user"], turn["text"]) for turn in recovered] == [
+        ("live", "进行中的问题", "前半后半"),
+    ]
+
+
+def test_close_keeps_live_turns_for_the_next_start(tmp_path):
+    journal = StreamJournal(str(tmp_path))
+    journal.begin("s", "问题")
+    journal.append("s", "回复")
+    journal.close()
+
+    assert not os.path.exists(journal._lock_path)
+    assert [turn["text"] for turn in StreamJournal(str(tmp_path)).recover()] == ["回复"]
+
+
+def test_instances_use_separate_files(tmp_path):
+    first = StreamJournal(str(tmp_path))
+    second = StreamJournal(str(tmp_path))
+    first.begin("a", "问题")
+    second.begin("b", "问题")
+    first.flush()
+    second.flush()
+
+    assert first._path != second._path
+    assert len(journal_files(tmp_path)) == 2
+    first.close()
+    second.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import re
+
+
+# CJK字符: 中日韩标点、假名、汉字、谚文和全角字符
+_CJK_RE = re.compile(
+    r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+    r"\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+# 与GPT系列分词器相近的预切分规则
+_PIECE_RE = re.compile(
+    r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+"""
+)
+
+# 每条消息的格式开销(角色、分隔符等)
+MESSAGE_OVERHEAD = 4
+
+
+def _count_pieces(text):
+    """按预切分片段近似BPE token数
+
+    Args:
+        text: 不含CJK字符的文本
+
+    Returns:
+        int: 估算的token数
+    """
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        length = len(piece)
+        if piece.isascii():
+            # 常见英文单词(含前导空格)通常是一个token
+            tokens += 1 if length <= 6 else math.ceil(length / 5)
+        else:
+            # 其他文字按UTF-8字节数估算
+            tokens += math.ceil(len(piece.encode("utf-8")) / 3)
+    return tokens
+
+
+def count_bpe(text):
+    """字节对编码近似,适用于GPT系列等以英文为主的词表
+
+    CJK字符按每字1.5个token计算。
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+
+    cjk = len(_CJK_RE.findall(text))
+    if cjk:
+        text = _CJK_RE.sub(" ", text)
+    return _count_pieces(text) + math.ceil(cjk * 1.5)
+
+
+def count_cjk(text):
+    """CJK优化的估算,适用于DeepSeek、Qwen等中文词表
+
+    中文常用词在这类词表中多为整词,每字约0.6个token。
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+
+    cjk = len(_CJK_RE.findall(text))
+    if cjk:
+        text = _CJK_RE.sub(" ", text)
+    return _count_pieces(text) + math.ceil(cjk * 0.6)
+
+
+class TokenCounter:
+    """离线token计数器,支持可插拔的估算后端
+
+    消息的计数结果缓存在ChatMessage上,同一条消息只计算一次。
+    """
+
+    DEFAULT_BACKEND = "cjk"
+
+    _backends = {
+        "bpe": count_bpe,
+        "cjk": count_cjk,
+    }
+
+    @classmethod
+    def register_backend(cls, name, count_func):
+        """注册计数后端
+
+        Args:
+            name: 后端名称,可在model.toml的tokenizer字段中引用
+            count_func: 计数函数,参数为文本,返回token数
+        """
+        cls._backends[name] = count_func
+
+    @classmethod
+    def available_backends(cls):
+        """获取所有后端名称"""
+        return list(cls._backends.keys())
+
+    def __init__(self, backend=DEFAULT_BACKEND):
+        """初始化计数器
+
+        Args:
+            backend: 后端名称,未注册时使用默认后端
+        """
+        if backend not in self._backends:
+            backend = self.DEFAULT_BACKEND
+        self.backend = backend
+        self._count = self._backends[backend]
+
+    def count_text(self, text):
+        """计算文本的token数
+
+        Args:
+            text: 文本
+
+        Returns:
+            int: token数
+        """
+        return self._count(text)
+
+    def count_message(self, message):
+        """计算单条消息的token数(含格式开销),结果缓存在消息上
+
+        Args:
+            message: ChatMessage对象
+
+        Returns:
+            int: token数
+        """
+        cache = message.token_cache
+        if cache is not None and cache[0] == self.backend:
+            return cache[1]
+
+        count = self._count(message.content) + MESSAGE_OVERHEAD
+        message.token_cache = (self.backend, count)
+        return count
+
+    def count_messages(self, messages):
+        """批量计算消息的token数
+
+        Args:
+            messages: ChatMessage序列
+
+        Returns:
+            list: 每条消息的token数
+        """
+        backend = self.backend
+        count = self._count
+        results = []
+        for message in messages:
+            cache = message.token_cache
+            if cache is None or cache[0] != backend:
+                cache = (backend, count(message.content) + MESSAGE_OVERHEAD)
+                message.token_cache = cache
+            results.append(cache[1])
+        return results
+
+    def count_texts(self, texts):
+        """批量计算文本的token数
+
+        Args:
+            texts: 文本序列
+
+        Returns:
+            list: 每段文本的token数
+        """
+        count = self._count
+        return [count(text) for text in texts]